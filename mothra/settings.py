@@ -153,6 +153,119 @@ LOGGING = {
 
 USE_CONCURRENCY = False   
 
+# Number of threads the WorkflowRunner uses to run independent widgets
+# concurrently. With 1 the widgets run one after another.
+WORKFLOW_RUNNER_MAX_WORKERS = 1
+
+# Number of iterations of a for loop (or folds of a cross validation) that
+# run at the same time, unless the loop body workflow sets its own
+# loop_workers. With 1 the iterations run one after another. They run on
+# threads ('threads') or in processes forked from the web or Celery process
+# ('processes', where fork is available), or as Celery tasks if
+# USE_CONCURRENCY is set. Widgets that use the JVM (weka_local) can't run in
+# forked processes, so loops run on threads once the JVM is started.
+WORKFLOW_LOOP_WORKERS = 1
+WORKFLOW_LOOP_BACKEND = 'threads'
+
+# Outputs of pure widgets (AbstractWidget.pure) are cached per process and
+# reused when a widget runs again with equal inputs. The cache keeps at most
+# WORKFLOW_EXECUTION_CACHE_SIZE results (0 disables it) for at most
+# WORKFLOW_EXECUTION_CACHE_TTL seconds.
+WORKFLOW_EXECUTION_CACHE_SIZE = 0
+WORKFLOW_EXECUTION_CACHE_TTL = 3600
+
+# Widgets submitted from the editor run as jobs (in Celery workers if
+# USE_CONCURRENCY is set). The status of the jobs and of the widgets is kept
+# for WORKFLOW_STATUS_TIMEOUT seconds in the WORKFLOW_STATUS_CACHE cache,
+# which should be shared by the web server and the workers (e.g. memcached).
+# Statuses are read from the database if it is a local memory or a dummy
+# cache (a warning is logged if USE_CONCURRENCY is set).
+WORKFLOW_STATUS_CACHE = 'default'
+WORKFLOW_STATUS_TIMEOUT = 10 * 60
+
+# Number of streams the run_streams scheduler executes at the same time and
+# the number of seconds between its checks for streams that were changed.
+STREAM_SCHEDULER_WORKERS = 4
+STREAM_SCHEDULER_REFRESH = 1
+
+# The state of streaming widgets (streams.state) is compacted after every
+# STREAM_STATE_COMPACT_EVERY writes to a structure, keeping at most
+# STREAM_STATE_MAX_SIZE entries that are at most STREAM_STATE_MAX_AGE seconds
+# old, unless the widget sets its own limits (None keeps everything).
+STREAM_STATE_COMPACT_EVERY = 100
+STREAM_STATE_MAX_SIZE = 100000
+STREAM_STATE_MAX_AGE = None
+
+# The tweet cloud of a stream is drawn from at most this many of the newest
+# collected tweets (None draws it from all of them).
+STREAMING_TWEET_CLOUD_SIZE = 5000
+
+# The streaming widgets send tweets to the sentiment web service in batches
+# of at most SENTIMENT_SERVICE_BATCH_SIZE tweets, collected for at most
+# SENTIMENT_SERVICE_BATCH_DELAY seconds, with at most
+# SENTIMENT_SERVICE_MAX_IN_FLIGHT requests to a service at the same time
+# (the active learner gets one request per widget call). Requests that could
+# not reach the service are retried SENTIMENT_SERVICE_RETRIES times, waiting
+# SENTIMENT_SERVICE_BACKOFF seconds (doubled on every retry), except for the
+# active learner, which is never retried. Setting
+# SENTIMENT_SERVICE_URL sends all requests to that location instead, e.g.
+# to the stub server of manage.py sentiment_stub_server.
+SENTIMENT_SERVICE_BATCH_SIZE = 100
+SENTIMENT_SERVICE_BATCH_DELAY = 0.05
+SENTIMENT_SERVICE_MAX_IN_FLIGHT = 4
+SENTIMENT_SERVICE_RETRIES = 3
+SENTIMENT_SERVICE_BACKOFF = 0.5
+SENTIMENT_SERVICE_URL = None
+
+# Parsed WSDLs of web services (services.webservice) are kept in memory for
+# WEBSERVICE_WSDL_TTL seconds (None keeps them until the process exits). If
+# WEBSERVICE_WSDL_CACHE_DIR is set they are also pickled into that directory
+# so that new processes don't have to download and parse them again.
+WEBSERVICE_WSDL_TTL = 3600
+WEBSERVICE_WSDL_CACHE_DIR = None
+
+# Web service widgets in batch mode call the service for every item of their
+# list inputs on at most WEBSERVICE_BATCH_WORKERS threads, with at most
+# WEBSERVICE_HOST_CONCURRENCY calls to the same host at the same time (over
+# all widgets running in the process).
+WEBSERVICE_BATCH_WORKERS = 8
+WEBSERVICE_HOST_CONCURRENCY = 4
+
+# The weka_local widgets pass handles of Weka objects, which stay in the
+# JVM of the process. At most WEKA_LOCAL_STORE_SIZE objects are kept, the
+# least recently used ones are serialized into their handles.
+WEKA_LOCAL_STORE_SIZE = 100
+
+# Number of threads weka_local_cross_validate builds the models of the folds
+# on.
+WEKA_LOCAL_CV_WORKERS = 4
+
+# Number of processes the bio3graph corpus widgets split, tag and extract
+# the triplets of documents on. None uses one per core.
+BIO3GRAPH_CORPUS_WORKERS = None
+
+# Widgets that report their progress while they run save it at most once
+# per WIDGET_PROGRESS_INTERVAL seconds.
+WIDGET_PROGRESS_INTERVAL = 1.0
+
+# The segmine gene and probe mappings are loaded once per process, into
+# dictionaries ('memory') or as hash table files built once in
+# SEGMINE_REFERENCE_DATA_DIR and mapped into memory by every process
+# ('mmap'), so all workers share one copy.
+SEGMINE_REFERENCE_DATA_BACKEND = 'memory'
+SEGMINE_REFERENCE_DATA_DIR = os.path.join(PROJECT_DIR, 'reference_data')
+
+# Functions (dotted paths) that are called when a Celery worker process
+# starts, e.g. to load reference data before the first task needs it.
+# Functions of packages that are not in INSTALLED_APPS are skipped.
+WORKER_WARM_UP = ('workflows.segmine.reference_data.warm_up',)
+
+# Input and output values whose pickle is larger than the threshold (in
+# bytes) are kept in a content addressed blob store instead of the database.
+PICKLEFIELD_BLOB_STORE = 'picklefield.blobstore.FileSystemBlobStore'
+PICKLEFIELD_BLOB_STORE_DIR = os.path.join(PROJECT_DIR, 'blobs')
+PICKLEFIELD_BLOB_THRESHOLD = 64 * 1024
+
 INSTALLED_APPS_DEFAULT = (
     'django.contrib.auth',
     'django.contrib.contenttypes',
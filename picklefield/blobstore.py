@@ -0,0 +1,178 @@
+"""Content addressed storage for large values of PickledBlobField."""
+
+import os
+import time
+import tempfile
+from hashlib import sha1
+
+from django.conf import settings
+from django.utils.importlib import import_module
+
+DEFAULT_STORE = 'picklefield.blobstore.FileSystemBlobStore'
+
+class BlobStore(object):
+    """
+    Interface of a blob store. Blobs are immutable byte strings that are
+    addressed by the SHA-1 hash of their content, so storing the same value
+    twice stores it only once.
+
+    """
+
+    def key(self, data):
+        return sha1(data).hexdigest()
+
+    def put(self, data):
+        """Stores the data (if it isn't stored yet) and returns its key."""
+        raise NotImplementedError
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def keys(self):
+        """Iterates over the keys of all stored blobs."""
+        raise NotImplementedError
+
+    def age(self, key):
+        """Seconds since the blob was last stored."""
+        raise NotImplementedError
+
+
+class FileSystemBlobStore(BlobStore):
+    """
+    Stores every blob in its own file, ``<directory>/<key[:2]>/<key[2:]>``.
+
+    A blob is written to a temporary file in the same directory first and
+    then renamed, so readers never see a partially written blob. Storing
+    an existing blob only updates its modification time, which is what
+    ``age`` reports.
+
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def put(self, data):
+        key = self.key(data)
+        path = self.path(key)
+        if os.path.exists(path):
+            os.utime(path, None)
+            return key
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Another process created it in the meantime.
+                if not os.path.isdir(directory):
+                    raise
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write(data)
+            finally:
+                f.close()
+            os.rename(tmp, path)
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return key
+
+    def get(self, key):
+        f = open(self.path(key), 'rb')
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def keys(self):
+        if not os.path.isdir(self.directory):
+            return
+        for prefix in os.listdir(self.directory):
+            directory = os.path.join(self.directory, prefix)
+            if len(prefix) != 2 or not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if len(name) == 38:
+                    yield prefix + name
+
+    def age(self, key):
+        return time.time() - os.path.getmtime(self.path(key))
+
+
+_stores = {}
+
+def get_blob_store():
+    """
+    Returns the blob store configured with the ``PICKLEFIELD_BLOB_STORE``
+    (dotted path of a BlobStore class) and ``PICKLEFIELD_BLOB_STORE_DIR``
+    settings. Stores are created once per process.
+
+    """
+    path = getattr(settings, 'PICKLEFIELD_BLOB_STORE', DEFAULT_STORE)
+    directory = getattr(settings, 'PICKLEFIELD_BLOB_STORE_DIR', None)
+    if directory is None:
+        directory = os.path.join(tempfile.gettempdir(), 'picklefield-blobs')
+    store = _stores.get((path, directory))
+    if store is None:
+        module, name = path.rsplit('.', 1)
+        store = getattr(import_module(module), name)(directory)
+        _stores[(path, directory)] = store
+    return store
+
+
+def referenced_keys():
+    """
+    Returns the set of blob keys referenced by a PickledBlobField in any
+    installed model.
+
+    """
+    from django.db import connection
+    from django.db.models import get_models
+    from picklefield.fields import PickledBlobField, BLOB_PREFIX
+    qn = connection.ops.quote_name
+    keys = set()
+    cursor = connection.cursor()
+    for model in get_models():
+        for field in model._meta.local_fields:
+            if not isinstance(field, PickledBlobField):
+                continue
+            cursor.execute('SELECT %s FROM %s WHERE %s LIKE %%s' % (
+                qn(field.column), qn(model._meta.db_table), qn(field.column)),
+                [BLOB_PREFIX + '%'])
+            for (value,) in cursor.fetchall():
+                keys.add(value[len(BLOB_PREFIX):])
+    return keys
+
+
+def collect_garbage(min_age=3600, dry_run=False):
+    """
+    Deletes the blobs that no row references anymore and returns their keys.
+
+    Blobs stored less than ``min_age`` seconds ago are kept, because the row
+    that references them may not have been committed yet.
+
+    """
+    store = get_blob_store()
+    keys = referenced_keys()
+    deleted = []
+    for key in list(store.keys()):
+        if key in keys or store.age(key) < min_age:
+            continue
+        if not dry_run:
+            store.delete(key)
+        deleted.append(key)
+    return deleted
@@ -4,14 +4,26 @@ from copy import deepcopy
 from base64 import b64encode, b64decode
 from zlib import compress, decompress
 try:
-    from cPickle import loads, dumps
+    from cPickle import loads, dumps, HIGHEST_PROTOCOL
 except ImportError:
-    from pickle import loads, dumps
+    from pickle import loads, dumps, HIGHEST_PROTOCOL
 
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.db import models
 from django.utils.encoding import force_unicode
+from django.utils.importlib import import_module
 
 from picklefield import DEFAULT_PROTOCOL
+from picklefield.blobstore import get_blob_store
+
+BLOB_PREFIX = 'pickleblob:'
+
+DEFAULT_BLOB_THRESHOLD = 64 * 1024
+
+_blob_reference_re = re.compile('^%s[0-9a-f]{40}$' % BLOB_PREFIX)
 
 class PickledObject(str):
     """
@@ -69,12 +81,93 @@ def dbsafe_decode(value, compress_object=False):
     #print "bla decode!!!\n"+str(time.time())
     #import traceback
     #traceback.print_stack()
+    value = b64decode(value)
+    if value.startswith(BINARY_MAGIC):
+        return binary_decode(value)
     if not compress_object:
-        value = loads(b64decode(value))
+        value = loads(value)
     else:
-        value = loads(decompress(b64decode(value)))
+        value = loads(decompress(value))
+    return value
+
+
+# Binary values start with BINARY_MAGIC followed by one byte that tells
+# which codec compressed the pickle, so they can be told apart from the
+# base64 values and decoded whatever the field is currently configured to.
+BINARY_MAGIC = '\x00PKF'
+
+CODECS = {
+    'zlib': (1, compress, decompress),
+    'zlib-fast': (2, lambda data: compress(data, 1), decompress),
+}
+
+try:
+    import lz4.block as _lz4
+except ImportError:
+    try:
+        import lz4 as _lz4
+    except ImportError:
+        _lz4 = None
+if _lz4 is not None:
+    CODECS['lz4'] = (3, _lz4.compress, _lz4.decompress)
+
+try:
+    import snappy as _snappy
+except ImportError:
+    _snappy = None
+if _snappy is not None:
+    CODECS['snappy'] = (4, _snappy.compress, _snappy.decompress)
+
+_decompressors = dict((codec_id, decompress_data) for codec_id, compress_data, decompress_data in CODECS.values())
+
+def get_codec(name):
+    """
+    Returns the name of the codec selected by the ``compress`` argument of
+    a field: ``False``/``None`` (no compression), ``True`` (zlib) or one of
+    the names in CODECS.
+
+    """
+    if not name:
+        return None
+    if name is True:
+        return 'zlib'
+    if name not in CODECS:
+        raise ImproperlyConfigured('Unknown or unavailable pickle compression codec %r (available: %s).' % (
+            name, ', '.join(sorted(CODECS))))
+    return name
+
+def binary_encode(value, codec=None, pickle_protocol=HIGHEST_PROTOCOL):
+    data = dumps(value, pickle_protocol)
+    if codec is None:
+        return BINARY_MAGIC + chr(0) + data
+    codec_id, compress_data, decompress_data = CODECS[codec]
+    return BINARY_MAGIC + chr(codec_id) + compress_data(data)
+
+def binary_decode(data):
+    codec_id = ord(data[len(BINARY_MAGIC)])
+    data = data[len(BINARY_MAGIC)+1:]
+    if codec_id:
+        try:
+            data = _decompressors[codec_id](data)
+        except KeyError:
+            raise ImproperlyConfigured('The pickle was compressed with a codec (%d) that is not available.' % codec_id)
+    return loads(data)
+
+def _binary_string(value):
+    """Converts what database adapters return for binary columns to str."""
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    if isinstance(value, buffer):
+        return str(value)
     return value
 
+def _database_binary(connection, value):
+    """Wraps bytes in the binary type of the DB-API module of the backend."""
+    database = getattr(import_module(connection.__class__.__module__), 'Database', None)
+    if database is None:
+        return buffer(value)
+    return database.Binary(value)
+
 
 class PickledObjectField(models.Field):
     """
@@ -82,6 +175,14 @@ class PickledObjectField(models.Field):
     database. PickledObjectField will optionally compress its values if
     declared with the keyword argument ``compress=True``.
 
+    With ``binary=True`` the pickle (by default of the highest protocol) is
+    stored as raw bytes in a binary column instead of base64 text, and
+    ``compress`` may also name one of the CODECS (``'zlib-fast'``, and
+    ``'lz4'`` or ``'snappy'`` when those libraries are installed). Binary
+    values carry a header naming their codec, so base64 values written
+    before a column was switched to binary (or to another codec) are still
+    read correctly.
+
     Does not actually encode and compress ``None`` objects (although you
     can still do lookups using None). This way, it is still possible to
     use the ``isnull`` lookup type correctly.
@@ -91,10 +192,37 @@ class PickledObjectField(models.Field):
 
     def __init__(self, *args, **kwargs):
         self.compress = kwargs.pop('compress', False)
-        self.protocol = kwargs.pop('protocol', DEFAULT_PROTOCOL)
+        self.binary = kwargs.pop('binary', False)
+        if self.binary:
+            self.protocol = kwargs.pop('protocol', HIGHEST_PROTOCOL)
+        else:
+            self.protocol = kwargs.pop('protocol', DEFAULT_PROTOCOL)
+        self.codec = get_codec(self.compress)
         kwargs.setdefault('editable', False)
         super(PickledObjectField, self).__init__(*args, **kwargs)
 
+    def encode(self, value):
+        """
+        Returns the bytes (binary fields) or the base64 text stored for
+        value. Text fields with ``compress`` set to a codec name store the
+        base64 of the binary format; ``compress=True`` keeps the original
+        zlib format so that existing lookups keep matching.
+
+        """
+        if self.binary:
+            return binary_encode(value, self.codec, self.protocol)
+        if isinstance(self.compress, basestring):
+            return PickledObject(b64encode(binary_encode(value, self.codec, self.protocol)))
+        return dbsafe_encode(value, self.compress, self.protocol)
+
+    def decode(self, value):
+        legacy_compressed = self.codec == 'zlib'
+        if self.binary:
+            value = _binary_string(value)
+            if value.startswith(BINARY_MAGIC):
+                return binary_decode(value)
+        return dbsafe_decode(value, legacy_compressed)
+
     def get_default(self):
         """
         Returns the default value for this field.
@@ -126,7 +254,7 @@ class PickledObjectField(models.Field):
         """
         if value is not None:
             try:
-                value = dbsafe_decode(value, self.compress)
+                value = self.decode(value)
             except:
                 # If the value is a definite pickle; and an error is raised in
                 # de-pickling it should be allowed to propogate.
@@ -141,6 +269,14 @@ class PickledObjectField(models.Field):
         value = super(PickledObjectField, self).pre_save(model_instance, add)
         return wrap_conflictual_object(value)
 
+    def db_type(self, connection):
+        if not self.binary:
+            return super(PickledObjectField, self).db_type(connection)
+        return {
+            'postgresql': 'bytea',
+            'mysql': 'longblob',
+        }.get(connection.vendor, 'BLOB')
+
     def get_db_prep_value(self, value, connection=None, prepared=False):
         """
         Pickle and b64encode the object, optionally compressing it.
@@ -159,11 +295,20 @@ class PickledObjectField(models.Field):
             # marshaller (telling it to store it like it would a string), but
             # since both of these methods result in the same value being stored,
             # doing things this way is much easier.
-            value = force_unicode(dbsafe_encode(value, self.compress, self.protocol))
+            if self.binary:
+                value = self.encode(value)
+                if connection is not None:
+                    value = _database_binary(connection, value)
+            else:
+                value = force_unicode(self.encode(value))
         return value
 
     def value_to_string(self, obj):
         value = self._get_val_from_obj(obj)
+        if self.binary and value is not None:
+            # Serializers need text, the base64 of the binary value is read
+            # back by to_python.
+            return force_unicode(b64encode(self.encode(value)))
         return self.get_db_prep_value(value)
 
     def get_internal_type(self):
@@ -184,10 +329,181 @@ class PickledObjectField(models.Field):
                 lookup_type, value)
 
 
+class BlobReference(object):
+    """
+    A value of a PickledBlobField that is kept in the blob store and hasn't
+    been loaded yet.
+
+    """
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __unicode__(self):
+        return BLOB_PREFIX + self.key
+
+    def __eq__(self, other):
+        return isinstance(other, BlobReference) and other.key == self.key
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class PickledBlobDescriptor(object):
+    """
+    Loads values that are kept in the blob store on first attribute access.
+
+    """
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.field.attname]
+        if isinstance(value, BlobReference):
+            value = self.field.load(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = self.field.to_python(value)
+
+
+def shared_value(instance, name):
+    """
+    Returns the value of the PickledBlobField ``name`` of ``instance``
+    without loading it from the blob store. Assigning the result to another
+    PickledBlobField makes both rows reference the same blob instead of
+    pickling and storing the value again.
+
+    """
+    attname = instance._meta.get_field(name).attname
+    if attname in instance.__dict__:
+        return instance.__dict__[attname]
+    return getattr(instance, attname)
+
+
+class PickledBlobField(models.Field):
+    """
+    A PickledObjectField that keeps large values out of the database row.
+
+    Values whose pickle is smaller than ``threshold`` bytes (the
+    ``PICKLEFIELD_BLOB_THRESHOLD`` setting by default) are stored inline
+    exactly as PickledObjectField stores them. Larger values are written to
+    the blob store (see picklefield.blobstore) under the hash of their
+    content and the row only holds a ``pickleblob:<sha1>`` reference, so
+    equal values are stored once. Referenced values are loaded when the
+    attribute is first accessed, not when the row is fetched.
+
+    Values are pickled in the binary format of PickledObjectField (highest
+    protocol, ``compress`` may name any of the CODECS). Rows written by
+    PickledObjectField remain readable.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.compress = kwargs.pop('compress', False)
+        self.protocol = kwargs.pop('protocol', HIGHEST_PROTOCOL)
+        self.threshold = kwargs.pop('threshold', None)
+        self.codec = get_codec(self.compress)
+        kwargs.setdefault('editable', False)
+        super(PickledBlobField, self).__init__(*args, **kwargs)
+
+    def contribute_to_class(self, cls, name):
+        super(PickledBlobField, self).contribute_to_class(cls, name)
+        setattr(cls, self.name, PickledBlobDescriptor(self))
+
+    def get_threshold(self):
+        if self.threshold is not None:
+            return self.threshold
+        return getattr(settings, 'PICKLEFIELD_BLOB_THRESHOLD', DEFAULT_BLOB_THRESHOLD)
+
+    def get_default(self):
+        if self.has_default():
+            if callable(self.default):
+                return self.default()
+            return self.default
+        return super(PickledBlobField, self).get_default()
+
+    def to_python(self, value):
+        """
+        Turns blob references into BlobReference objects (which are loaded
+        by the descriptor) and decodes inline values like
+        PickledObjectField does.
+
+        """
+        if isinstance(value, basestring) and _blob_reference_re.match(value):
+            return BlobReference(value[len(BLOB_PREFIX):])
+        if value is not None:
+            try:
+                value = dbsafe_decode(value, self.codec == 'zlib')
+            except:
+                if isinstance(value, PickledObject):
+                    raise
+            else:
+                if isinstance(value, _ObjectWrapper):
+                    return value._obj
+        return value
+
+    def load(self, reference):
+        data = get_blob_store().get(reference.key)
+        if data.startswith(BINARY_MAGIC):
+            value = binary_decode(data)
+        elif self.codec == 'zlib':
+            value = loads(decompress(data))
+        else:
+            value = loads(data)
+        if isinstance(value, _ObjectWrapper):
+            return value._obj
+        return value
+
+    def pre_save(self, model_instance, add):
+        # Read the raw attribute so that values that were never loaded are
+        # saved as references instead of being loaded and pickled again.
+        return wrap_conflictual_object(model_instance.__dict__.get(self.attname))
+
+    def get_db_prep_value(self, value, connection=None, prepared=False):
+        if value is None or isinstance(value, PickledObject):
+            return value
+        if isinstance(value, BlobReference):
+            return unicode(value)
+        data = binary_encode(value, self.codec, self.protocol)
+        if len(data) < self.get_threshold():
+            return force_unicode(PickledObject(b64encode(data)))
+        return BLOB_PREFIX + get_blob_store().put(data)
+
+    def value_to_string(self, obj):
+        # Serialized values are always inline, so that dumps can be loaded
+        # on a server with a different blob store.
+        value = self._get_val_from_obj(obj)
+        if value is None:
+            return value
+        return force_unicode(b64encode(binary_encode(value, self.codec, self.protocol)))
+
+    def get_internal_type(self):
+        return 'TextField'
+
+    def get_db_prep_lookup(self, lookup_type, value, connection=None, prepared=False):
+        if lookup_type not in ['exact', 'in', 'isnull']:
+            raise TypeError('Lookup type %s is not supported.' % lookup_type)
+        return super(PickledBlobField, self).get_db_prep_lookup(
+            lookup_type, value, connection=connection, prepared=prepared)
+
+
 # South support; see http://south.aeracode.org/docs/tutorial/part4.html#simple-inheritance
 try:
     from south.modelsinspector import add_introspection_rules
 except ImportError:
     pass
 else:
-    add_introspection_rules([], [r"^picklefield\.fields\.PickledObjectField"])
+    add_introspection_rules([
+        (
+            [PickledObjectField, PickledBlobField],
+            [],
+            {
+                'binary': ['binary', {'default': False}],
+                'compress': ['compress', {'default': False}],
+            },
+        ),
+    ], [r"^picklefield\.fields\.PickledObjectField", r"^picklefield\.fields\.PickledBlobField"])
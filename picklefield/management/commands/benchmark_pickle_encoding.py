@@ -0,0 +1,89 @@
+import time
+from base64 import b64encode
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from picklefield import DEFAULT_PROTOCOL
+from picklefield.fields import CODECS, HIGHEST_PROTOCOL, dumps, dbsafe_encode, dbsafe_decode, binary_encode, binary_decode
+
+
+class Command(BaseCommand):
+    help = 'Times encoding and decoding of typical widget values with the text (base64) and binary ' \
+           'formats of PickledObjectField, with every available compression codec. Throughput is the size of ' \
+           'the uncompressed pickle per second; the stored size and its ratio to the pickle are reported separately.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('-r', '--repeat',
+            dest='repeat',
+            type='int',
+            default=5,
+            help='Number of times every value is encoded and decoded (the best time is reported).'
+        ),
+        make_option('-s', '--size',
+            dest='size',
+            type='int',
+            default=100000,
+            help='Number of numbers (or rows) in the generated values.'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write('%-16s %-18s %12s %12s %6s %14s %14s\n' % (
+            'value', 'format', 'pickle bytes', 'stored bytes', 'ratio', 'encode MB/s', 'decode MB/s'))
+        for name, value in payloads(options['size']):
+            for mode, protocol, encode, decode in modes():
+                encoded = encode(value)
+                encode_time = best_time(lambda: encode(value), options['repeat'])
+                decode_time = best_time(lambda: decode(encoded), options['repeat'])
+                raw = len(dumps(value, protocol))
+                stored = len(encoded)
+                self.stdout.write('%-16s %-18s %12d %12d %6.3f %14.1f %14.1f\n' % (
+                    name, mode, raw, stored, float(stored) / raw,
+                    raw / encode_time / 1e6, raw / decode_time / 1e6))
+                self.stdout.flush()
+
+
+def best_time(f, repeat):
+    best = None
+    for k in range(repeat):
+        start = time.time()
+        f()
+        elapsed = max(time.time()-start, 1e-9)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def modes():
+    """ Yields (name, pickle protocol, encode, decode) for the legacy text
+    format, the text format with zlib and the binary format with every
+    available codec. """
+    yield 'text', DEFAULT_PROTOCOL, lambda v: dbsafe_encode(v, False, DEFAULT_PROTOCOL), lambda d: dbsafe_decode(d, False)
+    yield 'text zlib', DEFAULT_PROTOCOL, lambda v: dbsafe_encode(v, True, DEFAULT_PROTOCOL), lambda d: dbsafe_decode(d, True)
+    yield 'binary', HIGHEST_PROTOCOL, lambda v: binary_encode(v), binary_decode
+    for codec in sorted(CODECS, key=lambda c: CODECS[c][0]):
+        yield 'binary ' + codec, HIGHEST_PROTOCOL, lambda v, codec=codec: binary_encode(v, codec), binary_decode
+    yield 'binary zlib (b64)', HIGHEST_PROTOCOL, lambda v: b64encode(binary_encode(v, 'zlib')), lambda d: dbsafe_decode(d)
+
+
+def payloads(size):
+    """ Yields (name, value) pairs resembling the values widgets pass around:
+    NumPy arrays and an Orange table when those are installed, and nested
+    Python structures. """
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    if numpy is not None:
+        yield 'float matrix', numpy.random.RandomState(0).rand(size // 100, 100)
+        yield 'int array', numpy.arange(size)
+    try:
+        import orange
+    except ImportError:
+        orange = None
+    if orange is not None:
+        domain = orange.Domain([orange.FloatVariable('a%d' % k) for k in range(10)] + [orange.EnumVariable('class', values=['a', 'b'])])
+        yield 'orange table', orange.ExampleTable(domain, [[float(i*j) for j in range(10)] + ['ab'[i%2]] for i in range(size // 10)])
+    yield 'list of dicts', [{'id': i, 'name': 'example %d' % i, 'score': i / 7.0, 'tags': ['a', 'b']} for i in range(size // 10)]
+    yield 'text', ' '.join('word%d' % (i % 1000) for i in range(size))
@@ -0,0 +1,33 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from picklefield.blobstore import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Deletes the blobs of PickledBlobFields that are not referenced by any row anymore.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--min-age',
+            dest='min_age',
+            type='int',
+            default=3600,
+            help='Keep blobs that were stored less than MIN_AGE seconds ago (default 3600).'
+        ),
+        make_option('-n', '--dry-run',
+            action='store_true',
+            dest='dry_run',
+            default=False,
+            help='Only list the blobs that would be deleted.'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        deleted = collect_garbage(options['min_age'], options['dry_run'])
+        for key in deleted:
+            self.stdout.write(key + '\n')
+        if options['dry_run']:
+            self.stdout.write('%d unreferenced blobs.\n' % len(deleted))
+        else:
+            self.stdout.write('Deleted %d unreferenced blobs.\n' % len(deleted))
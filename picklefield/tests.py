@@ -1,9 +1,15 @@
 """Unit tests for django-picklefield."""
 
+import shutil
+import tempfile
+
 from django.test import TestCase
-from django.db import models
+from django.test.utils import override_settings
+from django.db import models, connection
 from django.core import serializers
-from picklefield.fields import PickledObjectField, wrap_conflictual_object
+from django.core.exceptions import ImproperlyConfigured
+from picklefield.fields import PickledObjectField, PickledBlobField, BlobReference, shared_value, wrap_conflictual_object, dbsafe_encode, BINARY_MAGIC
+from picklefield.blobstore import get_blob_store, collect_garbage
 
 class TestingModel(models.Model):
     pickle_field = PickledObjectField()
@@ -13,6 +19,14 @@ class TestingModel(models.Model):
 class MinimalTestingModel(models.Model):
     pickle_field = PickledObjectField()
 
+class BlobTestingModel(models.Model):
+    blob_field = PickledBlobField(null=True, threshold=100)
+    compressed_blob_field = PickledBlobField(null=True, compress=True, threshold=100)
+
+class BinaryTestingModel(models.Model):
+    pickle_field = PickledObjectField(null=True, binary=True)
+    compressed_pickle_field = PickledObjectField(null=True, binary=True, compress='zlib-fast')
+
 class TestCustomDataType(str):
     pass
 
@@ -154,3 +168,110 @@ class PickledObjectFieldTests(TestCase):
         for deserialized_test in serializers.deserialize('json', json_test):
             self.assertEquals(deserialized_test.object,
                               model_test)
+
+class PickledBlobFieldTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(PICKLEFIELD_BLOB_STORE_DIR=self.directory)
+        self.settings_override.enable()
+        self.large_value = range(1000)
+        return super(PickledBlobFieldTests, self).setUp()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory)
+        return super(PickledBlobFieldTests, self).tearDown()
+
+    def raw_value(self, instance):
+        cursor = connection.cursor()
+        cursor.execute('SELECT blob_field FROM %s WHERE id = %%s' % BlobTestingModel._meta.db_table, [instance.pk])
+        return cursor.fetchone()[0]
+
+    def testSmallValuesAreInline(self):
+        model_test = BlobTestingModel.objects.create(blob_field={'foo': 'bar'}, compressed_blob_field='Hello World')
+        self.assertFalse(self.raw_value(model_test).startswith('pickleblob:'))
+        self.assertEquals([], list(get_blob_store().keys()))
+        model_test = BlobTestingModel.objects.get(pk=model_test.pk)
+        self.assertEquals({'foo': 'bar'}, model_test.blob_field)
+        self.assertEquals('Hello World', model_test.compressed_blob_field)
+
+    def testLargeValuesAreStoredOnce(self):
+        first = BlobTestingModel.objects.create(blob_field=self.large_value, compressed_blob_field=self.large_value)
+        second = BlobTestingModel.objects.create(blob_field=self.large_value)
+        self.assertTrue(self.raw_value(first).startswith('pickleblob:'))
+        self.assertEquals(self.raw_value(first), self.raw_value(second))
+        # One blob for the uncompressed and one for the compressed value.
+        self.assertEquals(2, len(list(get_blob_store().keys())))
+
+    def testLazyLoading(self):
+        model_test = BlobTestingModel.objects.create(blob_field=self.large_value)
+        model_test = BlobTestingModel.objects.get(pk=model_test.pk)
+        self.assertTrue(isinstance(model_test.__dict__['blob_field'], BlobReference))
+        self.assertEquals(self.large_value, model_test.blob_field)
+        self.assertEquals(self.large_value, model_test.__dict__['blob_field'])
+
+    def testSharedValue(self):
+        first = BlobTestingModel.objects.create(blob_field=self.large_value)
+        first = BlobTestingModel.objects.get(pk=first.pk)
+        second = BlobTestingModel(blob_field=shared_value(first, 'blob_field'))
+        second.save()
+        # Neither value had to be loaded to copy it.
+        self.assertTrue(isinstance(first.__dict__['blob_field'], BlobReference))
+        self.assertEquals(self.raw_value(first), self.raw_value(second))
+        self.assertEquals(self.large_value, BlobTestingModel.objects.get(pk=second.pk).blob_field)
+
+    def testLegacyRowsAreReadable(self):
+        model_test = MinimalTestingModel.objects.create(pickle_field=self.large_value)
+        cursor = connection.cursor()
+        cursor.execute('INSERT INTO %s (blob_field) SELECT pickle_field FROM %s WHERE id = %%s' % (
+            BlobTestingModel._meta.db_table, MinimalTestingModel._meta.db_table), [model_test.pk])
+        self.assertEquals(self.large_value, BlobTestingModel.objects.get().blob_field)
+
+    def testSerialization(self):
+        model_test = BlobTestingModel.objects.create(blob_field=self.large_value)
+        json_test = serializers.serialize('json', [model_test])
+        self.assertFalse('pickleblob:' in json_test)
+        for deserialized_test in serializers.deserialize('json', json_test):
+            self.assertEquals(self.large_value, deserialized_test.object.blob_field)
+
+    def testGarbageCollection(self):
+        kept = BlobTestingModel.objects.create(blob_field=self.large_value)
+        removed = BlobTestingModel.objects.create(blob_field=range(2000))
+        self.assertEquals(2, len(list(get_blob_store().keys())))
+        removed.delete()
+        self.assertEquals([], collect_garbage(min_age=3600))
+        self.assertEquals(1, len(collect_garbage(min_age=0)))
+        self.assertEquals([self.raw_value(kept)[len('pickleblob:'):]], list(get_blob_store().keys()))
+
+class BinaryPickledObjectFieldTests(TestCase):
+    def raw_value(self, instance):
+        cursor = connection.cursor()
+        cursor.execute('SELECT pickle_field FROM %s WHERE id = %%s' % BinaryTestingModel._meta.db_table, [instance.pk])
+        return str(cursor.fetchone()[0])
+
+    def testDataIntegrity(self):
+        for value in ('Hello World', {'foo': [1, 2.5, None]}, range(1000), TestCustomDataType('Hello World')):
+            model_test = BinaryTestingModel.objects.create(pickle_field=value, compressed_pickle_field=value)
+            self.assertTrue(self.raw_value(model_test).startswith(BINARY_MAGIC))
+            model_test = BinaryTestingModel.objects.get(pk=model_test.pk)
+            self.assertEquals(value, model_test.pickle_field)
+            self.assertEquals(value, model_test.compressed_pickle_field)
+            self.assertEquals(type(value), type(model_test.pickle_field))
+
+    def testLegacyRowsAreReadable(self):
+        model_test = BinaryTestingModel.objects.create()
+        cursor = connection.cursor()
+        cursor.execute('UPDATE %s SET pickle_field = %%s, compressed_pickle_field = %%s WHERE id = %%s' % BinaryTestingModel._meta.db_table,
+                       [dbsafe_encode({'foo': 'bar'}), dbsafe_encode({'foo': 'bar'}), model_test.pk])
+        model_test = BinaryTestingModel.objects.get(pk=model_test.pk)
+        self.assertEquals({'foo': 'bar'}, model_test.pickle_field)
+        self.assertEquals({'foo': 'bar'}, model_test.compressed_pickle_field)
+
+    def testSerialization(self):
+        model_test = BinaryTestingModel(pickle_field={'foo': 'bar'})
+        json_test = serializers.serialize('json', [model_test])
+        for deserialized_test in serializers.deserialize('json', json_test):
+            self.assertEquals({'foo': 'bar'}, deserialized_test.object.pickle_field)
+
+    def testUnknownCodec(self):
+        self.assertRaises(ImproperlyConfigured, PickledObjectField, binary=True, compress='no-such-codec')
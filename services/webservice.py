@@ -1,4 +1,13 @@
 #from suds.client import Client
+import os
+import time
+import pickle
+import logging
+import threading
+from hashlib import sha1
+from urlparse import urlparse
+from multiprocessing.pool import ThreadPool
+
 import pysimplesoap
 from pysimplesoap.client import SoapClient
 
@@ -32,45 +41,298 @@ from pysimplesoap.client import SoapClient
         # return self.wsdl_url
 
         
-class WebService:
-    def __init__(self, wsdl_url, timeout=60):
+""" The WSDL of a service is downloaded and parsed once per process and kept
+for WEBSERVICE_WSDL_TTL seconds (and, if WEBSERVICE_WSDL_CACHE_DIR is set,
+pickled there so that new workers don't parse it again). Every thread gets
+its own client per WSDL url and timeout, built from the parsed description.
+The time spent loading WSDLs and calling the operations is collected by
+webservice_stats(). """
+
+logger = logging.getLogger(__name__)
+
+def _setting(name,default):
+    try:
+        from django.conf import settings
+        return getattr(settings,name,default)
+    except ImportError:
+        return default
+
+
+class ServiceDescription(object):
+    """ the parsed WSDL of a service and the methods it offers """
+
+    def __init__(self,wsdl_url,services,namespace,documentation,loaded_at=None):
+        self.wsdl_url = wsdl_url
+        self.services = services
+        self.namespace = namespace
+        self.documentation = documentation
+        self.loaded_at = time.time() if loaded_at is None else loaded_at
+        self.methods = describe_methods(services)
+        self.operations = set(m['name'] for m in self.methods)
+        self.host = urlparse(wsdl_url).netloc
+        for service in services.values():
+            for port in service['ports'].values():
+                if port.get('location'):
+                    self.host = urlparse(port['location']).netloc
+
+    def expired(self,ttl):
+        return ttl is not None and time.time()-self.loaded_at > ttl
+
+    def client(self,timeout):
+        """ returns a new client that uses the parsed WSDL """
         pysimplesoap.client.TIMEOUT = timeout
-        self.client = SoapClient(wsdl=wsdl_url,trace=False)
+        client = SoapClient(trace=False)
+        client.services = self.services
+        client.namespace = self.namespace
+        client.documentation = self.documentation
+        return client
+
+    def dump(self,filename):
+        f = open(filename+'.tmp','wb')
+        try:
+            pickle.dump({'url':self.wsdl_url,'services':self.services,'namespace':self.namespace,
+                         'documentation':self.documentation,'loaded_at':self.loaded_at},f,pickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        os.rename(filename+'.tmp',filename)
+
+    @classmethod
+    def load(cls,filename,wsdl_url):
+        f = open(filename,'rb')
+        try:
+            d = pickle.load(f)
+        finally:
+            f.close()
+        if d['url'] != wsdl_url:
+            return None
+        return cls(wsdl_url,d['services'],d['namespace'],d['documentation'],d['loaded_at'])
+
+
+def describe_methods(services):
+    methods = []
+    for service in services.values():
+        for port in service['ports'].values():
+            for op in port['operations'].values():
+                method = {}
+                try:
+                    method['documentation']=op['documentation']
+                except:
+                    method['documentation']="No documentation provided."
+                method['name']=op['name']
+                method['inputs']=[]
+                method['outputs']=[]
+                try:
+                    input_dict = op['input'].values()[0]
+                except:
+                    input_dict = []
+                for i in input_dict:
+                    input = {}
+                    input['name']=i
+                    input['type']=input_dict[i]
+                    method['inputs'].append(input)
+                try:
+                    output_dict = op['output'].values()[0]
+                except:
+                    output_dict = [[]]
+                if type(output_dict)==type([]):
+                    output_dict = output_dict[0]
+                for o in output_dict:
+                    output = {}
+                    output['name']=o
+                    method['outputs'].append(output)
+                methods.append(method)
+    return methods
+
+
+class WebServiceStats(object):
+    """ counts and times the WSDL loads and the calls of the operations """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.wsdl = {}
+            self.calls = {}
+
+    def loaded(self,wsdl_url,source,seconds):
+        """ source is 'memory', 'disk' or 'download' """
+        with self.lock:
+            s = self.wsdl.setdefault(wsdl_url,{'memory':0,'disk':0,'download':0,'load_time':0.0})
+            s[source] += 1
+            s['load_time'] += seconds
+
+    def called(self,wsdl_url,method,seconds,error=False):
+        with self.lock:
+            s = self.calls.setdefault((wsdl_url,method),{'calls':0,'errors':0,'time':0.0,'max_time':0.0})
+            s['calls'] += 1
+            s['errors'] += int(error)
+            s['time'] += seconds
+            s['max_time'] = max(s['max_time'],seconds)
+
+    def as_dict(self):
+        with self.lock:
+            calls = {}
+            for key,s in self.calls.items():
+                s = dict(s)
+                s['mean_time'] = s['time']/s['calls']
+                calls[key] = s
+            return {'wsdl':dict((url,dict(s)) for url,s in self.wsdl.items()),'calls':calls}
+
+stats = WebServiceStats()
+
+def webservice_stats():
+    """ returns {'wsdl': {url: counts of the loads from memory, disk and by
+    downloading, and the seconds spent loading}, 'calls': {(url, method):
+    calls, errors and their total, mean and max seconds}} of this process """
+    return stats.as_dict()
+
+
+_descriptions = {}
+_descriptions_lock = threading.Lock()
+_local = threading.local()
+
+def _cache_filename(cache_dir,wsdl_url):
+    return os.path.join(cache_dir,'wsdl-%s.pkl' % sha1(wsdl_url).hexdigest())
+
+def get_description(wsdl_url,timeout=60,refresh=False):
+    """ returns the parsed WSDL of the service, from memory, from the disk
+    cache or by downloading it """
+    start = time.time()
+    ttl = _setting('WEBSERVICE_WSDL_TTL',3600)
+    with _descriptions_lock:
+        description = _descriptions.get(wsdl_url)
+    if description is not None and not refresh and not description.expired(ttl):
+        stats.loaded(wsdl_url,'memory',time.time()-start)
+        return description
+    cache_dir = _setting('WEBSERVICE_WSDL_CACHE_DIR',None)
+    description = None
+    if cache_dir and not refresh:
+        try:
+            description = ServiceDescription.load(_cache_filename(cache_dir,wsdl_url),wsdl_url)
+        except (IOError,EOFError):
+            pass
+        except Exception:
+            logger.warning('Could not read the cached WSDL of %s',wsdl_url,exc_info=True)
+        if description is not None and description.expired(ttl):
+            description = None
+        if description is not None:
+            stats.loaded(wsdl_url,'disk',time.time()-start)
+    if description is None:
+        pysimplesoap.client.TIMEOUT = timeout
+        client = SoapClient(wsdl=wsdl_url,trace=False)
+        description = ServiceDescription(wsdl_url,client.services,client.namespace,getattr(client,'documentation',None))
+        stats.loaded(wsdl_url,'download',time.time()-start)
+        if cache_dir:
+            try:
+                description.dump(_cache_filename(cache_dir,wsdl_url))
+            except Exception:
+                logger.warning('Could not cache the WSDL of %s',wsdl_url,exc_info=True)
+    with _descriptions_lock:
+        _descriptions[wsdl_url] = description
+    return description
+
+def forget_descriptions():
+    with _descriptions_lock:
+        _descriptions.clear()
+
+def get_client(description,timeout=60):
+    """ returns the client of this thread for the service and timeout """
+    clients = getattr(_local,'clients',None)
+    if clients is None:
+        clients = _local.clients = {}
+    key = (description.wsdl_url,timeout)
+    entry = clients.get(key)
+    if entry is None or entry[0] is not description:
+        entry = clients[key] = (description,description.client(timeout))
+    return entry[1]
+
+
+class TimedClient(object):
+    """ a client whose operation calls are timed (see webservice_stats) """
+
+    def __init__(self,client,description):
+        self._client = client
+        self._description = description
+
+    def __getattr__(self,name):
+        attr = getattr(self._client,name)
+        if not name in self._description.operations:
+            return attr
+        wsdl_url = self._description.wsdl_url
+        def call(*args,**kwargs):
+            start = time.time()
+            error = True
+            try:
+                result = attr(*args,**kwargs)
+                error = False
+                return result
+            finally:
+                stats.called(wsdl_url,name,time.time()-start,error)
+        return call
+
+
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+def host_semaphore(host):
+    """ limits the concurrent calls of call_many to a host to
+    WEBSERVICE_HOST_CONCURRENCY """
+    with _host_semaphores_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = _host_semaphores[host] = threading.BoundedSemaphore(_setting('WEBSERVICE_HOST_CONCURRENCY',4))
+    return semaphore
+
+
+class WebService:
+    def __init__(self, wsdl_url, timeout=60, refresh=False):
+        description = get_description(wsdl_url,timeout,refresh)
+        self.description = description
+        self.timeout = timeout
+        self.client = TimedClient(get_client(description,timeout),description)
         self.wsdl_url = wsdl_url
         self.name = wsdl_url
-        self.methods = []
-        for service in self.client.services.values():
-            for port in service['ports'].values():
-                for op in port['operations'].values():
-                    method = {}
-                    try:
-                        method['documentation']=op['documentation']
-                    except:
-                        method['documentation']="No documentation provided."
-                    method['name']=op['name']
-                    method['inputs']=[]
-                    method['outputs']=[]
-                    try:
-                        input_dict = op['input'].values()[0]
-                    except:
-                        input_dict = []
-                    for i in input_dict:
-                        input = {}
-                        input['name']=i
-                        input['type']=input_dict[i]
-                        method['inputs'].append(input)
-                    try:
-                        output_dict = op['output'].values()[0]
-                    except:
-                        output_dict = [[]]
-                    if type(output_dict)==type([]):
-                        output_dict = output_dict[0]
-                    for o in output_dict:
-                        output = {}
-                        output['name']=o
-                        method['outputs'].append(output)
-                    self.methods.append(method)
+        # shared by all instances for the url, don't change it
+        self.methods = description.methods
+    def call_many(self, method, calls, workers=None, fail_fast=True):
+        """ calls the method once for every dictionary of arguments in calls,
+        on at most workers (WEBSERVICE_BATCH_WORKERS) threads and with at
+        most WEBSERVICE_HOST_CONCURRENCY calls to the host at the same time.
+        Returns the results in the order of the calls. With fail_fast the
+        first error is raised and the calls that haven't started are
+        skipped, otherwise failed calls return their exception. """
+        if workers is None:
+            workers = _setting('WEBSERVICE_BATCH_WORKERS',8)
+        semaphore = host_semaphore(self.description.host)
+        failed = threading.Event()
+        def call(kwargs):
+            if fail_fast and failed.is_set():
+                return None
+            with semaphore:
+                if fail_fast and failed.is_set():
+                    return None
+                client = TimedClient(get_client(self.description,self.timeout),self.description)
+                try:
+                    return getattr(client,method)(**kwargs)
+                except Exception, e:
+                    failed.set()
+                    return e
+        if not calls:
+            return []
+        pool = ThreadPool(max(1,min(workers,len(calls))))
+        try:
+            results = pool.map(call,calls)
+        finally:
+            pool.close()
+            pool.join()
+        if fail_fast:
+            for result in results:
+                if isinstance(result,Exception):
+                    raise result
+        return results
     def __unicode__(self):
         return self.wsdl_url
     def __str__(self):
-        return self.wsdl_url
\ No newline at end of file
+        return self.wsdl_url
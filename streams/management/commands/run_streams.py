@@ -1,39 +1,36 @@
+from optparse import make_option
 from django.core.management.base import NoArgsCommand
 
 class Command(NoArgsCommand):
-    help = 'check for streams that need to be executed and execute them'
-    option_list = NoArgsCommand.option_list
+    help = 'execute the active streams when they are due'
+    option_list = NoArgsCommand.option_list + (
+        make_option('-w', '--workers',
+            dest='workers',
+            type='int',
+            default=None,
+            help='Number of streams that are executed at the same time (STREAM_SCHEDULER_WORKERS by default).'
+        ),
+        make_option('-r', '--refresh',
+            dest='refresh',
+            type='float',
+            default=None,
+            help='Seconds between checks for changed streams (STREAM_SCHEDULER_REFRESH by default).'
+        ),
+        make_option('-m', '--metrics-interval',
+            dest='metrics_interval',
+            type='float',
+            default=60,
+            help='Seconds between reports of the lag of the streams.'
+        ),
+    )
     def handle_noargs(self, **options):
-        import time
-        from streams.models import Stream
-        self.stdout.write("Working on streams...")
-        self.stdout.flush()
-
-        while True:
-            streams = Stream.objects.filter(active=True)
-            for stream in streams:
-                #self.stdout.write(u"\nChecking stream "+unicode(stream)+"...\n")
-                #self.stdout.flush()
-                #preverimo ce je ze dost casa pretekl
-                import django
-                now = django.utils.timezone.now()
-                delta = now - stream.last_executed
-                delta_seconds = delta.seconds + delta.days * 86400
-                if delta_seconds > stream.period:
-                    stream.last_executed = now
-                    stream.save()
-                    self.stdout.write(u"Executing "+unicode(stream)+"...")
-                    self.stdout.flush()
-                    try:
-                        stream.execute()
-                    except:
-                        import traceback
-                        self.stdout.write("\n ERROR in executing stream:\n")
-                        traceback.print_exc(file=self.stdout)
-                    self.stdout.write("done!\n")
-                    self.stdout.flush()
-                    #print stream.execute()
-            time.sleep(1)
-            #self.stdout.write(".")
-            #self.stdout.flush()
-
+        from streams.scheduler import StreamScheduler
+        scheduler = StreamScheduler(workers=options['workers'],refresh=options['refresh'],
+                                    metrics_interval=options['metrics_interval'],stdout=self.stdout)
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            scheduler.stop()
+        for stream_id,m in sorted(scheduler.lag_metrics().items()):
+            self.stdout.write("Stream %d: %d runs, %d errors, mean lag %.2f s, max lag %.2f s\n" % (
+                stream_id,m['runs'],m['errors'],m['mean_lag'],m['max_lag']))
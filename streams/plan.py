@@ -0,0 +1,235 @@
+""" Execution plans of stream workflows.
+
+Stream.execute used to walk the widgets, inputs and connections of the
+workflow with the ORM on every tick. A plan holds what a tick needs: the
+widgets in the order they can run, where every input gets its value from
+and the library function of every widget. Plans are compiled once and kept
+in memory until the structure of the workflow (or of one of its
+subprocesses) changes: every tick compares a digest of the widgets, inputs,
+outputs and connections with the one the plan was compiled from, and reads
+the values of the parameters. Plans keep ids, never model instances, so the
+widgets passed to the library functions are read on every tick. """
+
+import hashlib
+import threading
+
+import workflows.library
+from workflows.models import Workflow, Widget, Input, Output, Connection
+
+from streams.models import HaltStream
+
+
+class WidgetStep(object):
+    """ a widget of the plan """
+
+    def __init__(self,widget,inputs,outputs,sources,outer_sources):
+        self.pk = widget.pk
+        self.type = widget.type
+        self.predecessors = set()
+        # (variable, multiple, input id, parameter, id of the connected output)
+        self.inputs = [(i.variable,i.multi_id != 0,i.id,i.parameter,sources.get(i.id)) for i in inputs]
+        self.outputs = [(o.pk,o.variable) for o in outputs]
+        self.function = None
+        self.subprocess = None
+        aw = widget.abstract_widget
+        if self.type == 'regular':
+            self.function = getattr(workflows.library,aw.action)
+            self.has_progress_bar = aw.has_progress_bar
+            self.is_streaming = aw.is_streaming
+            self.wsdl = aw.wsdl
+            self.wsdl_method = aw.wsdl_method
+        if self.type == 'for_output' or self.type == 'output':
+            # (variable, outer output id, outer output variable)
+            self.outer_outputs = [(i.variable,i.outer_output_id,i.outer_output.variable) for i in inputs]
+        if self.type == 'input':
+            # (output id, variable, id of the output connected to the outer input)
+            self.outer_sources = [(o.pk,o.variable,outer_sources.get(o.outer_input_id)) for o in outputs]
+
+    def input_dict(self,outputs,parameters):
+        input_dict = {}
+        for variable,multiple,input_id,parameter,source in self.inputs:
+            if parameter:
+                value = parameters.get(input_id)
+            elif source is not None:
+                value = outputs[source][1]
+            else:
+                value = None
+            if not multiple:
+                input_dict[variable] = value
+            else:
+                if not variable in input_dict:
+                    input_dict[variable] = []
+                if not value == None:
+                    input_dict[variable].append(value)
+        return input_dict
+
+    def run(self,stream,outputs,parameters,for_input):
+        """ runs the widget and stores its outputs. Returns False if the
+        widget halted the stream. """
+        input_dict = self.input_dict(outputs,parameters)
+        output_dict = {}
+        if self.type == 'regular':
+            if self.wsdl != '':
+                input_dict['wsdl'] = self.wsdl
+                input_dict['wsdl_method'] = self.wsdl_method
+            try:
+                if self.has_progress_bar:
+                    output_dict = self.function(input_dict,Widget.objects.get(pk=self.pk))
+                elif self.is_streaming:
+                    output_dict = self.function(input_dict,Widget.objects.get(pk=self.pk),stream)
+                else:
+                    output_dict = self.function(input_dict)
+            except (HaltStream,Widget.DoesNotExist):
+                # a deleted widget halts the branch until the plan is compiled again
+                return False
+        elif self.type == 'subprocess':
+            new_outputs = {}
+            if self.subprocess is not None:
+                new_outputs = self.subprocess.run(stream,outputs,parameters)
+            for pk,variable in self.outputs:
+                outputs[pk] = new_outputs.get(pk,(variable,None))
+            return True
+        elif self.type == 'for_input':
+            for pk,variable in self.outputs:
+                outputs[pk] = (variable,for_input)
+                output_dict[variable] = for_input
+        elif self.type == 'for_output':
+            for variable,outer_output_id,outer_variable in self.outer_outputs:
+                outputs[outer_output_id][1].append(input_dict[variable])
+                output_dict[variable] = input_dict[variable]
+        elif self.type == 'input':
+            for pk,variable,source in self.outer_sources:
+                try:
+                    output_dict[variable] = outputs[source][1]
+                except KeyError:
+                    output_dict[variable] = None
+        elif self.type == 'output':
+            for variable,outer_output_id,outer_variable in self.outer_outputs:
+                outputs[outer_output_id] = (outer_variable,input_dict[variable])
+        for pk,variable in self.outputs:
+            outputs[pk] = (variable,output_dict[variable])
+        return True
+
+
+class StreamPlan(object):
+    """ the widgets of a workflow (and, recursively, of its subprocesses)
+    in an order in which they can run """
+
+    def __init__(self,workflow):
+        self.workflow_id = workflow.pk
+        self.workflow_ids = [workflow.pk]
+        widgets = list(workflow.widgets.select_related('abstract_widget'))
+        inputs = {}
+        for i in Input.objects.filter(widget__workflow=workflow).select_related('outer_output'):
+            inputs.setdefault(i.widget_id,[]).append(i)
+        outputs = {}
+        for o in Output.objects.filter(widget__workflow=workflow):
+            outputs.setdefault(o.widget_id,[]).append(o)
+        sources = {}
+        predecessors = dict((w.pk,set()) for w in widgets)
+        for input_id,output_id,input_widget,output_widget in workflow.connections.order_by('pk').values_list('input','output','input__widget','output__widget'):
+            sources.setdefault(input_id,output_id)
+            predecessors[input_widget].add(output_widget)
+        outer_inputs = [o.outer_input_id for w in widgets if w.type == 'input' for o in outputs.get(w.pk,[]) if o.outer_input_id is not None]
+        outer_sources = {}
+        for input_id,output_id in Connection.objects.filter(input__in=outer_inputs).order_by('pk').values_list('input','output'):
+            outer_sources.setdefault(input_id,output_id)
+
+        steps = {}
+        for w in widgets:
+            step = WidgetStep(w,inputs.get(w.pk,[]),outputs.get(w.pk,[]),sources,outer_sources)
+            step.predecessors = predecessors[w.pk]
+            if w.type == 'subprocess':
+                try:
+                    step.subprocess = StreamPlan(w.workflow_link)
+                    self.workflow_ids.extend(step.subprocess.workflow_ids)
+                except Workflow.DoesNotExist:
+                    pass
+            steps[w.pk] = step
+
+        # the widgets run in layers: a widget runs after all its predecessors
+        self.steps = []
+        done = set()
+        remaining = [w.pk for w in widgets]
+        while remaining:
+            layer = [pk for pk in remaining if steps[pk].predecessors <= done]
+            if not layer:
+                break
+            self.steps.extend(steps[pk] for pk in layer)
+            done.update(layer)
+            remaining = [pk for pk in remaining if not pk in done]
+
+        self.for_loop = workflow.is_for_loop()
+        if self.for_loop:
+            fi = [w for w in widgets if w.type == 'for_input'][0]
+            fo = [w for w in widgets if w.type == 'for_output'][0]
+            outer_output = inputs[fo.pk][0].outer_output
+            self.collected_output = (outer_output.pk,outer_output.variable)
+            self.list_source = None
+            fi_outputs = outputs.get(fi.pk,[])
+            if fi_outputs and fi_outputs[0].outer_input_id is not None:
+                connections = Connection.objects.filter(input=fi_outputs[0].outer_input_id).order_by('pk')[:1]
+                for c in connections:
+                    self.list_source = c.output_id
+
+    def parameters(self):
+        """ the values of the parameters of all widgets, by input id """
+        return dict((i.id,i.value) for i in Input.objects.filter(widget__workflow__in=self.workflow_ids,parameter=True))
+
+    def run(self,stream,outputs,parameters=None):
+        if parameters is None:
+            parameters = self.parameters()
+        if self.for_loop:
+            outputs[self.collected_output[0]] = (self.collected_output[1],[])
+            input_list = []
+            if self.list_source is not None:
+                try:
+                    input_list = outputs[self.list_source][1]
+                except KeyError:
+                    input_list = []
+        else:
+            input_list = [0]
+        for for_input in input_list:
+            halted = set()
+            for step in self.steps:
+                if step.predecessors & halted or not step.run(stream,outputs,parameters,for_input):
+                    halted.add(step.pk)
+        return outputs
+
+
+def structure_version(workflow_ids):
+    """ a digest of the widgets, inputs, outputs, connections and subprocess
+    workflows of the workflows; changes whenever one of them is added,
+    removed or reconnected (also when a deleted row is recreated with the
+    same id) """
+    digest = hashlib.sha1()
+    for rows in (
+            Widget.objects.filter(workflow__in=workflow_ids).order_by('pk').values_list('pk','type','abstract_widget'),
+            Workflow.objects.filter(widget__workflow__in=workflow_ids).order_by('pk').values_list('pk','widget'),
+            Input.objects.filter(widget__workflow__in=workflow_ids).order_by('pk').values_list('pk','widget','variable','parameter','multi_id','outer_output'),
+            Output.objects.filter(widget__workflow__in=workflow_ids).order_by('pk').values_list('pk','widget','variable','outer_input'),
+            Connection.objects.filter(workflow__in=workflow_ids).order_by('pk').values_list('pk','output','input'),
+        ):
+        digest.update(repr(list(rows)))
+    return digest.hexdigest()
+
+
+_plans = {}
+_plans_lock = threading.Lock()
+
+def get_plan(workflow):
+    """ returns the plan of the workflow, compiling it if the workflow
+    changed since it was compiled last """
+    with _plans_lock:
+        plan = _plans.get(workflow.pk)
+    if plan is not None and plan.version == structure_version(plan.workflow_ids):
+        return plan
+    plan = StreamPlan(workflow)
+    plan.version = structure_version(plan.workflow_ids)
+    with _plans_lock:
+        _plans[workflow.pk] = plan
+    return plan
+
+def forget_plans():
+    with _plans_lock:
+        _plans.clear()
@@ -0,0 +1,208 @@
+""" Scheduler that executes the active streams when they are due.
+
+The streams are kept in a heap ordered by the time they are due (the time
+they were last executed plus their period) and due streams are executed
+on a pool of worker threads, so a slow stream doesn't hold up the others.
+A stream is never executed twice at the same time: if it is still running
+when it is due again it is executed as soon as it finishes. Changes of
+streams (period, active) are picked up by reading only the streams whose
+updated time changed since the last check. The lag of the executions
+(how long after the due time they started) is logged and kept in the
+default cache (see stream_lag_metrics). """
+
+import heapq
+import threading
+import time
+import datetime
+import logging
+import traceback
+from multiprocessing.pool import ThreadPool
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_connection
+from django.utils import timezone
+
+from streams.models import Stream
+
+logger = logging.getLogger(__name__)
+
+METRICS_CACHE_KEY = 'streams:lag-metrics'
+
+def stream_lag_metrics():
+    """ returns the metrics the running scheduler published last (a
+    dictionary of stream ids and StreamMetrics.as_dict()) """
+    return cache.get(METRICS_CACHE_KEY,{})
+
+
+class StreamMetrics(object):
+    """ how late (lag) and how long the executions of a stream were """
+
+    def __init__(self):
+        self.runs = 0
+        self.errors = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.last_duration = 0.0
+        self.last_started = None
+
+    def started(self,lag,now):
+        self.runs += 1
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag,lag)
+        self.total_lag += lag
+        self.last_started = now
+
+    def as_dict(self):
+        return {'runs':self.runs,
+                'errors':self.errors,
+                'last_lag':self.last_lag,
+                'max_lag':self.max_lag,
+                'mean_lag':self.total_lag/self.runs if self.runs else 0.0,
+                'last_duration':self.last_duration,
+                'last_started':self.last_started}
+
+
+class StreamScheduler(object):
+
+    def __init__(self,workers=None,refresh=None,metrics_interval=60,stdout=None):
+        if workers is None:
+            workers = getattr(settings,'STREAM_SCHEDULER_WORKERS',4)
+        if refresh is None:
+            refresh = getattr(settings,'STREAM_SCHEDULER_REFRESH',1)
+        self.workers = max(1,workers)
+        self.refresh = refresh
+        self.metrics_interval = metrics_interval
+        self.stdout = stdout
+        self.heap = []
+        # stream id -> (due, period) of the active streams
+        self.schedule = {}
+        # stream id -> (active, period, last_executed) as last read
+        self.known = {}
+        self.running = set()
+        self.metrics = {}
+        self.updated = None
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.pool = None
+
+    def write(self,message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+            self.stdout.flush()
+
+    def load(self):
+        """ reads the streams that changed since the last call (all streams
+        on the first call) and (re)schedules them """
+        streams = Stream.objects.all()
+        if self.updated is not None:
+            # rows saved at the same time as the last one may not have been read
+            streams = streams.filter(updated__gte=self.updated)
+        for stream_id,active,period,last_executed,updated in streams.values_list('id','active','period','last_executed','updated'):
+            if self.updated is None or updated > self.updated:
+                self.updated = updated
+            state = (active,period,last_executed)
+            if self.known.get(stream_id) == state:
+                continue
+            self.known[stream_id] = state
+            with self.condition:
+                if not active:
+                    self.schedule.pop(stream_id,None)
+                elif stream_id in self.running:
+                    # rescheduled with the new period when it finishes
+                    self.schedule[stream_id] = (None,period)
+                else:
+                    self.push(stream_id,last_executed+datetime.timedelta(seconds=period),period)
+                self.condition.notify()
+
+    def push(self,stream_id,due,period):
+        self.schedule[stream_id] = (due,period)
+        heapq.heappush(self.heap,(due,stream_id))
+
+    def pop_due(self,now):
+        """ returns the ids and due times of the streams that are due and
+        not running, and the time the next stream is due """
+        due_streams = []
+        while self.heap and self.heap[0][0] <= now:
+            due,stream_id = heapq.heappop(self.heap)
+            entry = self.schedule.get(stream_id)
+            if entry is None or entry[0] != due:
+                # removed or rescheduled
+                continue
+            if stream_id in self.running:
+                continue
+            self.running.add(stream_id)
+            due_streams.append((stream_id,due))
+        next_due = self.heap[0][0] if self.heap else None
+        return due_streams,next_due
+
+    def run(self):
+        self.pool = ThreadPool(self.workers)
+        self.write("Working on streams with %d workers...\n" % self.workers)
+        last_load = 0
+        last_metrics = time.time()
+        try:
+            while not self.stopped:
+                if time.time()-last_load >= self.refresh:
+                    self.load()
+                    last_load = time.time()
+                if time.time()-last_metrics >= self.metrics_interval:
+                    self.publish_metrics()
+                    last_metrics = time.time()
+                now = timezone.now()
+                with self.condition:
+                    due_streams,next_due = self.pop_due(now)
+                for stream_id,due in due_streams:
+                    Stream.objects.filter(pk=stream_id).update(last_executed=now)
+                    self.pool.apply_async(self.execute,[stream_id,due,now])
+                timeout = self.refresh
+                if next_due is not None:
+                    timeout = min(timeout,max(0,(next_due-timezone.now()).total_seconds()))
+                with self.condition:
+                    if not self.stopped:
+                        self.condition.wait(timeout)
+        finally:
+            self.pool.close()
+            self.pool.join()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def execute(self,stream_id,due,started):
+        metrics = self.metrics.setdefault(stream_id,StreamMetrics())
+        lag = max(0.0,(started-due).total_seconds())
+        metrics.started(lag,started)
+        start = time.time()
+        try:
+            stream = Stream.objects.get(pk=stream_id)
+            self.write(u"Executing "+unicode(stream)+" (%.1f s late)...\n" % lag)
+            stream.execute(outputs={})
+        except Stream.DoesNotExist:
+            with self.condition:
+                self.schedule.pop(stream_id,None)
+        except:
+            metrics.errors += 1
+            self.write("ERROR in executing stream %d:\n%s" % (stream_id,traceback.format_exc()))
+        finally:
+            close_connection()
+            metrics.last_duration = time.time()-start
+            with self.condition:
+                self.running.discard(stream_id)
+                entry = self.schedule.get(stream_id)
+                if entry is not None:
+                    self.push(stream_id,started+datetime.timedelta(seconds=entry[1]),entry[1])
+                self.condition.notify()
+
+    def lag_metrics(self):
+        """ returns a dictionary of stream ids and their metrics """
+        return dict((stream_id,metrics.as_dict()) for stream_id,metrics in self.metrics.items())
+
+    def publish_metrics(self):
+        metrics = self.lag_metrics()
+        cache.set(METRICS_CACHE_KEY,metrics,max(self.metrics_interval*10,300))
+        for stream_id,m in sorted(metrics.items()):
+            logger.info('Stream %d: %d runs, %d errors, lag %.2f s (mean %.2f s, max %.2f s), last run %.2f s',
+                        stream_id,m['runs'],m['errors'],m['last_lag'],m['mean_lag'],m['max_lag'],m['last_duration'])
@@ -0,0 +1,248 @@
+""" State of streaming widgets kept in small rows instead of one pickle.
+
+A widget that keeps its state in StreamWidgetData loads, changes and saves
+the whole value on every tick. The structures here keep every member or
+appended segment in its own StreamWidgetEntry, so a tick only writes what
+changed:
+
+ * StreamSet, a set with indexed membership tests (e.g. seen links),
+ * StreamLog, an append-only list of segments,
+ * StreamRingBuffer, the newest n values,
+ * StreamMap, a dictionary whose items are read and written one by one,
+ * StreamItems, collected items (tweets) ordered by their created_at.
+
+Old entries are removed by compacting a structure, which happens after
+every STREAM_STATE_COMPACT_EVERY writes to it. What is kept is decided by
+the max_size and max_age (seconds) of the structure, which default to
+STREAM_STATE_MAX_SIZE and STREAM_STATE_MAX_AGE. """
+
+import datetime
+import threading
+from hashlib import sha1
+try:
+    from cPickle import dumps, HIGHEST_PROTOCOL
+except ImportError:
+    from pickle import dumps, HIGHEST_PROTOCOL
+
+from django.conf import settings
+from django.utils import timezone
+
+from workflows.execution_cache import canonical
+from streams.models import StreamWidgetEntry, StreamItem
+
+def member_key(member):
+    """ the key of a member of a set or of a map item """
+    return sha1(dumps(canonical(member),HIGHEST_PROTOCOL)).hexdigest()
+
+def item_key(item):
+    """ the key of a collected item: the id of a tweet or the hash of the
+    item """
+    if isinstance(item,dict) and item.get('id') is not None:
+        return unicode(item['id'])[:40]
+    return member_key(item)
+
+_writes = {}
+_writes_lock = threading.Lock()
+
+
+class StreamStructure(object):
+
+    def __init__(self,stream,widget,name,max_size=None,max_age=None):
+        self.stream = stream
+        self.widget = widget
+        self.name = name
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def entries(self):
+        return StreamWidgetEntry.objects.filter(stream=self.stream,widget=self.widget,name=self.name)
+
+    def entry(self,key=None,value=None):
+        return StreamWidgetEntry(stream=self.stream,widget=self.widget,name=self.name,key=key,value=value)
+
+    def clear(self):
+        self.entries().delete()
+
+    def written(self,count=1):
+        """ counts the writes and compacts the structure every
+        STREAM_STATE_COMPACT_EVERY writes """
+        every = getattr(settings,'STREAM_STATE_COMPACT_EVERY',100)
+        structure = (self.stream.pk,self.widget.pk,self.name)
+        with _writes_lock:
+            writes = _writes.get(structure,0)+count
+            _writes[structure] = writes if writes < every else 0
+        if writes >= every:
+            self.compact()
+
+    def compact(self):
+        """ deletes the entries that are older than max_age and all but the
+        max_size newest """
+        max_age = self.max_age if self.max_age is not None else getattr(settings,'STREAM_STATE_MAX_AGE',None)
+        max_size = self.max_size if self.max_size is not None else getattr(settings,'STREAM_STATE_MAX_SIZE',None)
+        if max_age:
+            self.entries().filter(created__lt=timezone.now()-datetime.timedelta(seconds=max_age)).delete()
+        if max_size:
+            oldest_kept = self.entries().order_by('-id').values_list('id',flat=True)[max_size-1:max_size]
+            if oldest_kept:
+                self.entries().filter(id__lt=oldest_kept[0]).delete()
+
+    def __len__(self):
+        return self.entries().count()
+
+
+class StreamSet(StreamStructure):
+    """ a set of picklable members. Membership is tested with an indexed
+    lookup of the hash of the member. """
+
+    def __contains__(self,member):
+        return self.entries().filter(key=member_key(member)).exists()
+
+    def new_members(self,members):
+        """ returns the members (in the same order) that are not in the set,
+        with a single query """
+        keys = [member_key(m) for m in members]
+        existing = set(self.entries().filter(key__in=keys).values_list('key',flat=True))
+        return [m for m,key in zip(members,keys) if not key in existing]
+
+    def add(self,member):
+        """ adds the member and returns True if it wasn't in the set """
+        if member in self:
+            return False
+        self.entry(member_key(member),member).save()
+        self.written()
+        return True
+
+    def update(self,members):
+        """ adds the members and returns the ones that were new """
+        new = []
+        keys = set()
+        for member in self.new_members(members):
+            key = member_key(member)
+            if not key in keys:
+                keys.add(key)
+                new.append(member)
+        StreamWidgetEntry.objects.bulk_create([self.entry(member_key(m),m) for m in new])
+        if new:
+            self.written(len(new))
+        return new
+
+    def __iter__(self):
+        for entry in self.entries().order_by('id'):
+            yield entry.value
+
+
+class StreamLog(StreamStructure):
+    """ an append-only list of segments (lists of values) """
+
+    def append(self,values):
+        self.entry(value=list(values)).save()
+        self.written()
+
+    def segments(self,newest_first=False):
+        entries = self.entries().order_by('-id' if newest_first else 'id')
+        for entry in entries:
+            yield entry.value
+
+    def __iter__(self):
+        for segment in self.segments():
+            for value in segment:
+                yield value
+
+
+class StreamRingBuffer(StreamLog):
+    """ the size newest values, newest first. Each push writes a single
+    segment and deletes the segments that no longer fit. """
+
+    def __init__(self,stream,widget,name,size):
+        StreamLog.__init__(self,stream,widget,name)
+        self.size = size
+
+    def push(self,values):
+        """ adds the values (newest first) and returns the buffer """
+        values = list(values)[:self.size]
+        if values:
+            self.entry(value=values).save()
+        return self.items()
+
+    def items(self):
+        window = []
+        keep = None
+        for entry in self.entries().order_by('-id').only('id','value'):
+            if len(window) >= self.size:
+                keep = entry.id
+                break
+            window.extend(entry.value)
+        if keep is not None:
+            self.entries().filter(id__lte=keep).delete()
+        return window[:self.size]
+
+
+class StreamMap(StreamStructure):
+    """ a dictionary with picklable keys whose items are kept in separate
+    entries (as (key, value) pairs) """
+
+    def get(self,key,default=None):
+        for entry in self.entries().filter(key=member_key(key))[:1]:
+            return entry.value[1]
+        return default
+
+    def __setitem__(self,key,value):
+        if not self.entries().filter(key=member_key(key)).update(value=(key,value)):
+            self.entry(member_key(key),(key,value)).save()
+            self.written()
+
+    def items(self):
+        return [entry.value for entry in self.entries().order_by('id')]
+
+    def __delitem__(self,key):
+        self.entries().filter(key=member_key(key)).delete()
+
+
+class StreamItems(object):
+    """ the items (dictionaries with a created_at, like tweets) collected by
+    a widget, one row each. Pages, counts and the newest items are read with
+    range queries on the (stream, widget, created_at) index. """
+
+    def __init__(self,stream,widget):
+        self.stream = stream
+        self.widget = widget
+
+    def rows(self):
+        return StreamItem.objects.filter(stream=self.stream,widget=self.widget)
+
+    def row(self,item):
+        created_at = item.get('created_at') if isinstance(item,dict) else None
+        return StreamItem(stream=self.stream,widget=self.widget,key=item_key(item),created_at=created_at,value=item)
+
+    def extend(self,items):
+        StreamItem.objects.bulk_create([self.row(item) for item in items])
+
+    def replace(self,items):
+        """ makes the items the collected items, writing only the ones that
+        weren't collected and deleting the ones that aren't among them """
+        rows = dict((item_key(item),item) for item in items)
+        existing = set()
+        stale = []
+        for pk,key in self.rows().values_list('pk','key'):
+            if key in rows and not key in existing:
+                existing.add(key)
+            else:
+                stale.append(pk)
+        for start in range(0,len(stale),500):
+            StreamItem.objects.filter(pk__in=stale[start:start+500]).delete()
+        self.extend([item for key,item in rows.items() if not key in existing])
+
+    def ordered(self,newest_first=False):
+        """ a QuerySet of the rows by created_at, which can be paginated """
+        if newest_first:
+            return self.rows().order_by('-created_at','-id')
+        return self.rows().order_by('created_at','id')
+
+    def newest(self,limit=None):
+        rows = self.ordered(newest_first=True)
+        if limit is not None:
+            rows = rows[:limit]
+        return [row.value for row in rows]
+
+    def __len__(self):
+        return self.rows().count()
@@ -5,7 +5,11 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
+import datetime
 from django.test import TestCase
+from workflows.models import Workflow, Widget, Input, Connection
+from streams.models import Stream
+from streams.plan import get_plan
 
 
 class SimpleTest(TestCase):
@@ -14,3 +18,111 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class StreamSchedulerTest(TestCase):
+    def test_due_streams(self):
+        from streams.scheduler import StreamScheduler
+        now = datetime.datetime(2013,1,1,12,0,0)
+        seconds = lambda s: datetime.timedelta(seconds=s)
+        scheduler = StreamScheduler(workers=2)
+        scheduler.push(1,now-seconds(5),60)
+        scheduler.push(2,now+seconds(30),60)
+        scheduler.push(3,now-seconds(1),10)
+        # rescheduled, the first entry is stale
+        scheduler.push(3,now-seconds(2),10)
+        due,next_due = scheduler.pop_due(now)
+        self.assertEqual(due,[(1,now-seconds(5)),(3,now-seconds(2))])
+        self.assertEqual(next_due,now+seconds(30))
+        # a stream that is running isn't executed again until it finishes
+        scheduler.push(1,now,60)
+        due,next_due = scheduler.pop_due(now)
+        self.assertEqual(due,[])
+        self.assertEqual(scheduler.running,set([1,3]))
+
+
+class StreamPlanTest(TestCase):
+    fixtures = ['test_data',]
+    def test_execute(self):
+        w = Workflow.objects.get(name='For loop test')
+        stream = Stream.objects.create(user=w.user,workflow=w)
+        outputs = stream.execute()
+        self.assertEqual(outputs[7][1],[20,40,60,80])
+        plan = get_plan(w)
+        self.assertTrue(get_plan(w) is plan)
+        Widget.objects.create(workflow=w,x=0,y=0,name='Untitled widget',type='subprocess')
+        self.assertFalse(get_plan(w) is plan)
+
+    def test_reconnect(self):
+        w = Workflow.objects.get(name='For loop test')
+        plan = get_plan(w)
+        # moving a connection to another input keeps the number and the ids
+        # of the connections
+        c = Connection.objects.filter(workflow__in=plan.workflow_ids).order_by('-pk')[0]
+        other = Input.objects.filter(widget__workflow=c.workflow,parameter=False).exclude(pk=c.input_id)[0]
+        Connection.objects.filter(pk=c.pk).update(input=other)
+        self.assertFalse(get_plan(w) is plan)
+
+    def test_fresh_widget(self):
+        w = Workflow.objects.get(name='For loop test')
+        stream = Stream.objects.create(user=w.user,workflow=w)
+        plan = get_plan(w)
+        step = [s for s in plan.steps if s.type == 'regular'][0]
+        names = []
+        action = step.function
+        def function(input_dict,widget):
+            names.append(widget.name)
+            return action(input_dict)
+        step.function, step.has_progress_bar = function, True
+        Widget.objects.filter(pk=step.pk).update(name='Renamed')
+        self.assertEqual(stream.execute()[7][1],[20,40,60,80])
+        self.assertEqual(set(names),set(['Renamed']))
+
+
+class StreamStateTest(TestCase):
+    fixtures = ['test_data',]
+    def setUp(self):
+        w = Workflow.objects.get(name='For loop test')
+        self.stream = Stream.objects.create(user=w.user,workflow=w)
+        self.widget = Widget.objects.get(id=1)
+
+    def test_set(self):
+        from streams.state import StreamSet
+        seen = StreamSet(self.stream,self.widget,'links',max_size=3)
+        self.assertEqual(seen.update(['a','b','a']),['a','b'])
+        self.assertEqual(seen.new_members(['b','c']),['c'])
+        self.assertTrue(seen.add('c'))
+        self.assertFalse(seen.add('c'))
+        self.assertTrue('a' in seen)
+        seen.add('d')
+        seen.compact()
+        self.assertEqual(list(seen),['b','c','d'])
+
+    def test_ring_buffer(self):
+        from streams.state import StreamRingBuffer
+        window = StreamRingBuffer(self.stream,self.widget,'window',3)
+        self.assertEqual(window.push([1,2]),[1,2])
+        self.assertEqual(window.push([3]),[3,1,2])
+        self.assertEqual(window.push([4,5]),[4,5,3])
+        self.assertEqual(window.entries().count(),2)
+
+    def test_map(self):
+        from streams.state import StreamMap
+        since_ids = StreamMap(self.stream,self.widget,'since_id')
+        self.assertEqual(since_ids.get('query'),None)
+        since_ids['query'] = 10
+        since_ids['query'] = 12
+        self.assertEqual(since_ids.get('query'),12)
+        self.assertEqual(since_ids.items(),[('query',12)])
+
+    def test_items(self):
+        from streams.state import StreamItems
+        from django.core.paginator import Paginator
+        tweets = [{'id':k,'text':'tweet %d' % k,'created_at':datetime.datetime(2013,1,1,12,k)} for k in range(10)]
+        items = StreamItems(self.stream,self.widget)
+        items.replace(tweets[:6])
+        items.replace(tweets[3:])
+        self.assertEqual(len(items),7)
+        self.assertEqual([t['id'] for t in items.newest(3)],[9,8,7])
+        page = Paginator(items.ordered(),5).page(2)
+        self.assertEqual([row.value['id'] for row in page.object_list],[8,9])
@@ -105,6 +105,47 @@ def bio3graph_extract_triplets(input_dict):
     return {'triplets': triplets}
 
 
+def _corpus_arguments(input_dict):
+    from triplet_extractor import pipeline
+    from django.conf import settings
+    from workflows.forking import can_fork
+
+    documents = pipeline.corpusDocuments(input_dict['documents'])
+    workers = input_dict.get('workers')
+    workers = int(workers) if workers else getattr(settings, 'BIO3GRAPH_CORPUS_WORKERS', None)
+    if not can_fork():
+        workers = 1
+    normalise = input_dict.get('normalise') == 'true'
+    return documents, input_dict['vocabulary'], workers, normalise
+
+
+def bio3graph_extract_triplets_corpus(input_dict):
+    from triplet_extractor import pipeline
+    from workflows.forking import reset_forked_process
+    documents, voc, workers, normalise = _corpus_arguments(input_dict)
+
+    processed = []
+    triplets = []
+    for doc, doc_triplets in pipeline.processCorpus(documents, voc, workers, VP_CHECK_POS=1, normalise=normalise,
+                                                    initializer=reset_forked_process):
+        processed.append(doc)
+        triplets.extend(doc_triplets)
+    return {'documents': processed, 'triplets': triplets}
+
+
+def bio3graph_construct_triplet_network_corpus(input_dict):
+    from triplet_extractor import tripletExtraction as te
+    from triplet_extractor import pipeline
+    from workflows.forking import reset_forked_process
+    documents, voc, workers, normalise = _corpus_arguments(input_dict)
+
+    # the network is built while the documents are processed
+    triplets = pipeline.corpusTriplets(documents, voc, workers, VP_CHECK_POS=1, normalise=normalise,
+                                       initializer=reset_forked_process)
+    graph = te.TripletGraphConstructor(triplets).export_networkx()
+    return {'network_object': graph}
+
+
 def bio3graph_normalise_triplets(input_dict):
     from triplet_extractor import tripletExtraction as te
     triplets = input_dict['triplets']
@@ -0,0 +1,69 @@
+import time
+import multiprocessing
+from os.path import normpath, join, dirname
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Measures the throughput (documents per second) of splitting, tagging and extracting the triplets of a ' \
+           'corpus with the bio3graph corpus pipeline on different numbers of processes.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('-n', '--documents',
+            dest='documents',
+            type='int',
+            default=32,
+            help='Number of copies of the sample document in the corpus.'
+        ),
+        make_option('-c', '--corpus',
+            dest='corpus',
+            default=None,
+            help='Use the .txt documents in this directory instead of the sample document.'
+        ),
+        make_option('-w', '--workers',
+            dest='workers',
+            default=None,
+            help='Comma separated list of the numbers of processes (default 1, 2, 4, ... up to the number of cores).'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        from workflows.bio3graph.library import bio3graph_build_default_vocabulary
+        from workflows.bio3graph.triplet_extractor import data_structures as ds
+        from workflows.bio3graph.triplet_extractor import pipeline
+
+        if options['corpus']:
+            corpus = ds.Corpus()
+            corpus.loadFromDirectory(options['corpus'])
+            texts = [doc.rawText for doc in corpus]
+        else:
+            fname = join(normpath(dirname(ds.__file__)), 'vocabulary', 'pmc2556844.txt')
+            texts = [open(fname).read()] * options['documents']
+        voc = bio3graph_build_default_vocabulary({})['vocabulary']
+        # loads the tagger models, which the workers inherit
+        pipeline.DocumentProcessor(voc)
+
+        if options['workers']:
+            workers = [int(w) for w in options['workers'].split(',')]
+        else:
+            workers = [1]
+            while workers[-1]*2 <= multiprocessing.cpu_count():
+                workers.append(workers[-1]*2)
+
+        expected = None
+        serial = None
+        for w in workers:
+            documents = pipeline.corpusDocuments(texts)
+            start = time.time()
+            triplets = [str(t) for t in pipeline.corpusTriplets(documents, voc, w)]
+            elapsed = time.time() - start
+            if serial is None:
+                serial = elapsed
+            if expected is None:
+                expected = triplets
+            self.stdout.write('%3d processes: %8.3f s %8.2f documents/s %6.2fx  %d triplets%s\n' % (
+                w, elapsed, len(texts) / elapsed, serial / elapsed, len(triplets),
+                '' if triplets == expected else '  DIFFERENT TRIPLETS'))
+            self.stdout.flush()
@@ -0,0 +1,135 @@
+import time
+import random
+from os.path import normpath, join, dirname
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+FILLER = ('the of and in to a was with that for is by were on as are from at be this which these '
+          'expression gene protein plants cells levels response treatment mutant analysis signaling '
+          'pathway leaves induced increased results showed observed during after both however').split()
+
+
+def synthetic_corpus(terms, documents, sentences, rnd):
+    '''documents (abstracts) of random sentences of filler words with a few
+    vocabulary terms, some of them inside longer words'''
+    corpus = []
+    for d in range(documents):
+        document = []
+        for s in range(sentences):
+            words = [rnd.choice(FILLER) for i in range(rnd.randint(12, 30))]
+            for i in range(rnd.randint(0, 4)):
+                term = rnd.choice(terms)
+                if rnd.random() < 0.1:
+                    term = rnd.choice(['', 'x', '-']) + term + rnd.choice(['', 's', '1'])
+                words.insert(rnd.randint(0, len(words)), term)
+            document.append(' '.join(words).capitalize() + '.')
+        corpus.append(document)
+    return corpus
+
+
+class Command(BaseCommand):
+    help = 'Times the lookup of the bio3graph vocabulary in a corpus with the Aho-Corasick matcher and with the ' \
+           'previous search of every term, and checks that they find the same terms.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('-d', '--documents',
+            dest='documents',
+            type='int',
+            default=10000,
+            help='Number of synthetic abstracts.'
+        ),
+        make_option('-s', '--sentences',
+            dest='sentences',
+            type='int',
+            default=10,
+            help='Number of sentences of an abstract.'
+        ),
+        make_option('-c', '--corpus',
+            dest='corpus',
+            default=None,
+            help='Use the .txt documents in this directory instead of synthetic abstracts.'
+        ),
+        make_option('--synonyms',
+            dest='synonyms',
+            type='int',
+            default=20000,
+            help='Number of synthetic compound synonyms added to the default vocabulary.'
+        ),
+        make_option('--scan-limit',
+            dest='scan_limit',
+            type='int',
+            default=2000,
+            help='Only time the previous search on this many sentences.'
+        ),
+        make_option('--seed',
+            dest='seed',
+            type='int',
+            default=0,
+            help='Random seed.'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        from workflows.bio3graph.triplet_extractor import tripletExtraction as te
+        from workflows.bio3graph.triplet_extractor import data_structures as ds
+        from workflows.bio3graph.triplet_extractor.term_matching import TermMatcher, findEntitiesScan
+
+        rnd = random.Random(options['seed'])
+        dname = join(normpath(dirname(te.__file__)), 'vocabulary')
+        compounds = te.readEntitiesLnDoc_csv(join(dname, 'compounds.lst'))
+        for i in range(options['synonyms']):
+            name = 'at%dg%05d' % (rnd.randint(1, 5), rnd.randint(0, 99999))
+            compounds[name] = [name + ' protein', 'gene ' + name.upper()[2:]]
+        voc = te.Vocabulary()
+        voc.loadCompounds_dict(compounds)
+        predicates = []
+        for fname in ['activation', 'activation_pas', 'activation_rotate', 'binding', 'binding_pas', 'inhibition', 'inhibition_pas']:
+            predicates.extend(te.readLnEntities(join(dname, fname + '.lst')))
+        predicates = list(set(predicates))
+        allCompounds = voc.allCompounds
+
+        if options['corpus']:
+            corpus = ds.Corpus()
+            corpus.loadFromDirectory(options['corpus'])
+            for document in corpus:
+                ds.SentenceSplitter().splitNLTK(document)
+            corpus = [document.rawSentences for document in corpus]
+        else:
+            corpus = synthetic_corpus(allCompounds[:200] + predicates + rnd.sample(allCompounds, 200),
+                                      options['documents'], options['sentences'], rnd)
+        sentences = [s for document in corpus for s in document]
+        self.stdout.write('%d compounds, %d predicates, %d documents, %d sentences\n' % (
+            len(allCompounds), len(predicates), len(corpus), len(sentences)))
+
+        start = time.time()
+        matcherP = TermMatcher(predicates)
+        matcherC = TermMatcher(allCompounds)
+        matcherP.findEntities('')
+        matcherC.findEntities('')
+        self.stdout.write('building the automata: %.3f s\n' % (time.time() - start))
+
+        start = time.time()
+        found = [(matcherP.findEntities(s), matcherC.findEntities(s)) for s in sentences]
+        elapsed = time.time() - start
+        self.stdout.write('matcher: %.3f s (%.1f sentences/s)\n' % (elapsed, len(sentences) / elapsed))
+
+        scanned = sentences[:options['scan_limit']]
+        start = time.time()
+        expected = [(findEntitiesScan(predicates, s), findEntitiesScan(allCompounds, s)) for s in scanned]
+        scan = time.time() - start
+        per_sentence = elapsed / len(sentences)
+        self.stdout.write('previous search on %d sentences: %.3f s (%.1f sentences/s, %.1fx slower)\n' % (
+            len(scanned), scan, len(scanned) / scan, scan / len(scanned) / per_sentence))
+        self.stdout.write('same terms found: %s\n' % (found[:len(scanned)] == expected))
+
+        texts = [' '.join(document).lower() for document in corpus[:max(1, options['scan_limit'] // max(1, options['sentences']))]]
+        start = time.time()
+        counts = [matcherC.countOccurrences(text) for text in texts]
+        elapsed = time.time() - start
+        start = time.time()
+        expected = [dict((idx, n) for (idx, n) in enumerate([len(te.find_substring_all(c, text)) for c in allCompounds])
+                         if n) for text in texts]
+        scan = time.time() - start
+        self.stdout.write('counting compounds in %d documents: matcher %.3f s, previous %.3f s, same counts: %s\n' % (
+            len(texts), elapsed, scan, counts == expected))
@@ -0,0 +1,127 @@
+import copy
+import random
+import pickle
+from os.path import normpath, join, dirname
+from django.test import SimpleTestCase
+from django.utils.unittest import skipIf
+
+from workflows.bio3graph.triplet_extractor.term_matching import TermMatcher, findEntitiesScan
+
+try:
+    from workflows.bio3graph.triplet_extractor import data_structures, pipeline
+except ImportError:
+    pipeline = None
+
+VOCABULARY = normpath(join(dirname(__file__), 'triplet_extractor', 'vocabulary'))
+
+
+def find_substring_all(s, text):
+    found = []
+    pos = text.find(s)
+    while pos != -1:
+        found.append(pos)
+        pos = text.find(s, pos + len(s))
+    return found
+
+
+class TermMatcherTest(SimpleTestCase):
+
+    def test_whole_words(self):
+        matcher = TermMatcher(['salicylic acid', 'sa', 'npr1', 'activates', 'acid'])
+        self.assertEqual(matcher.findEntities('SA activates NPR1; salicylic acid-induced'),
+                         ['salicylic acid', 'sa', 'npr1', 'activates', 'acid'])
+        self.assertEqual(matcher.findEntities('Salsa and npr10 activatesx'), [])
+
+    def test_same_as_scan(self):
+        rnd = random.Random(0)
+        for trial in range(2000):
+            terms = list(set(''.join(rnd.choice('ab -1') for j in range(rnd.randint(1, 4))) for k in range(6)))
+            sentence = ''.join(rnd.choice('ab -1AB') for j in range(rnd.randint(0, 25)))
+            matcher = TermMatcher(terms)
+            self.assertEqual(matcher.findEntities(sentence), findEntitiesScan(terms, sentence))
+            counts = dict((idx, len(find_substring_all(term, sentence))) for (idx, term) in enumerate(terms))
+            self.assertEqual(matcher.countOccurrences(sentence), dict((idx, n) for (idx, n) in counts.items() if n))
+
+    def test_pickle(self):
+        matcher = TermMatcher(['ab', 'b'])
+        matcher.findEntities('ab')
+        matcher = pickle.loads(pickle.dumps(matcher))
+        self.assertEqual(matcher.findEntities('x ab b'), ['ab', 'b'])
+
+
+class FakeTagger(object):
+    '''chunks the verbs of the test sentences as VPs and the other words as
+    NPs, instead of the GENIA tagger'''
+    VERBS = set(['activates', 'inhibits', 'binds', 'induces', 'increases'])
+
+    def __init__(self, loadModels=True):
+        pass
+
+    def process(self, document):
+        document.tokenizedSentences = [sentence.split() for sentence in document.rawSentences]
+        document.taggedSentences = []
+        document.parsedSentences = []
+        for words in document.tokenizedSentences:
+            parsed = []
+            for word in words:
+                if word in self.VERBS:
+                    parsed.append((word, 'VBZ', 'B-VP'))
+                elif parsed and parsed[-1][2] != 'B-VP':
+                    parsed.append((word, 'NN', 'I-NP'))
+                else:
+                    parsed.append((word, 'NN', 'B-NP'))
+            document.taggedSentences.append([(word, tag) for (word, tag, chunk) in parsed])
+            document.parsedSentences.append(parsed)
+
+
+@skipIf(pipeline is None, 'The triplet extractor can not be imported')
+class PipelineTest(SimpleTestCase):
+
+    def setUp(self):
+        self.tagger = data_structures.GeniaTTC
+        data_structures.GeniaTTC = FakeTagger
+        # the workers are forked with the fake tagger
+        pipeline.closePool()
+
+    def tearDown(self):
+        pipeline.closePool()
+        data_structures.GeniaTTC = self.tagger
+
+    def vocabulary(self):
+        from workflows.bio3graph.triplet_extractor import tripletExtraction
+        vocabulary = tripletExtraction.Vocabulary()
+        vocabulary.loadCompounds_file(join(VOCABULARY, 'compounds.lst'))
+        vocabulary.loadPredicates_files(activationFname=join(VOCABULARY, 'activation.lst'),
+                                        activations_rotate=join(VOCABULARY, 'activation_rotate.lst'),
+                                        inhibitionFname=join(VOCABULARY, 'inhibition.lst'),
+                                        bindingFname=join(VOCABULARY, 'binding.lst'),
+                                        activationFname_passive=join(VOCABULARY, 'activation_pas.lst'),
+                                        inhibitionFname_passive=join(VOCABULARY, 'inhibition_pas.lst'),
+                                        bindingFname_passive=join(VOCABULARY, 'binding_pas.lst'))
+        return vocabulary
+
+    def test_same_as_serial(self):
+        rnd = random.Random(0)
+        words = ['SA', 'NPR1', 'NIMIN1', 'HRT', 'activates', 'inhibits', 'binds', 'the', 'protein']
+        texts = [' '.join(rnd.choice(words) for j in range(rnd.randint(3, 12))) + '.' for i in range(30)]
+        texts.extend(open(join(VOCABULARY, 'pmc2556844.txt')).read().split('\n\n')[:10])
+        documents = pipeline.corpusDocuments(texts)
+        original = [copy.deepcopy(document.__dict__) for document in documents]
+        vocabulary = self.vocabulary()
+
+        def fields(triplets):
+            return [(t.subject, t.predicate, t.object, t.sentence, t.documentID, t.passive) for t in triplets]
+
+        def results(workers):
+            return [(document.__dict__, fields(triplets)) for (document, triplets) in
+                    pipeline.processCorpus(documents, vocabulary, workers, normalise=True)]
+        serial = results(1)
+        self.assertEqual(results(3), serial)
+        pool = pipeline._pool
+        # the next run uses the workers of the pool and their processors
+        self.assertEqual(results(2), serial)
+        self.assertTrue(pipeline._pool is pool)
+        self.assertEqual(fields(pipeline.corpusTriplets(documents, vocabulary, 3, normalise=True)),
+                         [triplet for (document, triplets) in serial for triplet in triplets])
+        # the documents of the corpus are not changed
+        self.assertEqual([document.__dict__ for document in documents], original)
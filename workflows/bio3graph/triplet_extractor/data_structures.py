@@ -5,6 +5,7 @@ from unidecode import unidecode
 import nltk
 from tagger import geniatagger
 import pickle
+import threading
 
 MAX_WORDLEN = 300
 
@@ -160,6 +161,17 @@ class Triplet(object):
 #end
 
 
+_punktTokenizer = None
+
+def punktTokenizer():
+    '''Returns the Punkt sentence tokenizer, which is loaded once per process'''
+    global _punktTokenizer
+    if _punktTokenizer is None:
+        _punktTokenizer = pickle.load(open(normpath(join(dirname(__file__),'punkt/english.pickle'))))
+    return _punktTokenizer
+#end
+
+
 class SentenceSplitter(object):
     def splitNLTK(self, document):
         assert(isinstance(document, Document))
@@ -172,7 +184,7 @@ class SentenceSplitter(object):
         ###########
 
 
-        tokenizer = pickle.load(open(normpath(join(dirname(__file__),'punkt/english.pickle'))))
+        tokenizer = punktTokenizer()
         #tokenizer = pickle.load(open(os.path.normpath('punkt/english.pickle')))
         document.rawSentences = [s.replace('\n', '') for s in tokenizer.tokenize(document.rawText)]
     #end
@@ -184,14 +196,29 @@ class SentenceSplitter(object):
 #end class
 
 
+_geniaModelsLoaded = False
+_geniaModelsLock = threading.Lock()
+
+def loadGeniaModels():
+    '''Loads the models of the GENIA tagger, once per process'''
+    global _geniaModelsLoaded
+    with _geniaModelsLock:
+        if not _geniaModelsLoaded:
+            cd = os.getcwd()
+            os.chdir(normpath(join(dirname(__file__),'tagger')))
+            try:
+                geniatagger.load_models()
+            finally:
+                os.chdir(cd)
+            _geniaModelsLoaded = True
+#end
+
+
 class GeniaTTC(object):
     '''GENIA tokenizer, tagger and chunker'''
     def __init__(self, loadModels=True):
         if loadModels:
-            cd = os.getcwd()
-            os.chdir(normpath(join(dirname(__file__),'tagger')))
-            geniatagger.load_models()
-            os.chdir(cd)
+            loadGeniaModels()
     #end
 
     def process(self, document):
@@ -0,0 +1,170 @@
+'''Parallel processing of a corpus: sentence splitting, GENIA tagging and
+triplet extraction of many documents.
+
+The documents are processed in chunks on a long-lived pool of forked
+processes, which is created when a corpus is first processed and reused by
+the next runs. The vocabulary is pickled once per run to a temporary file
+and the chunks only carry its path and a digest of the pickle. Every worker
+keeps a DocumentProcessor (with the tagger and the vocabulary structures)
+for the vocabulary it last processed, so it reads and unpickles the file
+only when it gets a chunk of another vocabulary, and the GENIA models are
+loaded once per process. Results are yielded as
+soon as the documents are done (in the order of the corpus), so e.g. a
+TripletGraphConstructor can consume the triplets while the rest of the
+corpus is still being processed. The documents of the corpus are not
+changed, processed copies are yielded.
+'''
+
+import os
+import copy
+import math
+import pickle
+import tempfile
+import threading
+import multiprocessing
+from hashlib import sha1
+
+import data_structures
+import tripletExtraction
+
+
+class DocumentProcessor(object):
+    '''Splits, tags and extracts the triplets of single documents with one
+    tagger and one triplet extractor'''
+
+    def __init__(self, vocabulary, VP_CHECK_POS=1, normalise=False):
+        self.splitter = data_structures.SentenceSplitter()
+        self.tagger = data_structures.GeniaTTC()
+        self.extractor = tripletExtraction.TripletExtractor(vocabulary)
+        self.VP_CHECK_POS = VP_CHECK_POS
+        self.normalise = normalise
+    #end
+
+    def process(self, document):
+        '''Returns the processed document and its triplets. Sentences are
+        only split (tagged) if the document wasn't split (tagged) yet.'''
+        if not document.rawSentences:
+            self.splitter.splitNLTK(document)
+        if document.parsedSentences is None:
+            self.tagger.process(document)
+        triplets = self.extractor.extractTripletsNLP(document, VP_CHECK_POS=self.VP_CHECK_POS)
+        if self.normalise:
+            triplets = self.extractor.normalizeTriplets(triplets)
+        return document, triplets
+    #end
+#end class
+
+
+def corpusDocuments(documents):
+    '''Returns the documents of a corpus given as a list of Documents and/or
+    texts'''
+    result = []
+    for (i, doc) in enumerate(documents):
+        if not isinstance(doc, data_structures.Document):
+            text = doc
+            doc = data_structures.Document(docid=str(i))
+            doc.loadString(text)
+        result.append(doc)
+    return result
+#end
+
+
+# the chunks of documents a run is split into per worker
+CHUNKS_PER_WORKER = 4
+
+# the pool, the number of its workers and the process that created it
+_pool = None
+_poolWorkers = 0
+_poolPid = None
+_poolLock = threading.Lock()
+
+# the processor of a worker and the vocabulary and options it was made for
+_workerProcessor = None
+
+def _processChunk(args):
+    key, vocabularyPath, VP_CHECK_POS, normalise, documents = args
+    global _workerProcessor
+    if _workerProcessor is None or _workerProcessor[0] != (key, VP_CHECK_POS, normalise):
+        with open(vocabularyPath, 'rb') as f:
+            vocabulary = pickle.load(f)
+        _workerProcessor = ((key, VP_CHECK_POS, normalise), DocumentProcessor(vocabulary, VP_CHECK_POS, normalise))
+    processor = _workerProcessor[1]
+    return [processor.process(document) for document in documents]
+#end
+
+
+def _getPool(workers, initializer=None):
+    '''Returns the pool of this process, with at least workers processes.
+    The initializer is called in every worker of a new pool.'''
+    global _pool, _poolWorkers, _poolPid
+    with _poolLock:
+        if _poolPid != os.getpid():
+            # the pool of the parent of a forked process can't be used
+            _pool = None
+            _poolWorkers = 0
+        if _pool is None or _poolWorkers < workers:
+            if _pool is not None:
+                # the workers finish the chunks of running corpora and exit
+                _pool.close()
+            _pool = multiprocessing.Pool(workers, initializer)
+            _poolWorkers = workers
+            _poolPid = os.getpid()
+        return _pool
+#end
+
+
+def closePool():
+    '''Terminates the workers of the pool of this process'''
+    global _pool, _poolWorkers
+    with _poolLock:
+        if _pool is not None and _poolPid == os.getpid():
+            _pool.terminate()
+            _pool.join()
+        _pool = None
+        _poolWorkers = 0
+#end
+
+
+def processCorpus(documents, vocabulary, workers=None, VP_CHECK_POS=1, normalise=False, initializer=None):
+    '''Yields (document, triplets) for every document of the corpus, in the
+    order of the documents. The documents are processed on the pool of
+    forked processes, which gets at least workers processes (one per core
+    if workers is None) and is created with initializer if it doesn't
+    exist yet, or in this process if there is a single worker or fork is
+    not available.'''
+    if not documents:
+        return
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = max(1, min(workers, len(documents)))
+
+    if workers == 1 or not hasattr(os, 'fork'):
+        processor = DocumentProcessor(vocabulary, VP_CHECK_POS, normalise)
+        for document in documents:
+            yield processor.process(copy.deepcopy(document))
+        return
+
+    vocabularyData = pickle.dumps(vocabulary, pickle.HIGHEST_PROTOCOL)
+    key = sha1(vocabularyData).hexdigest()
+    (fd, vocabularyPath) = tempfile.mkstemp(prefix='bio3graph-vocabulary-', suffix='.pickle')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(vocabularyData)
+        del vocabularyData
+        size = int(math.ceil(len(documents) / float(workers * CHUNKS_PER_WORKER)))
+        chunks = [(key, vocabularyPath, VP_CHECK_POS, normalise, documents[i:i+size]) for i in range(0, len(documents), size)]
+        for results in _getPool(workers, initializer).imap(_processChunk, chunks):
+            for result in results:
+                yield result
+    finally:
+        os.remove(vocabularyPath)
+#end
+
+
+def corpusTriplets(documents, vocabulary, workers=None, VP_CHECK_POS=1, normalise=False, initializer=None):
+    '''Yields the triplets of all documents of the corpus as they are
+    extracted'''
+    for (document, triplets) in processCorpus(documents, vocabulary, workers, VP_CHECK_POS, normalise, initializer):
+        for triplet in triplets:
+            yield triplet
+#end
@@ -0,0 +1,165 @@
+'''Aho-Corasick matching of vocabulary terms.
+
+A TermMatcher compiles a list of terms (compound synonyms, predicates) into
+an automaton which finds the occurrences of all terms in a single pass over
+the text, instead of searching the text once for every term.
+'''
+
+
+class TermMatcher(object):
+    '''Finds the terms of a list in texts. The automaton is built when it is
+    first needed and is not pickled with the matcher (it is rebuilt from
+    the terms). Empty terms never match.'''
+
+    def __init__(self, terms):
+        self.terms = list(terms)
+        self._automaton = None
+    #end
+
+    def __getstate__(self):
+        return {'terms': self.terms}
+    #end
+
+    def __setstate__(self, state):
+        self.terms = state['terms']
+        self._automaton = None
+    #end
+
+    def _build(self):
+        # goto[node] maps characters to the next node, fail[node] is the node
+        # of the longest proper suffix that is also in the trie and out[node]
+        # are the (index, length) pairs of the terms ending at node
+        goto = [{}]
+        out = [[]]
+        for (idx, term) in enumerate(self.terms):
+            if not term:
+                continue
+            node = 0
+            for ch in term:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                node = nxt
+            out[node].append((idx, len(term)))
+        #end
+
+        fail = [0]*len(goto)
+        queue = list(goto[0].values())
+        for node in queue:
+            for (ch, nxt) in goto[node].iteritems():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0) if node else 0
+                out[nxt] = out[nxt] + out[fail[nxt]]
+        #end
+
+        self._automaton = (goto, fail, [tuple(x) for x in out])
+    #end
+
+    def occurrences(self, text):
+        '''Returns a dictionary which maps the index of every term found in
+        the text to the ascending list of its start positions (overlapping
+        occurrences included).'''
+        if self._automaton is None:
+            self._build()
+        goto, fail, out = self._automaton
+
+        found = {}
+        node = 0
+        for (pos, ch) in enumerate(text):
+            nxt = goto[node].get(ch)
+            while nxt is None and node:
+                node = fail[node]
+                nxt = goto[node].get(ch)
+            node = nxt or 0
+            for (idx, length) in out[node]:
+                found.setdefault(idx, []).append(pos + 1 - length)
+        #end
+        return found
+    #end
+
+    def findEntities(self, sentence):
+        '''Returns the terms (in the order of the list) which occur in the
+        lowercased sentence as whole words, with the same rules as the
+        previous search with sentence.find (findEntitiesScan): occurrences are
+        tried from left to right without overlapping the rejected ones, and
+        the end of a rejected occurrence counts as a word boundary.'''
+        sentence = sentence.lower()
+        n = len(sentence)
+        found = []
+        for (idx, starts) in self.occurrences(sentence).iteritems():
+            length = len(self.terms[idx])
+            pos = 0
+            for i in starts:
+                if i < pos:
+                    continue
+                end = i + length
+                if (i == pos or not sentence[i-1].isalnum()) and (end == n or not sentence[end].isalnum()):
+                    found.append(idx)
+                    break
+                pos = end
+        #end
+        return [self.terms[idx] for idx in sorted(found)]
+    #end
+
+    def countOccurrences(self, text):
+        '''Returns a dictionary which maps the index of every term found in
+        the text to the number of its non-overlapping occurrences (as counted
+        by find_substring_all).'''
+        counts = {}
+        for (idx, starts) in self.occurrences(text).iteritems():
+            length = len(self.terms[idx])
+            count = 0
+            pos = 0
+            for i in starts:
+                if i >= pos:
+                    count += 1
+                    pos = i + length
+            counts[idx] = count
+        #end
+        return counts
+    #end
+#end class
+
+
+def findEntitiesScan(entities, sentence):
+    '''The previous implementation of TripletExtractor.findEntitiesRE, which
+    searches the sentence once for every entity. It is kept as the reference
+    for the tests and the benchmark.'''
+    found = []
+    sentence = sentence.lower()
+    for ent in entities:
+        if not ent:
+            continue
+        backup = sentence
+        i = sentence.find(ent)
+        flag = False
+        while i != -1:
+            # at the start, and the next character is not alphanumeric
+            if i == 0 and (len(ent) == len(sentence) or not sentence[len(ent)].isalnum()):
+                flag = True
+            # at the end, and the previous character is not alphanumeric
+            elif i + len(ent) == len(sentence) and not sentence[-len(ent)-1].isalnum():
+                flag = True
+            # in the middle, between non-alphanumeric characters
+            elif not sentence[i-1].isalnum() and not sentence[i+len(ent)].isalnum():
+                flag = True
+
+            # a part of a longer word was found, search the rest of the sentence
+            if not flag:
+                sentence = sentence[i + len(ent):]
+                i = sentence.find(ent)
+            else:
+                break
+        #end
+        if flag:
+            found.append(ent)
+        sentence = backup
+    #end
+    return found
+#end
@@ -9,6 +9,7 @@ import csv
 
 import networkx as nx
 import graph_operations as gop
+from term_matching import TermMatcher
 
 
 
@@ -534,6 +535,9 @@ class Vocabulary(object):
         self.allCompounds = None
         self.allCompounds_tokenized = None
         self.compoundSynonyms = None
+
+        self.predicatesMatcher = None
+        self.compoundsMatcher = None
     #end
 
 
@@ -589,6 +593,29 @@ class Vocabulary(object):
 
             #self.predicates_tokenized = [nltk.word_tokenize(x) for x in self.predicates]
             #end
+
+        self.predicatesMatcher = self._termMatcher('predicatesMatcher', self.predicates)
+        if self.allCompounds is not None:
+            self.compoundsMatcher = self._termMatcher('compoundsMatcher', self.allCompounds)
+    #end
+
+    def _termMatcher(self, name, terms):
+        '''Returns the matcher stored in the attribute name if it was built from
+        the same terms (so its automaton is reused), otherwise a new one'''
+        matcher = getattr(self, name, None)
+        if matcher is None or matcher.terms != terms:
+            matcher = TermMatcher(terms)
+        return matcher
+    #end
+
+    def getMatcher(self, entities):
+        '''Returns the matcher of the predicates or of all compounds, or a new
+        matcher for other lists of entities'''
+        if entities is self.predicates and getattr(self, 'predicatesMatcher', None) is not None:
+            return self.predicatesMatcher
+        if entities is self.allCompounds and getattr(self, 'compoundsMatcher', None) is not None:
+            return self.compoundsMatcher
+        return TermMatcher(entities)
     #end
 
 
@@ -691,55 +718,28 @@ class TripletExtractor(object):
         files = os.listdir(folder)
         counterP = dict.fromkeys(self.vocabulary.predicates, 0)
         counterC = dict.fromkeys(self.vocabulary.allCompounds, 0)
+        matcherP = self.vocabulary.getMatcher(self.vocabulary.predicates)
+        matcherC = self.vocabulary.getMatcher(self.vocabulary.allCompounds)
         for f in files:
             print f
             fullname = os.path.join(folder, f)
             if os.path.isfile(fullname) and os.path.splitext(f)[1] == '.txt':
                 text = open(fullname).read().lower()
-                for predicate in self.vocabulary.predicates:
-                    counterP[predicate] += len(find_substring_all(predicate, text))
-                for compound in self.vocabulary.allCompounds:
-                    counterC[compound] += len(find_substring_all(compound, text))
+                # one pass over the text for all predicates and one for all compounds
+                for (idx, count) in matcherP.countOccurrences(text).iteritems():
+                    counterP[matcherP.terms[idx]] += count
+                for (idx, count) in matcherC.countOccurrences(text).iteritems():
+                    counterC[matcherC.terms[idx]] += count
         return counterC, counterP
     #end
 
 
     ##TEZAVE: iskanje sestavljenih imen (problem presledkov)
     def findEntitiesRE(self, entities, sentence):
-        found = []
-        sentence = sentence.lower()
-        #sentence = unicode(sentence.lower())
-        for ent in entities:
-            backup = sentence
-            i = sentence.find(ent)
-            #i = sentence.find(unicode(ent))
-            flag = False
-            while i != -1:
-                # zacetek, in naslednji znak ni alfanumericen
-                if i == 0 and not sentence[len(ent)].isalnum():
-                    flag = True
-                # konec, in predhodnji znak ni alfanumericen
-                elif i + len(ent) == len(sentence) and not sentence[-len(ent)-1].isalnum():
-                    flag = True
-                # vmes, med ne-alfanumericnimi znaki
-                elif not sentence[i-1].isalnum() and not sentence[i+len(ent)].isalnum():
-                    flag = True
-
-                # ce je najden, pa ne velja nobeden od zgornjih primerov, je bil najden del vecje besede (to ne steje)
-                # torej iscemo dalje po nizu
-                if not flag:
-                    sentence = sentence[i + len(ent):]
-                    i = sentence.find(ent)
-                else:
-                    break
-            #end
-            if flag:
-                found.append(ent)
-            sentence = backup
-
-            print
-        #end
-        return found
+        '''Returns the entities (in their order) which occur in the sentence as
+        whole words. All entities are found in a single pass over the sentence
+        with the Aho-Corasick automaton of the vocabulary.'''
+        return self.vocabulary.getMatcher(entities).findEntities(sentence)
     #end
 
 
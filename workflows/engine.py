@@ -1,8 +1,20 @@
 import workflows.library
 import time
 import random
+import os
+import sys
+import Queue
+import threading
+import multiprocessing
+from collections import deque
+from multiprocessing.pool import ThreadPool
 from workflows.tasks import *
+from workflows.execution_cache import cached_call, fingerprint, log_cache_stats
+from workflows.jobs import forget_widget_statuses
+from workflows.forking import can_fork, reset_forked_process
+from picklefield.fields import shared_value
 from django.conf import settings
+from django.db import close_connection, connection, transaction
 
 class WidgetRunner():
     def __init__(self,widget,workflow_runner,standalone=False):
@@ -26,6 +38,17 @@ class WidgetRunner():
             if self.widget.abstract_widget:
                 function_to_call = getattr(workflows.library,self.widget.abstract_widget.action)
             input_dict = self.get_input_dictionary()
+            input_fingerprint = None
+            if self.widget.is_reusable():
+                input_fingerprint = fingerprint(self.widget.abstract_widget,function_to_call,input_dict)
+                if self.widget.is_up_to_date(input_fingerprint):
+                    """ the widget already ran with these inputs, its outputs are still valid """
+                    self.widget.running = False
+                    self.widget.error = False
+                    self.widget.finished = True
+                    if self.standalone:
+                        self.save()
+                    return
             outputs = {}
             start = time.time()
             try:
@@ -33,20 +56,9 @@ class WidgetRunner():
                     if self.widget.abstract_widget.wsdl != '':
                         input_dict['wsdl']=self.widget.abstract_widget.wsdl
                         input_dict['wsdl_method']=self.widget.abstract_widget.wsdl_method
-                    if self.widget.abstract_widget.windows_queue and settings.USE_WINDOWS_QUEUE:
-                        if self.widget.abstract_widget.has_progress_bar:
-                            outputs = executeWidgetProgressBar.apply_async([self.widget,input_dict],queue="windows").wait()
-                        elif self.widget.abstract_widget.is_streaming:
-                            outputs = executeWidgetStreaming.apply_async([self.widget,input_dict],queue="windows").wait()
-                        else:
-                            outputs = executeWidgetFunction.apply_async([self.widget,input_dict],queue="windows").wait()
-                    else:
-                        if self.widget.abstract_widget.has_progress_bar:
-                            outputs = function_to_call(input_dict,self.widget)
-                        elif self.widget.abstract_widget.is_streaming:
-                            outputs = function_to_call(input_dict,self.widget,None)
-                        else:
-                            outputs = function_to_call(input_dict)
+                    outputs = cached_call(self.widget.abstract_widget,function_to_call,input_dict,
+                                          lambda: self.call_function(function_to_call,input_dict),
+                                          key=input_fingerprint)
                 else:
                     """ we run the subprocess """
                     self.inner_workflow_runner = WorkflowRunner(self.widget.workflow_link,parent=self.workflow_runner)
@@ -55,25 +67,31 @@ class WidgetRunner():
                 self.widget.error=True
                 self.widget.running=False
                 self.widget.finished=False
+                self.widget.input_fingerprint=''
                 raise
             elapsed = (time.time()-start)
             outputs['clowdflows_elapsed']=elapsed
             self.assign_outputs(outputs)
+            self.widget.input_fingerprint = input_fingerprint or ''
         elif self.widget.type == 'input':
             for o in self.widget.outputs.all():
                 o.value = self.workflow_runner.parent.inputs[o.outer_input_id].value
+                self.workflow_runner.changed_outputs.add(o.id)
         elif self.widget.type == 'output':
             input_dict = self.get_input_dictionary()
             for i in self.widget.inputs.all():
                 self.workflow_runner.parent.outputs[i.outer_output_id].value = i.value
+                self.workflow_runner.parent.changed_outputs.add(i.outer_output_id)
         elif self.widget.type == 'for_output':
             input_dict = self.get_input_dictionary()
             for i in self.widget.inputs.all():
                 self.workflow_runner.parent.outputs[i.outer_output_id].value.append(i.value)
+                self.workflow_runner.parent.changed_outputs.add(i.outer_output_id)
         elif self.widget.type == 'cv_output':
             input_dict = self.get_input_dictionary()
             for i in self.widget.inputs.all():
                 self.workflow_runner.parent.outputs[i.outer_output_id].value.append(i.value)
+                self.workflow_runner.parent.changed_outputs.add(i.outer_output_id)
 
         self.widget.running = False
         self.widget.error = False
@@ -81,12 +99,30 @@ class WidgetRunner():
         if self.standalone:
             self.save()
 
+    def call_function(self,function_to_call,input_dict):
+        if self.widget.abstract_widget.windows_queue and settings.USE_WINDOWS_QUEUE:
+            if self.widget.abstract_widget.has_progress_bar:
+                return executeWidgetProgressBar.apply_async([self.widget,input_dict],queue="windows").wait()
+            elif self.widget.abstract_widget.is_streaming:
+                return executeWidgetStreaming.apply_async([self.widget,input_dict],queue="windows").wait()
+            else:
+                return executeWidgetFunction.apply_async([self.widget,input_dict],queue="windows").wait()
+        else:
+            if self.widget.abstract_widget.has_progress_bar:
+                return function_to_call(input_dict,self.widget)
+            elif self.widget.abstract_widget.is_streaming:
+                return function_to_call(input_dict,self.widget,None)
+            else:
+                return function_to_call(input_dict)
+
     def assign_outputs(self,outputs):
         for o in self.widget.outputs.all():
             try:
                 o.value = outputs[o.variable]
             except:
                 pass
+            else:
+                self.workflow_runner.changed_outputs.add(o.id)
 
     def get_input_dictionary(self):
         input_dictionary = {}
@@ -99,6 +135,7 @@ class WidgetRunner():
                     i.value = self.workflow_runner.outputs[connection.output_id].value
                 else:
                     i.value = None
+                self.workflow_runner.changed_inputs.add(i.id)
             """ here we assign the value to the dictionary """
             if i.multi_id==0:
                 input_dictionary[i.variable]=i.value
@@ -110,14 +147,10 @@ class WidgetRunner():
         return input_dictionary
 
     def save(self):
-        for i in self.widget.inputs.all():
-            i.save()
-        for o in self.widget.outputs.all():
-            o.save()
-        self.widget.save()
+        self.workflow_runner.save()
 
 class WorkflowRunner():
-    def __init__(self,workflow,clean=True,parent=None):
+    def __init__(self,workflow,clean=True,parent=None,max_workers=None):
         self.workflow = workflow
         self.connections = workflow.connections.all()
         self.widgets = workflow.widgets.all().select_related('abstract_widget').prefetch_related('inputs','outputs')
@@ -128,8 +161,38 @@ class WorkflowRunner():
                 self.inputs[i.id] = i
             for o in w.outputs.all():
                 self.outputs[o.id] = o
+        self.widgets_by_id = {}
+        self.widget_order = {}
+        for n,w in enumerate(self.widgets):
+            self.widgets_by_id[w.id] = w
+            self.widget_order[w.id] = n
+        """ the connections are indexed once, so that finding the connection
+            of an input or output and the widgets connected before or after
+            a widget are dictionary lookups """
+        self.input_connections = {}
+        self.output_connections = {}
+        self.predecessors = {}
+        self.successors = {}
+        for c in self.connections:
+            self.input_connections.setdefault(c.input_id,c)
+            self.output_connections.setdefault(c.output_id,c)
+            producer = self.outputs[c.output_id].widget_id
+            consumer = self.inputs[c.input_id].widget_id
+            self.predecessors.setdefault(consumer,set()).add(producer)
+            self.successors.setdefault(producer,set()).add(consumer)
+        self.changed_inputs = set()
+        self.changed_outputs = set()
+        self.saved_states = {}
+        for w in self.widgets:
+            self.saved_states[w.id] = (w.finished,w.error,w.running,w.input_fingerprint)
         self.clean = clean
         self.parent = parent
+        if max_workers is None:
+            if parent is not None:
+                max_workers = parent.max_workers
+            else:
+                max_workers = settings.WORKFLOW_RUNNER_MAX_WORKERS
+        self.max_workers = max_workers
 
     def is_for_loop(self):
         for w in self.widgets:
@@ -150,16 +213,10 @@ class WorkflowRunner():
             w.error = False        
 
     def get_connection_for_output(self,output):
-        for c in self.connections:
-            if c.output_id==output.id:
-                return c
-        return None
+        return self.output_connections.get(output.id)
 
     def get_connection_for_input(self,input):
-        for c in self.connections:
-            if c.input_id==input.id:
-                return c
-        return None
+        return self.input_connections.get(input.id)
 
     @property
     def finished_widgets(self):
@@ -182,28 +239,97 @@ class WorkflowRunner():
         """ a widget is runnable if all widgets connected before
             it are finished (i.e. widgets that have outputs that 
             are connected to this widget's input) """
-        finished_widget_ids = [w.id for w in self.finished_widgets]
-        runnable = []
-        for w in self.unfinished_widgets:
-            ready_to_run = True
-            for c in self.connections:
-                if self.inputs[c.input_id].widget_id == w.id and not self.outputs[c.output_id].widget_id in finished_widget_ids:
-                    ready_to_run = False
-            if ready_to_run:
-                runnable.append(w)
-        return runnable
+        pending = self.pending_dependencies()
+        return [w for w in self.unfinished_widgets if pending[w.id]==0]
+
+    def pending_dependencies(self):
+        """ counts the unfinished widgets connected before each widget """
+        pending = {}
+        for w in self.widgets:
+            pending[w.id] = 0
+            for producer_id in self.predecessors.get(w.id,()):
+                if not self.widgets_by_id[producer_id].finished:
+                    pending[w.id] += 1
+        return pending
+
+    def release_successors(self,widget,pending):
+        """ decrements the counters of the widgets connected after a
+            finished widget and returns the ones that became runnable """
+        released = []
+        for consumer_id in self.successors.get(widget.id,()):
+            pending[consumer_id] -= 1
+            consumer = self.widgets_by_id[consumer_id]
+            if pending[consumer_id]==0 and not consumer.finished and not consumer.running and not consumer.error:
+                released.append(consumer)
+        released.sort(key=lambda w: self.widget_order[w.id])
+        return released
 
     def run_all_unfinished_widgets(self):
-        runnable_widgets = self.runnable_widgets
+        if self.max_workers > 1:
+            return self.run_all_unfinished_widgets_parallel()
+        pending = self.pending_dependencies()
+        runnable_widgets = deque(w for w in self.unfinished_widgets if pending[w.id]==0)
         while len(runnable_widgets)>0:
-            for w in runnable_widgets:
-                wr = WidgetRunner(w,self)
-                try:
-                    wr.run()
-                except:
-                    self.save()
-                    raise
-            runnable_widgets = self.runnable_widgets
+            w = runnable_widgets.popleft()
+            wr = WidgetRunner(w,self)
+            try:
+                wr.run()
+            except:
+                self.save()
+                raise
+            runnable_widgets.extend(self.release_successors(w,pending))
+
+    def run_all_unfinished_widgets_parallel(self):
+        """ runs the widgets on a pool of max_workers threads. A widget is
+            dispatched as soon as the last widget connected before it is
+            finished. Only regular widgets go to the pool, subprocesses and
+            the input/output widgets run on this thread (a subprocess
+            schedules its own widgets on its own pool).
+
+            If widgets fail, nothing new is dispatched, the widgets that are
+            already running are allowed to finish and the error of the
+            failed widget that comes first in the workflow is raised. """
+        pending = self.pending_dependencies()
+        done = Queue.Queue()
+        def execute(w):
+            try:
+                WidgetRunner(w,self).run()
+            except:
+                done.put((w,sys.exc_info()))
+            else:
+                done.put((w,None))
+        def execute_in_pool(w):
+            try:
+                execute(w)
+            finally:
+                close_connection()
+        ready = [w for w in self.unfinished_widgets if pending[w.id]==0]
+        errors = []
+        running = 0
+        pool = ThreadPool(self.max_workers)
+        try:
+            while ready or running:
+                for w in ready:
+                    running += 1
+                    if w.type == 'regular' and w.abstract_widget:
+                        pool.apply_async(execute_in_pool,[w])
+                    else:
+                        execute(w)
+                ready = []
+                w,exc_info = done.get()
+                running -= 1
+                if exc_info is not None:
+                    errors.append((self.widget_order[w.id],exc_info))
+                elif not errors:
+                    ready = self.release_successors(w,pending)
+        finally:
+            pool.close()
+            pool.join()
+        if errors:
+            self.save()
+            errors.sort(key=lambda e: e[0])
+            exc_info = errors[0][1]
+            raise exc_info[0], exc_info[1], exc_info[2]
 
     def run(self):
         self.cleanup()
@@ -217,13 +343,9 @@ class WorkflowRunner():
                     fo = w
             outer_output = self.parent.outputs[fo.inputs.all()[0].outer_output_id]
             outer_output.value = []
+            self.parent.changed_outputs.add(outer_output.id)
             input_list = self.parent.inputs[fi.outputs.all()[0].outer_input_id].value
-            for i in input_list:
-                self.cleanup()
-                proper_output = fi.outputs.all()[0]
-                proper_output.value = i
-                fi.finished = True
-                self.run_all_unfinished_widgets()
+            self.run_iterations(fi,[[i] for i in input_list])
         elif self.is_cross_validation():
             import random as rand
             fi = None
@@ -235,6 +357,7 @@ class WorkflowRunner():
                     fo = w
             outer_output = self.parent.outputs[fo.inputs.all()[0].outer_output_id]
             outer_output.value = []
+            self.parent.changed_outputs.add(outer_output.id)
             input_list = self.parent.inputs[fi.outputs.all()[0].outer_input_id].value
             input_fold = self.parent.inputs[fi.outputs.all()[1].outer_input_id].value
             input_seed = self.parent.inputs[fi.outputs.all()[2].outer_input_id].value
@@ -272,9 +395,7 @@ class WorkflowRunner():
                 rand.shuffle(input_list)
                 folds = [input_list[i::input_fold] for i in range(input_fold)]
 
-            proper_output = fi.outputs.all()[2]
-            proper_output.value = input_seed
-
+            iterations = []
             for i in range(len(folds)):
                 #import pdb; pdb.set_trace()
                 if hasattr(input_list, "get_items_ref"):
@@ -290,22 +411,308 @@ class WorkflowRunner():
                     output_test_obj.orng_tables[context.target_table] = output_test
                     output_train = output_train_obj
                     output_test = output_test_obj
-
-                self.cleanup()
-                proper_output = fi.outputs.all()[0] # inner output
-                proper_output.value = output_train
-                proper_output = fi.outputs.all()[1] # inner output
-                proper_output.value = output_test
-                fi.finished=True # set the input widget as finished
-                self.run_all_unfinished_widgets()
+                """ the values of the outputs of the cv_input widget """
+                iterations.append([output_train,output_test,input_seed])
+            self.run_iterations(fi,iterations)
         else:
             self.run_all_unfinished_widgets()
         self.save()
+        if self.parent is None:
+            log_cache_stats()
+
+    def run_iteration(self,fi,values):
+        """ runs the body of a for loop or a cross validation once, the
+            outputs of its input widget (fi) get the values """
+        self.cleanup()
+        for proper_output,value in zip(fi.outputs.all(),values):
+            proper_output.value = value
+            self.changed_outputs.add(proper_output.id)
+        fi.finished = True
+        self.run_all_unfinished_widgets()
+
+    def run_iterations(self,fi,iterations):
+        """ runs the body of the loop for each list of values, one after
+            another or in parallel (see loop_workers) """
+        workers = self.loop_workers()
+        if workers > 1 and len(iterations) > 1:
+            self.run_iterations_parallel(iterations,workers)
+        else:
+            for values in iterations:
+                self.run_iteration(fi,values)
+
+    def loop_workers(self):
+        """ the number of iterations of this loop that may run at the same
+            time: the loop_workers of the workflow or, if it is 0, the
+            WORKFLOW_LOOP_WORKERS setting. Loops with subprocesses or output
+            widgets in their body run one iteration after another (every
+            iteration sets the outer outputs of the output widgets, the last
+            one wins). """
+        if any(w.type in ('subprocess','output') for w in self.widgets):
+            return 1
+        return self.workflow.loop_workers or getattr(settings,'WORKFLOW_LOOP_WORKERS',1)
+
+    def outer_inputs(self):
+        """ the values of the outer inputs of the input widgets of the loop
+            body, by id """
+        inputs = {}
+        for w in self.widgets:
+            if w.type=='input':
+                for o in w.outputs.all():
+                    inputs[o.outer_input_id] = self.parent.inputs[o.outer_input_id].value
+        return inputs
+
+    def run_iterations_parallel(self,iterations,workers):
+        """ runs the iterations of the loop on workers processes or threads
+            (the WORKFLOW_LOOP_BACKEND setting; threads if a JVM runs in
+            this process, see workflows.forking), or as runForLoopIteration
+            tasks if USE_CONCURRENCY is set. Every iteration has its own
+            runner with its own copies of the widgets of the loop body, the
+            values of the outer inputs of its input widgets and its own
+            outer outputs, which are appended to the outputs of the
+            loop in the order of the iterations. When the iterations are
+            done this runner takes over the state of the last one, so the
+            same values are saved as by a serial loop.
+
+            The iterations are started in chunks of a few per worker. If
+            iterations fail, no more chunks are started and the error of the
+            first failed iteration is raised. """
+        if settings.USE_CONCURRENCY:
+            chunks = [iterations]
+        else:
+            """ the runners are loaded on this thread, a few more than there
+                are workers at a time """
+            chunk_size = workers*4
+            chunks = [iterations[start:start+chunk_size] for start in range(0,len(iterations),chunk_size)]
+        inputs = self.outer_inputs()
+        for n,chunk in enumerate(chunks):
+            last = n == len(chunks)-1
+            if settings.USE_CONCURRENCY:
+                tasks = [runForLoopIteration.apply_async([self.workflow,values,inputs]) for values in chunk]
+                results = [task.get() for task in tasks]
+            elif getattr(settings,'WORKFLOW_LOOP_BACKEND','threads') == 'processes' and can_fork():
+                results = run_forked_iterations(self.workflow,chunk,workers,last,inputs)
+            else:
+                results = run_threaded_iterations(self.workflow,chunk,workers,inputs)
+            for result in results:
+                if result.exc_info is not None:
+                    self.take_over(result)
+                    self.save()
+                    raise result.exc_info[0], result.exc_info[1], result.exc_info[2]
+                self.gather(result.collected)
+        self.take_over(results[-1])
+
+    def gather(self,collected):
+        """ appends the values an iteration collected to the outer outputs """
+        for outer_output_id,values in collected.items():
+            self.parent.outputs[outer_output_id].value.extend(values)
+            self.parent.changed_outputs.add(outer_output_id)
+
+    def take_over(self,result):
+        """ copies the widget states and the changed input and output values
+            of an iteration """
+        for w_id,(finished,error,running,input_fingerprint) in result.states.items():
+            own = self.widgets_by_id[w_id]
+            own.finished = finished
+            own.error = error
+            own.running = running
+            own.input_fingerprint = input_fingerprint
+        for i_id,value in result.inputs.items():
+            self.inputs[i_id].value = value
+            self.changed_inputs.add(i_id)
+        for o_id,value in result.outputs.items():
+            self.outputs[o_id].value = value
+            self.changed_outputs.add(o_id)
 
     def save(self):
+        """ writes the widget states and the input and output values that
+            changed since the last save. The rows are written in a single
+            transaction with one batched statement per model (and per
+            widget state), so unchanged values are neither pickled nor
+            sent to the database. """
+        states = {}
         for w in self.widgets:
-            for i in w.inputs.all():
-                i.save(force_update=True)
-            for o in w.outputs.all():
-                o.save(force_update=True)
-            w.save(force_update=True)
\ No newline at end of file
+            state = (w.finished,w.error,w.running,w.input_fingerprint)
+            if self.saved_states[w.id] != state:
+                states.setdefault(state,[]).append(w.id)
+        inputs = [self.inputs[i] for i in sorted(self.changed_inputs)]
+        outputs = [self.outputs[o] for o in sorted(self.changed_outputs)]
+        with transaction.commit_on_success():
+            for (finished,error,running,input_fingerprint),ids in states.items():
+                for chunk in batches(ids):
+                    self.workflow.widgets.filter(id__in=chunk).update(finished=finished,error=error,running=running,input_fingerprint=input_fingerprint)
+            encoded = {}
+            update_values(outputs,encoded)
+            update_values(inputs,encoded)
+        for state,ids in states.items():
+            for w_id in ids:
+                self.saved_states[w_id] = state
+            forget_widget_statuses(ids)
+        self.changed_inputs.clear()
+        self.changed_outputs.clear()
+
+class LoopIteration():
+    """ stands in for the parent runner of a LoopIterationRunner, with the
+        values of the outer inputs of the input widgets of the loop body,
+        collecting the values that the for_output (or cv_output) widget
+        appends to the outer outputs """
+    def __init__(self,outer_output_ids,outer_inputs):
+        self.inputs = {}
+        for outer_input_id,value in outer_inputs.items():
+            self.inputs[outer_input_id] = OuterInput(value)
+        self.outputs = {}
+        for outer_output_id in outer_output_ids:
+            self.outputs[outer_output_id] = CollectedOutput()
+        self.changed_outputs = set()
+        self.max_workers = 1
+
+    def collected(self):
+        collected = {}
+        for outer_output_id,output in self.outputs.items():
+            collected[outer_output_id] = output.value
+        return collected
+
+class OuterInput():
+    def __init__(self,value):
+        self.value = value
+
+class CollectedOutput():
+    def __init__(self):
+        self.value = []
+
+class IterationResult():
+    """ what the runner of the loop needs from an iteration: the collected
+        outer output values, the widget states, the changed input and
+        output values (unless values is False) and the error. Results are
+        pickled when iterations run in other processes, then the traceback
+        of the error is lost. """
+    def __init__(self,runner,exc_info=None,values=True):
+        self.collected = runner.parent.collected()
+        self.states = {}
+        for w in runner.widgets:
+            self.states[w.id] = (w.finished,w.error,w.running,w.input_fingerprint)
+        self.inputs = {}
+        self.outputs = {}
+        if values or exc_info is not None:
+            for i_id in runner.changed_inputs:
+                self.inputs[i_id] = shared_value(runner.inputs[i_id],'value')
+            for o_id in runner.changed_outputs:
+                self.outputs[o_id] = shared_value(runner.outputs[o_id],'value')
+        self.exc_info = exc_info
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.exc_info is not None:
+            state['exc_info'] = (self.exc_info[0],self.exc_info[1],None)
+        return state
+
+class LoopIterationRunner(WorkflowRunner):
+    """ runs one iteration of a for loop or a cross validation with its own
+        copies of the widgets, inputs and outputs of the loop body. It never
+        writes to the database, the runner of the loop takes over its
+        state. The widgets are unfinished before the iteration runs, like
+        they are by a serial loop, whatever state a previous run saved.
+        inputs are the values of the outer inputs of the input widgets of
+        the loop body (see WorkflowRunner.outer_inputs). """
+    def __init__(self,workflow,inputs=None):
+        WorkflowRunner.__init__(self,workflow,clean=True,max_workers=1)
+        fo = [w for w in self.widgets if w.type in ('for_output','cv_output')][0]
+        self.parent = LoopIteration([i.outer_output_id for i in fo.inputs.all()],inputs or {})
+
+    def run_values(self,values,keep_values=True):
+        """ runs the loop body with the values of the outputs of its input
+            widget and returns an IterationResult """
+        fi = [w for w in self.widgets if w.type in ('for_input','cv_input')][0]
+        try:
+            self.run_iteration(fi,values)
+        except:
+            return IterationResult(self,sys.exc_info())
+        return IterationResult(self,values=keep_values)
+
+    def save(self):
+        pass
+
+def run_threaded_iterations(workflow,iterations,workers,inputs=None):
+    runners = [LoopIterationRunner(workflow,inputs) for values in iterations]
+    def execute(n):
+        try:
+            return runners[n].run_values(iterations[n])
+        finally:
+            close_connection()
+    pool = ThreadPool(min(workers,len(iterations)))
+    try:
+        return pool.map(execute,range(len(iterations)))
+    finally:
+        pool.close()
+        pool.join()
+
+""" runners of iterations that run in forked processes, by token. The forked
+    processes inherit them, so neither the runners nor the values of the
+    iterations have to be pickled, only the results. """
+_forked_iterations = {}
+_forked_iterations_lock = threading.Lock()
+
+def run_forked_iteration(args):
+    token,n,keep_values = args
+    runners,iterations = _forked_iterations[token]
+    return runners[n].run_values(iterations[n],keep_values)
+
+def run_forked_iterations(workflow,iterations,workers,last,inputs=None):
+    """ runs the iterations on a pool of forked processes. The values of the
+        inputs and outputs are only sent back for the last iteration (if
+        this is the last chunk of the loop) and for failed iterations. """
+    runners = [LoopIterationRunner(workflow,inputs) for values in iterations]
+    with _forked_iterations_lock:
+        token = len(_forked_iterations)
+        while token in _forked_iterations:
+            token += 1
+        _forked_iterations[token] = (runners,iterations)
+    try:
+        pool = multiprocessing.Pool(min(workers,len(iterations)),reset_forked_process)
+        try:
+            return pool.map(run_forked_iteration,[(token,n,last and n==len(iterations)-1) for n in range(len(iterations))])
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        with _forked_iterations_lock:
+            del _forked_iterations[token]
+
+SAVE_BATCH_SIZE = 300
+
+def batches(objects,size=SAVE_BATCH_SIZE):
+    for start in range(0,len(objects),size):
+        yield objects[start:start+size]
+
+def update_values(objects,encoded):
+    """ updates the value column of a list of inputs or outputs with
+        UPDATE ... SET value = CASE id WHEN ... END statements, one per
+        SAVE_BATCH_SIZE rows. An input usually holds the very object of
+        the output it is connected to, so values are encoded once and
+        remembered in encoded (by object identity), which also makes the
+        input reference the output's blob. """
+    if not objects:
+        return
+    model = objects[0].__class__
+    field = model._meta.get_field('value')
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+    for chunk in batches(objects):
+        cases = []
+        params = []
+        for o in chunk:
+            value = field.pre_save(o,False)
+            key = (id(value),field.compress,field.protocol)
+            if key not in encoded:
+                encoded[key] = (value,field.get_db_prep_save(value,connection=connection))
+            cases.append('WHEN %s THEN %s')
+            params.append(o.pk)
+            params.append(encoded[key][1])
+        params.extend(o.pk for o in chunk)
+        cursor.execute('UPDATE %s SET %s = CASE %s %s END WHERE %s IN (%s)' % (
+            qn(model._meta.db_table),
+            qn(field.column),
+            qn(model._meta.pk.column),
+            ' '.join(cases),
+            qn(model._meta.pk.column),
+            ','.join(['%s']*len(chunk))),params)
+    transaction.commit_unless_managed()
@@ -0,0 +1,168 @@
+""" Cache of the outputs of pure widgets (see AbstractWidget.pure).
+
+Outputs are kept per process in an LRU of WORKFLOW_EXECUTION_CACHE_SIZE
+entries that expire after WORKFLOW_EXECUTION_CACHE_TTL seconds. The key
+is made of the widget action, the package and the version of the module
+that implements the action, and a hash of the input dictionary. """
+
+import os
+import sys
+import time
+import threading
+import logging
+from collections import OrderedDict
+from hashlib import sha1
+try:
+    from cPickle import dumps, loads, HIGHEST_PROTOCOL
+except ImportError:
+    from pickle import dumps, loads, HIGHEST_PROTOCOL
+
+from django.conf import settings
+
+from workflows.forking import after_fork
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionCache(object):
+    """ LRU of pickled output dictionaries. Values are pickled when they
+    are stored and unpickled on every hit, so widgets that modify their
+    inputs in place can't change what is cached. """
+
+    def __init__(self,max_entries,ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self,key):
+        with self.lock:
+            entry = self.entries.pop(key,None)
+            if entry is not None and self.ttl and time.time()-entry[0] > self.ttl:
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries[key] = entry
+            self.hits += 1
+        return loads(entry[1])
+
+    def set(self,key,outputs):
+        try:
+            data = dumps(outputs,HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        with self.lock:
+            self.entries.pop(key,None)
+            self.entries[key] = (time.time(),data)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            return {'hits':self.hits,'misses':self.misses,'entries':len(self.entries)}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_execution_cache():
+    """ returns the cache of this process or None if it is disabled
+    (WORKFLOW_EXECUTION_CACHE_SIZE is 0) """
+    global _cache
+    size = getattr(settings,'WORKFLOW_EXECUTION_CACHE_SIZE',0)
+    if not size:
+        return None
+    ttl = getattr(settings,'WORKFLOW_EXECUTION_CACHE_TTL',None)
+    with _cache_lock:
+        if _cache is None or _cache.max_entries != size or _cache.ttl != ttl:
+            _cache = ExecutionCache(size,ttl)
+        return _cache
+
+@after_fork
+def _reset_locks():
+    global _cache_lock
+    _cache_lock = threading.Lock()
+    if _cache is not None:
+        _cache.lock = threading.Lock()
+
+
+def canonical(value):
+    """ returns an equal value where dictionaries and sets are replaced by
+    sorted tuples, so that equal inputs always pickle to the same string """
+    if isinstance(value,dict):
+        return ('__dict__',tuple(sorted((canonical(k),canonical(v)) for k,v in value.iteritems())))
+    if isinstance(value,(set,frozenset)):
+        return ('__set__',tuple(sorted(canonical(v) for v in value)))
+    if isinstance(value,list):
+        return ('__list__',tuple(canonical(v) for v in value))
+    if isinstance(value,tuple):
+        return tuple(canonical(v) for v in value)
+    return value
+
+def module_version(function):
+    """ the __version__ of the module that defines the function or, if
+    it has none, the modification time of its source """
+    module = sys.modules.get(getattr(function,'__module__',None))
+    if module is None:
+        return None
+    version = getattr(module,'__version__',None)
+    if version is not None:
+        return version
+    path = getattr(module,'__file__',None)
+    if path is None:
+        return None
+    if path.endswith('.pyc') or path.endswith('.pyo'):
+        path = path[:-1]
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def fingerprint(abstract_widget,function,input_dict):
+    """ returns the cache key of running the widget with the inputs or None
+    if the inputs can't be pickled. It is also stored as the input
+    fingerprint of widgets (see Widget.is_up_to_date). """
+    try:
+        inputs = dumps(canonical(input_dict),HIGHEST_PROTOCOL)
+    except Exception:
+        return None
+    key = dumps((abstract_widget.action,abstract_widget.package,abstract_widget.wsdl,abstract_widget.wsdl_method,
+                 module_version(function)),HIGHEST_PROTOCOL)
+    return sha1(key+inputs).hexdigest()
+
+def is_cacheable(abstract_widget):
+    return abstract_widget.pure and not abstract_widget.interactive and not abstract_widget.is_streaming
+
+def cached_call(abstract_widget,function,input_dict,call,key=None):
+    """ returns call() (the outputs of the widget) or the outputs cached
+    for equal inputs if the widget is pure. key is the fingerprint of the
+    inputs if it was already computed. """
+    cache = get_execution_cache()
+    if cache is None or not is_cacheable(abstract_widget):
+        return call()
+    if key is None:
+        key = fingerprint(abstract_widget,function,input_dict)
+    if key is None:
+        return call()
+    outputs = cache.get(key)
+    if outputs is not None:
+        logger.debug('Execution cache hit for %s (%s)',abstract_widget.action,cache.stats())
+        return outputs
+    outputs = call()
+    cache.set(key,outputs)
+    logger.debug('Execution cache miss for %s (%s)',abstract_widget.action,cache.stats())
+    return outputs
+
+def log_cache_stats():
+    cache = get_execution_cache()
+    if cache is not None:
+        logger.info('Execution cache: %(hits)d hits, %(misses)d misses, %(entries)d entries',cache.stats())
@@ -0,0 +1,53 @@
+""" Pools of processes forked from a web or Celery process.
+
+A forked process inherits the state of the whole parent process: its
+database connections, the locks that other threads of the parent held at
+fork time and, if widgets use it, the JPype JVM, which does not survive
+fork. reset_forked_process is the initializer of such pools. It detaches
+the inherited database connections and runs the functions registered with
+after_fork, which recreate the locks of the modules that widgets running
+in the pool use. Widgets that need the JVM can't run in forked processes
+at all (see can_fork). """
+
+import os
+import sys
+import logging
+
+from django.db import connections
+
+_after_fork = []
+_inherited_connections = []
+
+def after_fork(function):
+    """ registers a function that reset_forked_process calls in every
+    forked process """
+    _after_fork.append(function)
+    return function
+
+def jvm_started():
+    """ true if a JPype JVM runs in this process """
+    jpype = sys.modules.get('jpype')
+    return jpype is not None and jpype.isJVMStarted()
+
+def can_fork():
+    """ true if pools of forked processes may be used: fork is available and
+    no JVM runs in this process """
+    return hasattr(os,'fork') and not jvm_started()
+
+def reset_forked_process():
+    """ the initializer of pools of forked processes. The inherited database
+    connections are not closed, since the parent shares their sockets and
+    closing them would end its sessions, but they are kept referenced until
+    the process exits and new connections are opened when needed. The
+    locks of the logging handlers are recreated too. """
+    for alias in connections:
+        connection = connections[alias]
+        if connection.connection is not None:
+            _inherited_connections.append(connection.connection)
+            connection.connection = None
+    for ref in getattr(logging,'_handlerList',[]):
+        handler = ref() if callable(ref) else ref
+        if handler is not None:
+            handler.createLock()
+    for function in _after_fork:
+        function()
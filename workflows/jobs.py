@@ -0,0 +1,231 @@
+""" Widget runs submitted as jobs and a status store for the editor.
+
+Submitting a widget (submit_widget) returns a job id right away and the
+widget runs in a Celery worker (or in the calling process if
+USE_CONCURRENCY is off). The status of the job and the running, finished,
+error and progress fields of every saved widget are kept in the Django
+cache named by WORKFLOW_STATUS_CACHE, so that polling them doesn't load
+widget rows. The rows of the widgets (and the Celery results of the jobs)
+stay the source of truth: statuses that are not in the cache are read from
+them, and so are all statuses if the cache is kept per process (a local
+memory or a dummy cache), as the other web server processes and the Celery
+workers would not see it. Job ids start with the id of their widget, so
+the status of a job can be told from the row of its widget. """
+
+import logging
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+STATUS_FIELDS = ('running','finished','error','progress')
+
+def status_cache():
+    return get_cache(getattr(settings,'WORKFLOW_STATUS_CACHE','default'))
+
+def status_timeout():
+    return getattr(settings,'WORKFLOW_STATUS_TIMEOUT',600)
+
+def status_cache_is_shared():
+    """ false if the status cache is kept per process """
+    from django.core.cache.backends.locmem import LocMemCache
+    from django.core.cache.backends.dummy import DummyCache
+    return not isinstance(status_cache(),(LocMemCache,DummyCache))
+
+def check_status_cache():
+    """ warns if widgets run in Celery workers and the status cache is kept
+    per process, when all statuses are read from the database """
+    if getattr(settings,'USE_CONCURRENCY',False) and not status_cache_is_shared():
+        logger.warning('The WORKFLOW_STATUS_CACHE cache is not shared by the processes, '
+                       'widget and job statuses are read from the database. Use a shared '
+                       'cache (memcached, a database cache, ...) with USE_CONCURRENCY.')
+
+def widget_key(widget_id):
+    return 'workflows:widget-status:%d' % widget_id
+
+def job_key(job_id):
+    return 'workflows:job:%s' % job_id
+
+
+def publish_widget_status(sender,instance,**kwargs):
+    """ post_save handler of Widget that writes its status to the store """
+    status = dict((f,getattr(instance,f)) for f in STATUS_FIELDS)
+    try:
+        status_cache().set(widget_key(instance.pk),status,status_timeout())
+    except Exception:
+        logger.exception('Could not store the status of widget %s',instance.pk)
+
+def forget_widget_statuses(widget_ids):
+    """ drops the stored statuses of widgets that were changed without
+    calling save() (e.g. with QuerySet.update) """
+    status_cache().delete_many([widget_key(w_id) for w_id in widget_ids])
+
+def widget_statuses(widget_ids):
+    """ returns a dictionary of widget ids and statuses. Statuses that
+    aren't in the store are read from the database and stored. """
+    from workflows.models import Widget
+    shared = status_cache_is_shared()
+    statuses = {}
+    if shared:
+        cache = status_cache()
+        keys = dict((widget_key(w_id),w_id) for w_id in widget_ids)
+        statuses = dict((keys[key],status) for key,status in cache.get_many(keys.keys()).items())
+    missing = [w_id for w_id in widget_ids if w_id not in statuses]
+    if missing:
+        loaded = {}
+        for row in Widget.objects.filter(pk__in=missing).values('pk',*STATUS_FIELDS):
+            w_id = row.pop('pk')
+            statuses[w_id] = row
+            loaded[widget_key(w_id)] = row
+        if shared:
+            cache.set_many(loaded,status_timeout())
+    return statuses
+
+def widget_status(widget_id):
+    """ returns the status of the widget or None if it doesn't exist """
+    return widget_statuses([widget_id]).get(widget_id)
+
+
+def check_required_inputs(widget):
+    """ raises an exception if a required input of the widget (or all
+    inputs of a required multiple input) has nothing connected to it """
+    multi_satisfied = {}
+    for inp in widget.inputs.filter(required=True,parameter=False):
+        if inp.connections.count()==0:
+            if inp.multi_id == 0:
+                raise Exception("The input "+str(inp)+" must have something connected to it in order to run.")
+            else:
+                multi_satisfied[inp.multi_id] = (str(inp),multi_satisfied.get(inp.multi_id,False))
+        elif inp.multi_id != 0:
+            multi_satisfied[inp.multi_id] = (str(inp),True)
+    for mid in multi_satisfied.keys():
+        if multi_satisfied[mid][1]==False:
+            raise Exception("The input "+multi_satisfied[mid][0]+" must have something connected to it in order to run.")
+
+def execute_widget(widget,check_inputs=True,in_worker=False):
+    """ runs the widget and returns the message for the editor: a dictionary
+    with the status ('ok', 'interactive', 'visualize' or 'error') and a
+    message. Errors are reported and not raised. A Celery worker
+    (in_worker) runs the widget itself instead of passing it on to the
+    windows queue. """
+    try:
+        if check_inputs:
+            check_required_inputs(widget)
+        if widget.type == 'for_input' or widget.type == 'for_output':
+            raise Exception("You can't run for loops like this. Please run the containing widget.")
+        if in_worker:
+            widget.proper_run(False)
+        else:
+            widget.run(False)
+        if not widget.abstract_widget is None:
+            if widget.abstract_widget.interactive:
+                widget.interaction_waiting = True
+                widget.save()
+                return {'status':'interactive','message':'Widget '+widget.name+' needs your attention.','widget_id':widget.id}
+            elif widget.abstract_widget.visualization_view!='':
+                return {'status':'visualize','message':'Visualizing widget '+widget.name+'.','widget_id':widget.id}
+        return {'status':'ok','message':'Widget '+widget.name+' executed successfully.','widget_id':widget.id}
+    except Exception,e:
+        widget.error = True
+        widget.running = False
+        widget.finished = False
+        widget.save()
+        logger.exception('Error while running widget %d', widget.id)
+        for o in widget.outputs.all():
+            o.value=None
+            o.save()
+        return {'status':'error','message':'Error occurred when trying to execute widget '+widget.name+': '+str(type(e))+' '+str(e),'widget_id':widget.id}
+
+
+def set_job_status(job_id,status):
+    status_cache().set(job_key(job_id),status,status_timeout())
+
+def job_widget_id(job_id):
+    """ the id of the widget of a job, None for other ids """
+    try:
+        return int(job_id.split('-',1)[0])
+    except ValueError:
+        return None
+
+def stored_job_status(job_id):
+    """ the status of a job that isn't in the store: the result of its
+    Celery task if it is done, otherwise the status told by the row of its
+    widget """
+    from workflows.models import Widget
+    concurrent = getattr(settings,'USE_CONCURRENCY',False)
+    widget_id = job_widget_id(job_id)
+    if widget_id is None:
+        return None
+    try:
+        widget = Widget.objects.select_related('workflow','abstract_widget').get(pk=widget_id)
+    except Widget.DoesNotExist:
+        return None
+    status = {'widget_id':widget_id,'job_id':job_id,'user_id':widget.workflow.user_id}
+    if concurrent:
+        from workflows.tasks import runWidgetJob
+        result = runWidgetJob.AsyncResult(job_id)
+        if result.ready():
+            if result.successful():
+                return result.result
+            status.update({'status':'error','message':'Error occurred when trying to execute the widget: '+str(result.result)})
+        else:
+            # the row may still hold the state of a previous run
+            status['status'] = 'running' if widget.running else 'queued'
+    elif widget.running:
+        status['status'] = 'running'
+    elif widget.error or not widget.finished:
+        status.update({'status':'error','message':'Error occurred when trying to execute widget '+widget.name+'.'})
+    elif widget.abstract_widget is not None and widget.abstract_widget.interactive and widget.interaction_waiting:
+        status.update({'status':'interactive','message':'Widget '+widget.name+' needs your attention.'})
+    elif widget.abstract_widget is not None and widget.abstract_widget.visualization_view!='':
+        status.update({'status':'visualize','message':'Visualizing widget '+widget.name+'.'})
+    else:
+        status.update({'status':'ok','message':'Widget '+widget.name+' executed successfully.'})
+    return status
+
+def job_status(job_id):
+    """ returns the status of the job: 'queued' and 'running' while it
+    runs, then the message of execute_widget. The status also holds the
+    ids of the widget and of the owner of its workflow. Returns None for
+    unknown jobs. """
+    status = None
+    if status_cache_is_shared():
+        status = status_cache().get(job_key(job_id))
+    if status is None:
+        status = stored_job_status(job_id)
+    return status
+
+def run_widget_job(job_id,widget_id,in_worker=True):
+    """ the body of the runWidgetJob task """
+    from workflows.models import Widget
+    try:
+        widget = Widget.objects.get(pk=widget_id)
+    except Widget.DoesNotExist:
+        status = {'status':'error','message':'The widget does not exist anymore.','widget_id':widget_id}
+    else:
+        set_job_status(job_id,{'status':'running','widget_id':widget_id,'job_id':job_id,'user_id':widget.workflow.user_id})
+        status = execute_widget(widget,check_inputs=False,in_worker=in_worker)
+        status['user_id'] = widget.workflow.user_id
+    status['job_id'] = job_id
+    set_job_status(job_id,status)
+    return status
+
+def submit_widget(widget):
+    """ checks the inputs of the widget, queues a job that runs it and
+    returns the job id. Raises an exception if the widget can't run. """
+    from workflows.tasks import runWidgetJob
+    check_required_inputs(widget)
+    if widget.type == 'for_input' or widget.type == 'for_output':
+        raise Exception("You can't run for loops like this. Please run the containing widget.")
+    job_id = '%d-%s' % (widget.id,uuid4().hex)
+    set_job_status(job_id,{'status':'queued','widget_id':widget.id,'job_id':job_id,'user_id':widget.workflow.user_id})
+    if getattr(settings,'USE_CONCURRENCY',False):
+        options = {}
+        if widget.abstract_widget is not None and widget.abstract_widget.windows_queue and getattr(settings,'USE_WINDOWS_QUEUE',False):
+            options['queue'] = "windows"
+        runWidgetJob.apply_async([job_id,widget.id],task_id=job_id,**options)
+    else:
+        run_widget_job(job_id,widget.id,in_worker=False)
+    return job_id
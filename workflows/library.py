@@ -35,14 +35,7 @@ def load_to_string(input_dict):
     output_dict['string']=f.read()
     return output_dict
 
-def call_webservice(input_dict):
-    from services.webservice import WebService
-    ws = WebService(input_dict['wsdl'],float(input_dict['timeout']))
-    selected_method = {}
-    for method in ws.methods:
-        if method['name']==input_dict['wsdl_method']:
-            selected_method = method
-    function_to_call = getattr(ws.client,selected_method['name'])
+def _webservice_arguments(selected_method,input_dict):
     ws_dict = {}
     for i in selected_method['inputs']:
         try:
@@ -62,7 +55,9 @@ def call_webservice(input_dict):
         except Exception as e: 
             print e
             ws_dict[i['name']]=''
-    results = function_to_call(**ws_dict)
+    return ws_dict
+
+def _webservice_outputs(results):
     output_dict=results
     if type(results)==dict:
         return output_dict
@@ -77,6 +72,62 @@ def call_webservice(input_dict):
         return output_dict
     return results
 
+def _webservice_batch_arguments(selected_method,input_dict):
+    """ the arguments of every call of the batch mode: list inputs are
+    split into one item per call, the other inputs are sent with every
+    call """
+    lengths = set(len(input_dict[i['name']]) for i in selected_method['inputs'] if type(input_dict.get(i['name'])) in (list,tuple))
+    if len(lengths) > 1:
+        raise Exception("All list inputs of the web service must have the same length.")
+    if not lengths:
+        return [_webservice_arguments(selected_method,input_dict)]
+    calls = []
+    for n in range(lengths.pop()):
+        item_dict = dict(input_dict)
+        for i in selected_method['inputs']:
+            if type(input_dict.get(i['name'])) in (list,tuple):
+                item_dict[i['name']] = input_dict[i['name']][n]
+        calls.append(_webservice_arguments(selected_method,item_dict))
+    return calls
+
+def call_webservice(input_dict):
+    """ calls the method of the web service. If batch is set, the method is
+    called for every item of the list inputs (concurrently, see
+    WebService.call_many) and every output is the list of the outputs of the
+    calls. With collecterrors the outputs of failed calls are None and the
+    errors are listed in errors, otherwise the first error is raised. """
+    from services.webservice import WebService
+    ws = WebService(input_dict['wsdl'],float(input_dict['timeout']))
+    selected_method = {}
+    for method in ws.methods:
+        if method['name']==input_dict['wsdl_method']:
+            selected_method = method
+    if input_dict.get('batch')!="true":
+        function_to_call = getattr(ws.client,selected_method['name'])
+        ws_dict = _webservice_arguments(selected_method,input_dict)
+        results = function_to_call(**ws_dict)
+        return _webservice_outputs(results)
+    calls = _webservice_batch_arguments(selected_method,input_dict)
+    fail_fast = input_dict.get('collecterrors')!="true"
+    results = ws.call_many(selected_method['name'],calls,fail_fast=fail_fast)
+    outputs = [r if isinstance(r,Exception) else _webservice_outputs(r) for r in results]
+    keys = [o['name'] for o in selected_method['outputs']]
+    for o in outputs:
+        if type(o)==dict:
+            keys.extend(k for k in o.keys() if not k in keys)
+    output_dict = dict((k,[]) for k in keys)
+    errors = []
+    for n,o in enumerate(outputs):
+        if isinstance(o,Exception):
+            errors.append((n,str(type(o))+' '+str(o)))
+            o = {}
+        elif type(o)!=dict:
+            o = {}
+        for k in keys:
+            output_dict[k].append(o.get(k))
+    output_dict['errors'] = errors
+    return output_dict
+
 def multiply_integers(input_dict):
     product = 1
     for i in input_dict['integers']:
@@ -0,0 +1,130 @@
+import random
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+import workflows.library
+from workflows.engine import WorkflowRunner
+from workflows.models import Workflow, Widget, Input, Output, Connection, AbstractWidget, Category
+
+
+def benchmark_cv_learner(input_dict):
+    """ a CPU bound "learner": predicts every test example as the nearest
+    training example and returns the mean absolute error """
+    train = [x for fold in input_dict['train'] for x in fold]
+    error = 0.0
+    for x in input_dict['test']:
+        nearest = train[0]
+        for y in train:
+            if abs(x-y) < abs(x-nearest):
+                nearest = y
+        error += abs(x-nearest)
+    return {'score': error/len(input_dict['test'])}
+
+
+class Command(BaseCommand):
+    help = 'Builds a synthetic cross validation (a subprocess with a CPU bound nearest neighbour "learner") and times ' \
+           'it with the folds run one after another and in parallel. The workflows are created in the configured ' \
+           'database and deleted afterwards.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('-n', '--examples',
+            dest='examples',
+            type='int',
+            default=5000,
+            help='Number of examples in the data.'
+        ),
+        make_option('-k', '--folds',
+            dest='folds',
+            type='int',
+            default=10,
+            help='Number of folds.'
+        ),
+        make_option('-w', '--workers',
+            dest='workers',
+            default='1,2,4,8',
+            help='Comma separated list of the numbers of folds to run at the same time.'
+        ),
+        make_option('-b', '--backends',
+            dest='backends',
+            default='processes,threads',
+            help='Comma separated list of WORKFLOW_LOOP_BACKENDs to time.'
+        ),
+        make_option('--seed',
+            dest='seed',
+            type='int',
+            default=0,
+            help='Random seed for the data and the folds.'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        workflows.library.benchmark_cv_learner = benchmark_cv_learner
+        rnd = random.Random(options['seed'])
+        data = [rnd.random() for i in range(options['examples'])]
+        user = User.objects.create(username='cv-benchmark-%d' % int(time.time()))
+        category = Category.objects.create(name='Cross validation benchmark')
+        abstract_widget = AbstractWidget.objects.create(name='Nearest neighbour', action='benchmark_cv_learner', category=category)
+        backend = getattr(settings, 'WORKFLOW_LOOP_BACKEND', 'threads')
+        try:
+            workflow, body, results = build_workflow(user, abstract_widget, data, options['folds'], options['seed'])
+            expected = None
+            for backend_name in options['backends'].split(','):
+                settings.WORKFLOW_LOOP_BACKEND = backend_name
+                for workers in [int(n) for n in options['workers'].split(',')]:
+                    if workers == 1 and expected is not None:
+                        continue
+                    body.loop_workers = workers
+                    body.save()
+                    # the learner would be skipped for the fold it ran last
+                    Widget.objects.filter(workflow=body).update(input_fingerprint='')
+                    start = time.time()
+                    WorkflowRunner(workflow).run()
+                    elapsed = time.time()-start
+                    scores = Output.objects.get(pk=results.pk).value
+                    if expected is None:
+                        expected = scores
+                        serial = elapsed
+                    status = 'ok' if scores == expected else 'DIFFERENT RESULTS'
+                    self.stdout.write('%-10s %3d workers %10.3f s %7.2fx  %s\n' % (
+                        backend_name if workers > 1 else 'serial', workers, elapsed, serial/elapsed, status))
+                    self.stdout.flush()
+            workflow.delete()
+        finally:
+            settings.WORKFLOW_LOOP_BACKEND = backend
+            abstract_widget.delete()
+            category.delete()
+            user.delete()
+
+
+@transaction.commit_on_success
+def build_workflow(user, abstract_widget, data, folds, seed):
+    """ Creates a workflow with a cross validation subprocess whose body runs
+    the learner on every fold. Returns the workflow, the body and the output
+    of the subprocess that collects the scores. """
+    workflow = Workflow.objects.create(name='Cross validation benchmark', user=user)
+    cv = Widget.objects.create(workflow=workflow, x=0, y=0, name='Cross validation', type='subprocess')
+    data_input = Input.objects.create(widget=cv, name='Data', short_name='dat', variable='data', required=False, parameter=True, value=data, order=1)
+    folds_input = Input.objects.create(widget=cv, name='Folds', short_name='fld', variable='folds', required=False, parameter=True, value=str(folds), order=2)
+    seed_input = Input.objects.create(widget=cv, name='Seed', short_name='sed', variable='seed', required=False, parameter=True, value=str(seed), order=3)
+    results = Output.objects.create(widget=cv, name='Scores', short_name='scr', variable='scores', order=1)
+
+    body = Workflow.objects.create(name='Cross validation benchmark body', user=user, widget=cv)
+    cv_input = Widget.objects.create(workflow=body, x=0, y=0, name='CV input', type='cv_input')
+    train = Output.objects.create(widget=cv_input, name='Train', short_name='trn', variable='train', outer_input=data_input, order=1)
+    test = Output.objects.create(widget=cv_input, name='Test', short_name='tst', variable='test', outer_input=folds_input, order=2)
+    Output.objects.create(widget=cv_input, name='Seed', short_name='sed', variable='seed', outer_input=seed_input, order=3)
+    learner = Widget.objects.create(workflow=body, x=0, y=0, name='Nearest neighbour', abstract_widget=abstract_widget, type='regular')
+    train_input = Input.objects.create(widget=learner, name='Train', short_name='trn', variable='train', required=True, parameter=False, order=1)
+    test_input = Input.objects.create(widget=learner, name='Test', short_name='tst', variable='test', required=True, parameter=False, order=2)
+    score = Output.objects.create(widget=learner, name='Score', short_name='scr', variable='score', order=1)
+    cv_output = Widget.objects.create(workflow=body, x=0, y=0, name='CV output', type='cv_output')
+    score_input = Input.objects.create(widget=cv_output, name='Score', short_name='scr', variable='score', required=False, parameter=False, outer_output=results, order=1)
+    Connection.objects.create(workflow=body, output=train, input=train_input)
+    Connection.objects.create(workflow=body, output=test, input=test_input)
+    Connection.objects.create(workflow=body, output=score, input=score_input)
+    return workflow, body, results
@@ -0,0 +1,173 @@
+import random
+import time
+from collections import deque
+from optparse import make_option
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from workflows.engine import WorkflowRunner
+from workflows.models import Workflow, Widget, Input, Output, Connection, AbstractWidget, Category
+
+
+class Command(BaseCommand):
+    help = 'Builds synthetic workflows (random DAGs of "add_multiple" widgets) and times the WorkflowRunner on them. ' \
+           'The workflows are created in the configured database and deleted afterwards.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('-w', '--widgets',
+            dest='widgets',
+            default='1000,10000',
+            help='Comma separated list of workflow sizes (number of widgets).'
+        ),
+        make_option('-f', '--fan-in',
+            dest='fan_in',
+            type='int',
+            default=2,
+            help='Number of inputs of each widget that is not a source.'
+        ),
+        make_option('--window',
+            dest='window',
+            type='int',
+            default=50,
+            help='Inputs are connected to random widgets among the previous WINDOW widgets.'
+        ),
+        make_option('--seed',
+            dest='seed',
+            type='int',
+            default=0,
+            help='Random seed for the generated graphs.'
+        ),
+        make_option('--legacy',
+            action='store_true',
+            dest='legacy',
+            default=False,
+            help='Also time the old scheduler that rescans all connections for every widget in every wave (very slow above a few thousand widgets) and the old row by row save.'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        sizes = [int(n) for n in options['widgets'].split(',')]
+        user = User.objects.create(username='engine-benchmark-%d' % int(time.time()))
+        category = Category.objects.create(name='Engine benchmark')
+        abstract_widget = AbstractWidget.objects.create(name='Add multiple', action='add_multiple', category=category)
+        try:
+            for n in sizes:
+                rnd = random.Random(options['seed'])
+                start = time.time()
+                workflow = build_workflow(user, abstract_widget, n, options['fan_in'], options['window'], rnd)
+                self.report(n, 'build', time.time()-start)
+
+                start = time.time()
+                runner = WorkflowRunner(workflow, max_workers=1)
+                self.report(n, 'init', time.time()-start)
+
+                start = time.time()
+                indexed_schedule(runner)
+                self.report(n, 'schedule', time.time()-start)
+
+                if options['legacy']:
+                    start = time.time()
+                    legacy_schedule(runner)
+                    self.report(n, 'schedule (legacy)', time.time()-start)
+
+                start = time.time()
+                runner.run_all_unfinished_widgets()
+                self.report(n, 'run', time.time()-start)
+
+                self.timed_save(n, 'save', runner.save)
+                self.timed_save(n, 'save (unchanged)', runner.save)
+                if options['legacy']:
+                    self.timed_save(n, 'save (legacy)', lambda: legacy_save(runner))
+
+                workflow.delete()
+        finally:
+            abstract_widget.delete()
+            category.delete()
+            user.delete()
+
+    def report(self, n, phase, elapsed, queries=None):
+        if queries is None:
+            self.stdout.write('%7d widgets  %-20s %10.3f s\n' % (n, phase, elapsed))
+        else:
+            self.stdout.write('%7d widgets  %-20s %10.3f s %7d queries\n' % (n, phase, elapsed, queries))
+        self.stdout.flush()
+
+    def timed_save(self, n, phase, save):
+        """ Times a save and counts the queries it sends to the database. """
+        use_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        try:
+            queries = len(connection.queries)
+            start = time.time()
+            save()
+            elapsed = time.time()-start
+            queries = len(connection.queries)-queries
+        finally:
+            connection.use_debug_cursor = use_debug_cursor
+        self.report(n, phase, elapsed, queries)
+
+
+@transaction.commit_on_success
+def build_workflow(user, abstract_widget, n, fan_in, window, rnd):
+    """ Creates a workflow of n widgets where every widget (except the first
+    one) sums the outputs of up to fan_in random widgets among the previous
+    window widgets. """
+    workflow = Workflow.objects.create(name='Engine benchmark (%d widgets)' % n, user=user)
+    outputs = []
+    for k in range(n):
+        widget = Widget.objects.create(workflow=workflow, x=0, y=0, name='Add multiple', abstract_widget=abstract_widget, type='regular')
+        if k == 0:
+            Input.objects.create(widget=widget, name='Integer', short_name='int', variable='integer', required=False, parameter=True, multi_id=1, value='1')
+        else:
+            for source in rnd.sample(outputs[max(0, k-window):k], min(fan_in, k, window)):
+                i = Input.objects.create(widget=widget, name='Integer', short_name='int', variable='integer', required=False, parameter=False, multi_id=1)
+                Connection.objects.create(workflow=workflow, output=source, input=i)
+        outputs.append(Output.objects.create(widget=widget, name='Sum', short_name='sum', variable='sum'))
+    return workflow
+
+
+def indexed_schedule(runner):
+    """ Walks the workflow in the order the runner would execute it, without
+    executing the widgets. """
+    runner.cleanup()
+    pending = runner.pending_dependencies()
+    runnable_widgets = deque(w for w in runner.unfinished_widgets if pending[w.id] == 0)
+    while runnable_widgets:
+        w = runnable_widgets.popleft()
+        w.finished = True
+        runnable_widgets.extend(runner.release_successors(w, pending))
+    runner.cleanup()
+
+
+def legacy_schedule(runner):
+    """ Same as indexed_schedule, but finds the runnable widgets the way the
+    runner did before the connections were indexed. """
+    runner.cleanup()
+    while True:
+        finished_widget_ids = [w.id for w in runner.widgets if w.finished]
+        runnable = []
+        for w in runner.unfinished_widgets:
+            ready_to_run = True
+            for c in runner.connections:
+                if runner.inputs[c.input_id].widget_id == w.id and not runner.outputs[c.output_id].widget_id in finished_widget_ids:
+                    ready_to_run = False
+            if ready_to_run:
+                runnable.append(w)
+        if not runnable:
+            break
+        for w in runnable:
+            w.finished = True
+    runner.cleanup()
+
+
+def legacy_save(runner):
+    """ Saves every input, output and widget of the runner row by row, the
+    way WorkflowRunner.save did before it tracked changes. """
+    for w in runner.widgets:
+        for i in w.inputs.all():
+            i.save(force_update=True)
+        for o in w.outputs.all():
+            o.save(force_update=True)
+        w.save(force_update=True)
@@ -7,7 +7,7 @@ import workflows.library
 import time
 import random
 
-from picklefield.fields import PickledObjectField
+from picklefield.fields import PickledObjectField, PickledBlobField, shared_value
 
 from workflows.thumbs import ThumbnailField
 
@@ -20,6 +20,8 @@ if USE_CONCURRENCY:
 from workflows.tasks import executeWidgetFunction, executeWidgetProgressBar, executeWidgetStreaming, executeWidgetWithRequest, runWidget, executeWidgetPostInteract
 
 from workflows.engine import WidgetRunner, WorkflowRunner
+from workflows.execution_cache import cached_call, fingerprint, is_cacheable
+from workflows.jobs import publish_widget_status, forget_widget_statuses, check_status_cache
 
 import streams
 
@@ -78,6 +80,7 @@ class Workflow(models.Model):
     description = models.TextField(blank=True,default='') # a field
     widget = models.OneToOneField('Widget',related_name="workflow_link",blank=True,null=True)
     template_parent = models.ForeignKey('Workflow',blank=True,null=True,default=None,on_delete=models.SET_NULL)
+    loop_workers = models.PositiveIntegerField(default=0,help_text='If this workflow is the body of a for loop or a cross validation, this many iterations (folds) run at the same time. 0 means the WORKFLOW_LOOP_WORKERS setting, 1 runs them one after another.')
 
     def import_from_json(self,json_data,input_conversion,output_conversion):
         self.name = json_data['name']
@@ -524,6 +527,8 @@ class AbstractWidget(models.Model):
 
     windows_queue = models.BooleanField(default=False,help_text="This is used for Matjaz Jursic's widgets.")
 
+    pure = models.BooleanField(default=False,help_text='Pure widgets always return the same outputs for the same inputs and have no side effects. Their outputs are cached (see WORKFLOW_EXECUTION_CACHE_SIZE) and reused when the widget is run again with equal inputs.')
+
     class Meta:
         ordering = ('order','name',)
 
@@ -653,6 +658,8 @@ class Widget(models.Model):
 
     progress = models.IntegerField(default=0)
 
+    input_fingerprint = models.CharField(max_length=40,blank=True,default='',help_text='Fingerprint of the inputs the widget last ran with (see is_up_to_date).')
+
     def import_from_json(self,json_data,input_conversion,output_conversion):
         self.x = json_data['x']
         self.y = json_data['y']
@@ -720,6 +727,52 @@ class Widget(models.Model):
     def unfinish(self):
         self.reset_descendants()
 
+    def unfinish_successors(self):
+        """ unfinishes the widgets connected after this one, except those
+        that are finished and would run with the same inputs as they did
+        (the new outputs of this widget are equal to the old ones), so
+        the invalidation doesn't spread past them. """
+        for w in Widget.objects.filter(inputs__connections__output__widget=self).distinct():
+            if not w.finished or not w.is_reusable() or w.input_fingerprint == '' or w.input_fingerprint != w.current_input_fingerprint():
+                w.unfinish()
+
+    def is_reusable(self):
+        """ widgets whose outputs may be kept when they are rerun with the
+        same inputs: pure widgets (see AbstractWidget.pure) that are not
+        interactive, streaming or visualizations """
+        return not self.abstract_widget is None and is_cacheable(self.abstract_widget) \
+            and self.abstract_widget.visualization_view == ''
+
+    def is_up_to_date(self,fingerprint):
+        """ true if the widget already ran with inputs with this fingerprint
+        and still holds the outputs of that run, so it doesn't have to run
+        again """
+        if fingerprint is None or fingerprint != self.input_fingerprint or not self.is_reusable():
+            return False
+        return any(shared_value(o,'value') is not None for o in self.outputs.all())
+
+    def current_input_fingerprint(self):
+        """ the fingerprint of the inputs the widget would run with now """
+        if self.abstract_widget is None:
+            return None
+        input_dict = {}
+        for i in self.inputs.all():
+            value = i.value
+            if not i.parameter:
+                cons = i.connections.all()
+                if len(cons) > 0:
+                    value = cons[0].output.value
+                else:
+                    value = None
+            if i.multi_id == 0:
+                input_dict[i.variable]=value
+            else:
+                if not i.variable in input_dict:
+                    input_dict[i.variable]=[]
+                if value is not None:
+                    input_dict[i.variable].append(value)
+        return fingerprint(self.abstract_widget,getattr(workflows.library,self.abstract_widget.action),input_dict)
+
     def subunfinish(self):
         if self.type == 'subprocess':
             for w in self.workflow_link.widgets.all():
@@ -786,7 +839,7 @@ class Widget(models.Model):
                 if not i.parameter:
                     """ if there is a connection than true and read the output value """
                     if i.connections.count() > 0:
-                        i.value = i.connections.all()[0].output.value
+                        i.value = shared_value(i.connections.all()[0].output,'value')
                         i.save()
                     else:
                         i.value = None
@@ -798,6 +851,16 @@ class Widget(models.Model):
                         input_dict[i.variable]=[]
                     if i.value is not None:
                         input_dict[i.variable].append(i.value)
+            input_fingerprint = None
+            if self.is_reusable():
+                input_fingerprint = fingerprint(self.abstract_widget,function_to_call,input_dict)
+                if self.is_up_to_date(input_fingerprint):
+                    """ the widget already ran with these inputs, its outputs are still valid """
+                    self.finished=True
+                    self.running=False
+                    self.error=False
+                    self.save()
+                    return {}
             start = time.time()
             try:
                 if not self.abstract_widget is None:
@@ -807,15 +870,9 @@ class Widget(models.Model):
                         """ if abstrac widget is a web service """
                         input_dict['wsdl']=self.abstract_widget.wsdl
                         input_dict['wsdl_method']=self.abstract_widget.wsdl_method
-                    if self.abstract_widget.has_progress_bar:
-                        """ if abstrac widget has a progress bar """
-                        outputs = function_to_call(input_dict,self)
-                    elif self.abstract_widget.is_streaming:
-                        """ if abstrac widget is a stream """
-                        outputs = function_to_call(input_dict,self,None)
-                    else:
-                        """ else run abstract widget function """
-                        outputs = function_to_call(input_dict)
+                    outputs = cached_call(self.abstract_widget,function_to_call,input_dict,
+                                          lambda: self.call_function(function_to_call,input_dict),
+                                          key=input_fingerprint)
                 else:
                     Input.objects.filter(widget__workflow=self.workflow_link,parameter=False).update(value=None)
                     Output.objects.filter(widget__workflow=self.workflow_link).update(value=None)
@@ -826,10 +883,12 @@ class Widget(models.Model):
                 self.error=True
                 self.running=False
                 self.finished=False
+                self.input_fingerprint=''
                 self.save()
                 raise
             elapsed = (time.time()-start)
             outputs['clowdflows_elapsed']=elapsed
+            self.input_fingerprint = input_fingerprint or ''
             for o in self.outputs.all():
                 """ we walk through all the outputs """
                 if not self.abstract_widget is None:
@@ -857,9 +916,7 @@ class Widget(models.Model):
                     self.running=False
                     self.error=False
                     self.save()
-            cons = Connection.objects.filter(output__widget=self)
-            for c in cons:
-                c.input.widget.unfinish()
+            self.unfinish_successors()
             return outputs
         elif self.type == 'for_input':
             """ if object is an input widget for for loop than read all input values and finish """
@@ -880,7 +937,7 @@ class Widget(models.Model):
                 if not i.parameter:
                     """ if there is a connection than true and read the output value """
                     if i.connections.count() > 0:
-                        i.value = i.connections.all()[0].output.value
+                        i.value = shared_value(i.connections.all()[0].output,'value')
                         i.save()
                         i.outer_output.value.append(i.value)
                         i.outer_output.save()
@@ -943,7 +1000,7 @@ class Widget(models.Model):
                 if not i.parameter:
                     """ if there is a connection than true and read the output value """
                     if i.connections.count() > 0:
-                        i.value = i.connections.all()[0].output.value
+                        i.value = shared_value(i.connections.all()[0].output,'value')
                         i.save()
                         i.outer_output.value = i.value
                         i.outer_output.save()
@@ -954,6 +1011,17 @@ class Widget(models.Model):
             self.save()
         return None
 
+    def call_function(self,function_to_call,input_dict):
+        if self.abstract_widget.has_progress_bar:
+            """ if abstrac widget has a progress bar """
+            return function_to_call(input_dict,self)
+        elif self.abstract_widget.is_streaming:
+            """ if abstrac widget is a stream """
+            return function_to_call(input_dict,self,None)
+        else:
+            """ else run abstract widget function """
+            return function_to_call(input_dict)
+
     def reset(self,offline):
         #for i in self.inputs.all():
         #    if not i.parameter:
@@ -965,6 +1033,7 @@ class Widget(models.Model):
         self.finished = False
         self.error = False
         self.running = False
+        self.input_fingerprint = ''
         self.save()
         if self.type == 'subprocess':
             self.subunfinish()
@@ -993,6 +1062,7 @@ class Widget(models.Model):
                     pass
             current_widgets_that_need_reset = new_widgets_that_need_reset
         Widget.objects.filter(id__in=widgets_that_need_reset).update(finished=False,error=False,running=False)
+        forget_widget_statuses(widgets_that_need_reset)
         subprocesses = Widget.objects.filter(id__in=widgets_that_need_reset,type='subprocess')
         for w in subprocesses:
             w.subunfinish()
@@ -1015,6 +1085,7 @@ class Widget(models.Model):
                         widgets_that_need_reset.add(c.input.widget_id)
             current_widgets_that_need_reset = new_widgets_that_need_reset
         Widget.objects.filter(id__in=widgets_that_need_reset).update(finished=False,error=False,running=False)
+        forget_widget_statuses(widgets_that_need_reset)
         for w in widgets_that_need_reset:
             if widgets_dict[w].type == 'subprocess':
                 widgets_dict[w].subunfinish()
@@ -1036,7 +1107,7 @@ class Widget(models.Model):
             #gremo pogledat ce obstaja povezava in ce obstaja gremo value prebrat iz outputa
             if not i.parameter:
                 if i.connections.count() > 0:
-                    i.value = i.connections.all()[0].output.value
+                    i.value = shared_value(i.connections.all()[0].output,'value')
                     i.save()
                 else:
                     i.value = None
@@ -1071,9 +1142,7 @@ class Widget(models.Model):
         self.error=False
         self.interaction_waiting=False
         self.save()
-        cons = Connection.objects.filter(output__widget=self)
-        for c in cons:
-            c.input.widget.unfinish()
+        self.unfinish_successors()
         return outputs
 
     def __unicode__(self):
@@ -1087,7 +1156,7 @@ class Input(models.Model):
     widget = models.ForeignKey(Widget,related_name="inputs")
     required = models.BooleanField()
     parameter = models.BooleanField()
-    value = PickledObjectField(null=True)
+    value = PickledBlobField(null=True)
     multi_id = models.IntegerField(default=0)
     inner_output = models.ForeignKey('Output',related_name="outer_input_rel",blank=True,null=True) #za subprocess
     outer_output = models.ForeignKey('Output',related_name="inner_input_rel",blank=True,null=True) #za subprocess
@@ -1237,7 +1306,7 @@ class Output(models.Model):
     description = models.TextField(blank=True)
     variable = models.CharField(max_length=50)
     widget = models.ForeignKey(Widget,related_name="outputs")
-    value = PickledObjectField(null=True)
+    value = PickledBlobField(null=True)
     inner_input = models.ForeignKey(Input,related_name="outer_output_rel",blank=True,null=True) #za subprocess
     outer_input = models.ForeignKey(Input,related_name="inner_output_rel",blank=True,null=True) #za subprocess
     order = models.PositiveIntegerField(default=1)
@@ -1306,6 +1375,10 @@ def create_user_profile(sender, instance, created, **kwargs):
 # nardi da k nardimo userja da se avtomatsko nardi se UserProfile
 post_save.connect(create_user_profile, sender=User)
 
+# the status of the widgets is polled from the status store (workflows.jobs)
+post_save.connect(publish_widget_status, sender=Widget)
+check_status_cache()
+
 def copy_workflow(old, user, parent_widget_conversion={},parent_input_conversion={},parent_output_conversion={},parent_widget=None):
     w = Workflow()
     if parent_widget is None:
@@ -1315,6 +1388,7 @@ def copy_workflow(old, user, parent_widget_conversion={},parent_input_conversion
     w.user = user
     w.public = False
     w.description = old.description
+    w.loop_workers = old.loop_workers
     w.template_parent = old
     if not parent_widget is None:
         w.widget = parent_widget
@@ -1339,6 +1413,7 @@ def copy_workflow(old, user, parent_widget_conversion={},parent_input_conversion
         new_widget.interaction_waiting = widget.interaction_waiting
         new_widget.type = widget.type
         new_widget.progress = widget.progress
+        new_widget.input_fingerprint = widget.input_fingerprint
         new_widget.save()
         widget_conversion[widget.id]=new_widget.id
         if widget.abstract_widget and widget.abstract_widget.is_streaming:
@@ -1353,6 +1428,12 @@ def copy_workflow(old, user, parent_widget_conversion={},parent_input_conversion
                 new_sws.save()
             except:
                 pass
+            streams.models.StreamWidgetEntry.objects.bulk_create([
+                streams.models.StreamWidgetEntry(stream=new_stream,widget=new_widget,name=e.name,key=e.key,value=e.value)
+                for e in streams.models.StreamWidgetEntry.objects.filter(stream=old_stream,widget=widget).order_by('id')])
+            streams.models.StreamItem.objects.bulk_create([
+                streams.models.StreamItem(stream=new_stream,widget=new_widget,key=i.key,created_at=i.created_at,value=i.value)
+                for i in streams.models.StreamItem.objects.filter(stream=old_stream,widget=widget).order_by('id')])
             try:
                 swds = streams.models.StreamWidgetData.objects.filter(stream=old_stream,widget=widget)
                 for swd in swds:
@@ -1375,7 +1456,7 @@ def copy_workflow(old, user, parent_widget_conversion={},parent_input_conversion
             new_input.widget = new_widget
             new_input.required = input.required
             new_input.parameter = input.parameter
-            new_input.value = input.value
+            new_input.value = shared_value(input,'value')
             new_input.multi_id = input.multi_id
             #inner_output nikol ne nastavlamo
             #outer_output in njemu spremenimo inner input
@@ -1402,7 +1483,7 @@ def copy_workflow(old, user, parent_widget_conversion={},parent_input_conversion
             new_output.description = output.description
             new_output.variable = output.variable
             new_output.widget = new_widget
-            new_output.value = output.value
+            new_output.value = shared_value(output,'value')
             #inner input nikol ne nastavlamo
             #outer input in njemu spremenimo inner output
             if not parent_widget is None:
@@ -79,10 +79,24 @@ def segmine_fc_gene_filter(input_dict):
     return {'dataset' : None}
 
 
+def _t_scores(control, data):
+    """ Welch t-scores of the genes (rows) of the control and data matrices
+    (genes x examples), with the same operations (and results) as computing
+    them gene by gene. Genes with no variance get an infinite (or nan)
+    score. """
+    import numpy
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        average = data.mean(axis=1) - control.mean(axis=1)
+        variance = control.var(axis=1)/control.shape[1] + \
+                   data.var(axis=1)/data.shape[1]
+        return average/numpy.sqrt(variance)
+
+
 def segmine_gene_ranker(input_dict, widget):
     import orange
-    from numpy import mean, var
-    from math import sqrt, floor
+    import numpy
+    import time
+    from django.conf import settings
     CONTROL_GROUP_KEY = 'control group'
     DATA_GROUP_KEY = 'data group'
     CLASS_ATRR_NAME = 'group'
@@ -91,14 +105,26 @@ def segmine_gene_ranker(input_dict, widget):
     m = int(input_dict['m'])
     if m == 0: # special value
         m= -1  # all examples
+    attributes = table.domain.attributes
+    interval = getattr(settings, 'WIDGET_PROGRESS_INTERVAL', 1.0)
+    widget.progress = 0
+    widget.save()
+    last_update = time.time()
+
     ranks = []
     # ReliefF parameters:
     #  - number of neighbours: 10
     #  - number of reference examples: all (-1)
     #  - checksum computation: none (the data do not change)
+    # The first call computes the qualities of all attributes at once, the
+    # others only look them up (by index) in the cached results.
     ranker = orange.MeasureAttribute_relief(k=k, m=m, checkCachedData=False)
-    for attr in table.domain.attributes:
-        ranks.append((ranker(attr, table), attr.name))
+    for i, attr in enumerate(attributes):
+        ranks.append((ranker(i, table), attr.name))
+        if time.time() - last_update >= interval:
+            widget.progress = int((i + 1)*90/len(attributes))
+            widget.save()
+            last_update = time.time()
 
     # tuples are sorted according to the first element,
     # here, this is attribute's quality
@@ -106,27 +132,16 @@ def segmine_gene_ranker(input_dict, widget):
 
     # reverse order inside sorted tuples list in result
     geneRanks = [(elt[1], elt[0]) for elt in ranks]
+
+    # all t-scores at once, from the genes x examples matrices of the groups
+    values = table.toNumpy('a')[0]
+    groups = numpy.array([str(example[CLASS_ATRR_NAME]) for example in table])
+    control = numpy.ascontiguousarray(values[groups == CONTROL_GROUP_KEY].T)
+    data = numpy.ascontiguousarray(values[groups == DATA_GROUP_KEY].T)
+    scores = _t_scores(control, data)
     tScores = {}
-    control = table.selectref({CLASS_ATRR_NAME:CONTROL_GROUP_KEY})
-    data = table.selectref({CLASS_ATRR_NAME:DATA_GROUP_KEY})
-    nerrors = 0
-    widget.progress = 0
-    widget.save()
-    for i, attr in enumerate(table.domain.attributes):
-        geneID = attr.name
-        controlValues = [float(example[attr]) for example in control]
-        dataValues = [float(example[attr]) for example in data]
-        try:
-            average = mean(dataValues) - mean(controlValues)
-            variance = var(controlValues)/len(controlValues) + \
-                       var(dataValues)/len(dataValues)
-            score = average/sqrt(variance)
-            tScores[geneID] = score
-        except ZeroDivisionError:
-            tScores[geneID] = 0.0
-        if (i + 1)%100 == 0:
-            widget.progress = floor((i + 1)/float(len(table.domain.attributes))*100)
-            widget.save()
+    for i, attr in enumerate(attributes):
+        tScores[attr.name] = scores[i]
     widget.progress = 100
     widget.save()
     sortedTScores = sorted(tScores.items(), reverse=True, key=lambda x: x[1])
@@ -161,7 +176,9 @@ def segmine_segs_ath(input_dict, widget):
 
 
 def segmine_resolve_gene_synonyms(input_dict):
-    from .data import mappings
+    import reference_data
+    symbol2entrez = reference_data.get('symbol2entrez')
+    synonyms2entrez = reference_data.get('synonyms2entrez')
     gene_ranks = input_dict['gene_ranks']
     unknown = 0
     ndup = 0
@@ -173,10 +190,10 @@ def segmine_resolve_gene_synonyms(input_dict):
         try:
             entrezID = int(geneID)
         except ValueError:
-            if geneID in mappings.symbol2entrez:
-                entrezID = mappings.symbol2entrez[geneID]
-            elif geneID in mappings.synonyms2entrez:
-                entrezID = mappings.synonyms2entrez[geneID]
+            if geneID in symbol2entrez:
+                entrezID = symbol2entrez[geneID]
+            elif geneID in synonyms2entrez:
+                entrezID = synonyms2entrez[geneID]
             else:
                 unknown += 1
                 continue
@@ -239,11 +256,10 @@ def segmine_biomine_medoid(input_dict):
 
 
 def segmine_mirna_to_gene_tarbase(input_dict):
-    import cPickle
-    from os.path import normpath, join, dirname
+    import reference_data
 
     mirna_ranks = input_dict['mirna_ranks']
-    mirna2gene = cPickle.load(open(normpath(join(dirname(__file__), 'data/mirna2gene_tarbase')),'rb'))
+    mirna2gene = reference_data.get('mirna2gene_tarbase')
 
     result = {}
     unknown = 0
@@ -268,11 +284,10 @@ def segmine_mirna_to_gene_tarbase(input_dict):
 
 
 def segmine_mirna_to_gene_targetscan(input_dict):
-    import cPickle
-    from os.path import normpath, join, dirname
+    import reference_data
 
     mirna_ranks = input_dict['mirna_ranks']
-    mirna2gene = cPickle.load(open(normpath(join(dirname(__file__), 'data/mirna2gene_targetscan')),'rb'))
+    mirna2gene = reference_data.get('mirna2gene_targetscan')
 
     result = {}
     unknown = 0
@@ -296,226 +311,18 @@ def segmine_mirna_to_gene_targetscan(input_dict):
 #end
 
 
-def __makeExampleTable(namesDict, data):
-    import orange
-    from constants import CLASS_ATRR_NAME, CONTROL_GROUP_KEY, DATA_GROUP_KEY
-
-    geneIDs = sorted(data.keys())
-    attrList = [orange.FloatVariable(name=str(geneID)) for geneID in geneIDs]
-    classAttr = orange.EnumVariable(name=CLASS_ATRR_NAME, values = [CONTROL_GROUP_KEY, DATA_GROUP_KEY])
-    domain = orange.Domain(attrList, classAttr)
-    table = orange.ExampleTable(domain)
-
-    # first half: group 1
-    for attrName in namesDict[CONTROL_GROUP_KEY].keys():
-        exampleValues = [data[geneID][CONTROL_GROUP_KEY][attrName] for geneID in geneIDs] + [CONTROL_GROUP_KEY]
-        example = orange.Example(domain, exampleValues)
-        table.append(example)
-
-    # second half: group 2
-    for attrName in namesDict[DATA_GROUP_KEY].keys():
-        exampleValues = [data[geneID][DATA_GROUP_KEY][attrName] for geneID in geneIDs] + [DATA_GROUP_KEY]
-        example = orange.Example(domain, exampleValues)
-        table.append(example)
-
-    return table
-#end
-
-
 def segmine_read_microarray_data(input_dict):
-    from numpy import mean
-    import math
-    from constants import CLASS_ATRR_NAME, CONTROL_GROUP_KEY, DATA_GROUP_KEY, DEFAULT_CONTROL_GROUP_ID
+    import microarray
 
-    data = open(input_dict['file']).read()
     dataFormat = 'linear' if int(input_dict['idf']) == 1 else 'log2'
     calcMethod = 'ratio' if int(input_dict['cm']) == 1 else 'difference'
 
-    lines = [x.replace(',', ' ').split() for x in data.splitlines()]
-    names = lines[0][1:] # skip name of gene column
-
-    # find the prefix of the data channel (the first group prefix is fixed in advance)
-    pfs = set()
-    for name in names:
-        pfs.add(name[0])
-    if len(pfs) != 2:
-        raise ValueError('Invalid data header: more than two prefixes found: %s' % str(list(pfs)))
-
-    # if the data do not obey the default rule, the first character of the first column
-    # is the identifier of the first group
-    if DEFAULT_CONTROL_GROUP_ID not in pfs:
-        CONTROL_GROUP_ID = names[0][0]
-    else:
-        CONTROL_GROUP_ID = DEFAULT_CONTROL_GROUP_ID
-
-    pfs.remove(CONTROL_GROUP_ID)
-    DATA_GROUP_ID = list(pfs)[0]
-
-    # collect positions of column names for both groups
-    firstGroupNames = []
-    secondGroupNames = []
-    for name in names:
-        if name.startswith(CONTROL_GROUP_ID):
-            firstGroupNames.append(name)
-        elif name.startswith(DATA_GROUP_ID):
-            secondGroupNames.append(name)
-    #end
-
-    controlGroupNames = firstGroupNames
-    dataGroupNames = secondGroupNames
-
-    # collect positions of column names for both groups
-    controlGroupNames = dict.fromkeys(controlGroupNames)
-    dataGroupNames = dict.fromkeys(dataGroupNames)
-    for name in controlGroupNames:
-        controlGroupNames[name] = names.index(name)
-    for name in dataGroupNames:
-        dataGroupNames[name] = names.index(name)
-
-
-    # parse and store the actual data
-
-    # read values
-    data = {}
-    ndup = 0
-    ln = 0
-    #refresh = (len(self.lines)-1) / 10
-    #self.progressBar = ProgressBar(self, iterations=25)
-    for elts in lines[1:]:
-        ln += 1
-        #if ln%refresh == 0:
-            #self.progressBar.advance()
-
-        if len(elts) != len(names)+1: # EntrezID is the first value
-            raise ValueError('Wrong number of values, line: %d' % ln)
-        try:
-            geneID = str(elts[0])
-            vals = [float(x) for x in elts[1:]]
-        except Exception, e:
-            raise ValueError('Error while reading values, line: %d' % ln)
-        else:
-            if data.has_key(geneID):
-                ndup += 1
-            else:
-                # init storage
-                data[geneID] = {}
-                data[geneID][CONTROL_GROUP_KEY] = {}
-                data[geneID][DATA_GROUP_KEY] = {}
-
-                for atrName in controlGroupNames.keys():
-                    data[geneID][CONTROL_GROUP_KEY][atrName] = []
-
-                for atrName in dataGroupNames.keys():
-                    data[geneID][DATA_GROUP_KEY][atrName] = []
-
-            # get values for first group of columns
-            for (name, index) in controlGroupNames.items():
-                data[geneID][CONTROL_GROUP_KEY][name].append(vals[index])
-
-            # get values for second group of columns
-            for (name, index) in dataGroupNames.items():
-                data[geneID][DATA_GROUP_KEY][name].append(vals[index])
-            #end else
-    #endfor
-
-
-    ## merge duplicates by averaging
-    for geneID in data.keys():
-        for atrName in data[geneID][CONTROL_GROUP_KEY].keys():
-            values = data[geneID][CONTROL_GROUP_KEY][atrName]
-            data[geneID][CONTROL_GROUP_KEY][atrName] = sum(values) / float(len(values))
-
-        for atrName in data[geneID][DATA_GROUP_KEY].keys():
-            values = data[geneID][DATA_GROUP_KEY][atrName]
-            data[geneID][DATA_GROUP_KEY][atrName] = sum(values) / float(len(values))
-
-
-
-    ## merge duplicates by averaging
-    #if self.ui.meanRadioButton.isChecked():
-        #for geneID in data.keys():
-            #for atrName in data[geneID][CONTROL_GROUP_KEY].keys():
-                #values = data[geneID][CONTROL_GROUP_KEY][atrName]
-                #data[geneID][CONTROL_GROUP_KEY][atrName] = sum(values) / float(len(values))
-
-            #for atrName in data[geneID][DATA_GROUP_KEY].keys():
-                #values = data[geneID][DATA_GROUP_KEY][atrName]
-                #data[geneID][DATA_GROUP_KEY][atrName] = sum(values) / float(len(values))
-
-    ## merge duplicates by median
-    #elif self.ui.medianRadioButton.isChecked():
-        #for geneID in data.keys():
-            #for atrName in data[geneID][CONTROL_GROUP_KEY].keys():
-                #values = data[geneID][CONTROL_GROUP_KEY][atrName]
-                #data[geneID][CONTROL_GROUP_KEY][atrName] = median(values)
-
-            #for atrName in data[geneID][DATA_GROUP_KEY].keys():
-                #values = data[geneID][DATA_GROUP_KEY][atrName]
-                #data[geneID][DATA_GROUP_KEY][atrName] = median(values)
-
-    ## take one duplicate at random
-    #elif self.ui.randomRadioButton.isChecked():
-        #for geneID in data.keys():
-            #for atrName in data[geneID][CONTROL_GROUP_KEY].keys():
-                #values = data[geneID][CONTROL_GROUP_KEY][atrName]
-                #data[geneID][CONTROL_GROUP_KEY][atrName] = choice(values)
-
-            #for atrName in data[geneID][DATA_GROUP_KEY].keys():
-                #values = data[geneID][DATA_GROUP_KEY][atrName]
-                #data[geneID][DATA_GROUP_KEY][atrName] = choice(values)
-    ##end
-
-    namesDict = {CONTROL_GROUP_KEY: controlGroupNames, DATA_GROUP_KEY: dataGroupNames}
-    table = __makeExampleTable(namesDict, data)
-
-    logFCs = {}
-    if calcMethod == 'ratio':
-        if dataFormat == 'log2':  # log2 data have to be transformed for ratio computation
-            for geneID in data.keys():
-                for attrName in namesDict[CONTROL_GROUP_KEY]:
-                    data[geneID][CONTROL_GROUP_KEY][attrName] = math.pow(2, data[geneID][CONTROL_GROUP_KEY][attrName])
-                for attrName in namesDict[DATA_GROUP_KEY]:
-                    data[geneID][DATA_GROUP_KEY][attrName] = math.pow(2, data[geneID][DATA_GROUP_KEY][attrName])
-
-        for geneID in data.keys():
-            control_array = [data[geneID][CONTROL_GROUP_KEY][attrName] for attrName in namesDict[CONTROL_GROUP_KEY]]
-            data_array = [data[geneID][DATA_GROUP_KEY][attrName] for attrName in namesDict[DATA_GROUP_KEY]]
-
-            numerator = mean(data_array)
-            denumerator = mean(control_array)
-
-            if numerator < 0 or denumerator < 0:
-                print 'Invalid values, gene %s' % str(geneID)
-                continue
-
-            logFCs[geneID] = numerator / denumerator
-            # for those less than 1 invert and give negative sign
-            if logFCs[geneID] < 1:
-                logFCs[geneID] = -1.0 / logFCs[geneID]
-    else:
-        # difference
-        if dataFormat == 'linear':  # linear data have to be transformed for log2 difference computation
-            for geneID in data.keys():
-                for attrName in namesDict[CONTROL_GROUP_KEY]:
-                    if data[geneID][CONTROL_GROUP_KEY][attrName] <= 0:
-                        raise ValueError('Cannot transform linear data to log2: value is <= 0 for gene %s' % str(geneID))
-                    else:
-                        data[geneID][CONTROL_GROUP_KEY][attrName] = math.log(data[geneID][CONTROL_GROUP_KEY][attrName], 2)
-                for attrName in namesDict[DATA_GROUP_KEY]:
-                    if data[geneID][DATA_GROUP_KEY][attrName] <= 0:
-                        raise ValueError('Cannot transform linear data to log2: value is <= 0 for gene %s' % str(geneID))
-                    else:
-                        data[geneID][DATA_GROUP_KEY][attrName] = math.log(data[geneID][DATA_GROUP_KEY][attrName], 2)
-
-        for geneID in data.keys():
-            control_array = [data[geneID][CONTROL_GROUP_KEY][attrName] for attrName in namesDict[CONTROL_GROUP_KEY]]
-            data_array = [data[geneID][DATA_GROUP_KEY][attrName] for attrName in namesDict[DATA_GROUP_KEY]]
-            logFCs[geneID] = mean(data_array) - mean(control_array)
-    #end
+    with open(input_dict['file'], 'rU') as fp:
+        data = microarray.read_microarray(fp)
+    table = microarray.make_example_table(data)
+    logFCs = microarray.log_fold_changes(data, dataFormat, calcMethod)
 
-    # print dataGroupNames
-    # print controlGroupNames
-    sortedLogFCs = [(elt[1], elt[0]) for elt in sorted([(logFCs[geneID], geneID) for geneID in logFCs.keys()], reverse=True)] #data.keys()], reverse=True)]
+    sortedLogFCs = [(elt[1], elt[0]) for elt in sorted([(logFCs[geneID], geneID) for geneID in logFCs.keys()], reverse=True)]
 
     return {'table': table, 'fold_change': sortedLogFCs}
 #end
@@ -674,11 +481,10 @@ def segmine_rules_as_table(input_dict):
 
 
 def filter_unknown_genes_stu(input_dict):
-    import cPickle
-    from os.path import normpath, join, dirname
+    import reference_data
 
     ranks = input_dict['gene_ranks']
-    genes = cPickle.load(open(normpath(join(dirname(__file__), 'data/genes_stu.pickle')), 'rb'))
+    genes = reference_data.get('genes_stu')
 
     result = []
     unknown = 0
@@ -696,11 +502,10 @@ def filter_unknown_genes_stu(input_dict):
 
 
 def filter_unknown_genes_ath(input_dict):
-    import cPickle
-    from os.path import normpath, join, dirname
+    import reference_data
 
     ranks = input_dict['gene_ranks']
-    genes = cPickle.load(open(normpath(join(dirname(__file__), 'data/genes_ath.pickle')), 'rb'))
+    genes = reference_data.get('genes_ath')
 
     result = []
     unknown = 0
@@ -763,11 +568,10 @@ def segmine_cutoff(input_dict):
 
 
 def resolve_gene_names_STU(input_dict):
-    import cPickle
-    from os.path import normpath, join, dirname
+    import reference_data
 
     ranks = input_dict['gene_ranks']
-    mapping = cPickle.load(open(normpath(join(dirname(__file__), 'data/probe2rep_STU.pickle')), 'rb'))
+    mapping = reference_data.get('probe2rep_stu')
 
     result = []
     unknown = 0
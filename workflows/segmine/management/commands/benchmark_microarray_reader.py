@@ -0,0 +1,136 @@
+import os
+import time
+import random
+import hashlib
+import cPickle
+import resource
+import tempfile
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+
+def _legacy(fname, idf, cm):
+    from workflows.segmine import microarray
+    return microarray.legacy_read_microarray_data({'file': fname, 'idf': idf, 'cm': cm})
+
+def _streaming(fname, idf, cm):
+    from workflows.segmine.library import segmine_read_microarray_data
+    return segmine_read_microarray_data({'file': fname, 'idf': idf, 'cm': cm})
+
+
+def _measure(reader, fname, idf, cm):
+    '''
+    Runs the reader in a forked process and returns the time, the peak RSS
+    of the process before and after reading (in kB) and a digest of the
+    results.
+    '''
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        try:
+            before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            start = time.time()
+            result = reader(fname, idf, cm)
+            elapsed = time.time() - start
+            after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            digest = hashlib.md5(repr(result['fold_change']))
+            for example in result['table']:
+                digest.update(repr([float(value) for value in example]))
+            report = (elapsed, before, after, digest.hexdigest())
+        except Exception, e:
+            report = e
+        with os.fdopen(w, 'wb') as fp:
+            cPickle.dump(report, fp, cPickle.HIGHEST_PROTOCOL)
+        os._exit(0)
+    os.close(w)
+    with os.fdopen(r, 'rb') as fp:
+        report = cPickle.load(fp)
+    os.waitpid(pid, 0)
+    if isinstance(report, Exception):
+        raise report
+    return report
+
+
+class Command(BaseCommand):
+    help = 'Compares the time and the peak memory of reading a microarray data file with the streaming reader ' \
+           'and with the previous implementation of segmine_read_microarray_data.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('-f', '--file',
+            dest='file',
+            default=None,
+            help='Read this microarray data file instead of a generated one.'
+        ),
+        make_option('-g', '--genes',
+            dest='genes',
+            type='int',
+            default=50000,
+            help='Number of lines of the generated file.'
+        ),
+        make_option('-c', '--columns',
+            dest='columns',
+            type='int',
+            default=8,
+            help='Number of columns of each group of the generated file.'
+        ),
+        make_option('-d', '--duplicates',
+            dest='duplicates',
+            type='float',
+            default=1.2,
+            help='Average number of lines of a gene in the generated file.'
+        ),
+        make_option('-s', '--seed',
+            dest='seed',
+            type='int',
+            default=0,
+            help='Seed of the generated values.'
+        ),
+        make_option('--idf',
+            dest='idf',
+            type='int',
+            default=1,
+            help='Input data format (1: linear, 2: log2).'
+        ),
+        make_option('--cm',
+            dest='cm',
+            type='int',
+            default=1,
+            help='Fold change calculation method (1: ratio, 2: difference).'
+        ),
+    )
+
+    def generate(self, fname, options):
+        rnd = random.Random(options['seed'])
+        genes = max(1, int(options['genes'] / options['duplicates']))
+        names = ['1ctrl%d' % i for i in range(options['columns'])] + ['2data%d' % i for i in range(options['columns'])]
+        with open(fname, 'w') as fp:
+            fp.write('\t'.join(['gene'] + names) + '\n')
+            for i in range(options['genes']):
+                values = ['%.4f' % rnd.uniform(0.01, 1000.0) for name in names]
+                fp.write('\t'.join(['g%d' % rnd.randrange(genes)] + values) + '\n')
+
+    def handle(self, *args, **options):
+        fname = options['file']
+        generated = fname is None
+        if generated:
+            fd, fname = tempfile.mkstemp(suffix='.txt')
+            os.close(fd)
+            self.generate(fname, options)
+        try:
+            self.stdout.write('%s: %.1f MB\n' % (fname, os.path.getsize(fname) / 1048576.0))
+            results = {}
+            for (name, reader) in [('legacy', _legacy), ('streaming', _streaming)]:
+                elapsed, before, after, digest = _measure(reader, fname, options['idf'], options['cm'])
+                results[name] = (elapsed, after, digest)
+                self.stdout.write('%-10s %8.3f s  peak RSS %8.1f MB (+%.1f MB)\n' % (
+                    name, elapsed, after / 1024.0, (after - before) / 1024.0))
+                self.stdout.flush()
+            self.stdout.write('%.2fx faster, %.2fx less peak RSS, %s\n' % (
+                results['legacy'][0] / results['streaming'][0],
+                float(results['legacy'][1]) / results['streaming'][1],
+                'same results' if results['legacy'][2] == results['streaming'][2] else 'DIFFERENT RESULTS'))
+        finally:
+            if generated:
+                os.remove(fname)
@@ -0,0 +1,451 @@
+'''
+Streaming reader of microarray data files.
+
+A file has a header line with the name of the gene column and the names of
+the sample columns (the first character of a name is the group of the
+sample) and a line per gene (or probe) with its values, separated by
+spaces or commas. read_microarray parses the file in chunks of lines into
+a NumPy matrix of sums and counts (genes x columns), so the values of
+duplicated genes are averaged without keeping the lines or nested lists
+of values in memory. The Orange table is then built from the matrix in
+one step.
+
+The results are the same as those of the previous implementation
+(legacy_read_microarray_data): the columns and genes are visited in the
+order of the same dictionaries and the sums are accumulated in the order
+of the lines.
+'''
+import math
+
+import numpy
+
+from constants import CLASS_ATRR_NAME, CONTROL_GROUP_KEY, DATA_GROUP_KEY, DEFAULT_CONTROL_GROUP_ID
+
+CHUNK_LINES = 10000
+
+
+def _group_columns(names):
+    '''
+    Returns the dictionaries of the columns (name -> index) of the control
+    and the data group, built in the same way as before, so that they are
+    iterated in the same order.
+    '''
+    # find the prefix of the data channel (the first group prefix is fixed in advance)
+    pfs = set()
+    for name in names:
+        pfs.add(name[0])
+    if len(pfs) != 2:
+        raise ValueError('Invalid data header: more than two prefixes found: %s' % str(list(pfs)))
+
+    # if the data do not obey the default rule, the first character of the first column
+    # is the identifier of the first group
+    if DEFAULT_CONTROL_GROUP_ID not in pfs:
+        CONTROL_GROUP_ID = names[0][0]
+    else:
+        CONTROL_GROUP_ID = DEFAULT_CONTROL_GROUP_ID
+
+    pfs.remove(CONTROL_GROUP_ID)
+    DATA_GROUP_ID = list(pfs)[0]
+
+    controlGroupNames = dict.fromkeys([name for name in names if name.startswith(CONTROL_GROUP_ID)])
+    dataGroupNames = dict.fromkeys([name for name in names if not name.startswith(CONTROL_GROUP_ID)
+                                    and name.startswith(DATA_GROUP_ID)])
+    # the first column of each name
+    index = {}
+    for (i, name) in enumerate(names):
+        index.setdefault(name, i)
+    for name in controlGroupNames:
+        controlGroupNames[name] = index[name]
+    for name in dataGroupNames:
+        dataGroupNames[name] = index[name]
+    return controlGroupNames, dataGroupNames
+#end
+
+
+def _check_values(rows, firstLine):
+    for (i, values) in enumerate(rows):
+        try:
+            [float(x) for x in values]
+        except Exception:
+            raise ValueError('Error while reading values, line: %d' % (firstLine + i))
+#end
+
+
+class MicroarrayData(object):
+    '''
+    The averaged values of a microarray data file: values[genes[geneID], i]
+    is the value of the gene in the i-th column (names[i]). genes has the
+    genes in the order of their first line.
+    '''
+    def __init__(self, names, genes, values):
+        self.names = names
+        self.genes = genes
+        self.values = values
+        self.controlGroupNames, self.dataGroupNames = _group_columns(names)
+    #end
+
+    def group_values(self, group):
+        ''' a genes x columns matrix of the columns of the group, in the
+        order of the group dictionary '''
+        columns = self.controlGroupNames if group == CONTROL_GROUP_KEY else self.dataGroupNames
+        return numpy.ascontiguousarray(self.values[:, [columns[name] for name in columns]])
+    #end
+#end class
+
+
+def read_microarray(fp, chunkLines=CHUNK_LINES):
+    ''' reads the microarray data from the lines of the file object fp, chunkLines lines at a time '''
+    header = fp.readline().replace(',', ' ').split()
+    names = header[1:] # skip name of gene column
+    _group_columns(names)
+    ncols = len(names)
+
+    genes = {}
+    capacity = 1024
+    sums = numpy.zeros((capacity, ncols))
+    counts = numpy.zeros(capacity)
+    ln = 0
+    while True:
+        ids = []
+        rows = []
+        for line in fp:
+            elts = line.replace(',', ' ').split()
+            if len(elts) != ncols + 1: # EntrezID is the first value
+                _check_values(rows, ln + 1)
+                raise ValueError('Wrong number of values, line: %d' % (ln + len(rows) + 1))
+            ids.append(elts[0])
+            rows.append(elts[1:])
+            if len(rows) == chunkLines:
+                break
+        if not rows:
+            break
+        try:
+            values = numpy.array(rows, dtype=float).reshape((len(rows), ncols))
+        except ValueError:
+            _check_values(rows, ln + 1)
+            raise
+        del rows
+
+        # the row of every line, and how many lines of the chunk before it
+        # have the same gene
+        lineRows = numpy.empty(len(ids), dtype=int)
+        occurrence = numpy.empty(len(ids), dtype=int)
+        seen = {}
+        for (i, geneID) in enumerate(ids):
+            row = genes.get(geneID)
+            if row is None:
+                row = genes[geneID] = len(genes)
+            lineRows[i] = row
+            occurrence[i] = seen.get(row, 0)
+            seen[row] = occurrence[i] + 1
+        if len(genes) > capacity:
+            while len(genes) > capacity:
+                capacity *= 2
+            sums = numpy.vstack([sums, numpy.zeros((capacity - len(sums), ncols))])
+            counts = numpy.concatenate([counts, numpy.zeros(capacity - len(counts))])
+
+        # add the lines of a gene in their order, so the sums are the same as
+        # sum() of its values
+        for k in range(int(occurrence.max()) + 1):
+            selected = occurrence == k
+            sums[lineRows[selected]] += values[selected]
+            counts[lineRows[selected]] += 1
+        ln += len(ids)
+    #end
+
+    ## merge duplicates by averaging
+    n = len(genes)
+    values = sums[:n] / counts[:n, numpy.newaxis]
+    return MicroarrayData(names, genes, values)
+#end
+
+
+def make_example_table(microarray):
+    ''' builds the Orange table (an example per column, an attribute per
+    gene) in one step '''
+    import orange
+
+    geneIDs = sorted(microarray.genes.keys())
+    attrList = [orange.FloatVariable(name=str(geneID)) for geneID in geneIDs]
+    classAttr = orange.EnumVariable(name=CLASS_ATRR_NAME, values = [CONTROL_GROUP_KEY, DATA_GROUP_KEY])
+    domain = orange.Domain(attrList, classAttr)
+
+    rows = numpy.array([microarray.genes[geneID] for geneID in geneIDs], dtype=int)
+    control = microarray.group_values(CONTROL_GROUP_KEY)[rows].T
+    data = microarray.group_values(DATA_GROUP_KEY)[rows].T
+    classes = numpy.concatenate([numpy.zeros(len(control)), numpy.ones(len(data))])
+    matrix = numpy.hstack([numpy.vstack([control, data]), classes[:, numpy.newaxis]])
+    return orange.ExampleTable(domain, matrix)
+#end
+
+
+def log_fold_changes(microarray, dataFormat, calcMethod):
+    ''' the fold changes of the genes by geneID, inserted in the order of the genes '''
+    control = microarray.group_values(CONTROL_GROUP_KEY)
+    data = microarray.group_values(DATA_GROUP_KEY)
+    geneIDs = microarray.genes.keys()
+    rows = [microarray.genes[geneID] for geneID in geneIDs]
+
+    logFCs = {}
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        if calcMethod == 'ratio':
+            if dataFormat == 'log2':  # log2 data have to be transformed for ratio computation
+                control = numpy.power(2.0, control)
+                data = numpy.power(2.0, data)
+
+            numerator = data.mean(axis=1)
+            denumerator = control.mean(axis=1)
+            ratios = numerator / denumerator
+            # for those less than 1 invert and give negative sign
+            ratios = numpy.where(ratios < 1, -1.0 / ratios, ratios)
+            invalid = (numerator < 0) | (denumerator < 0)
+            for (geneID, row) in zip(geneIDs, rows):
+                if invalid[row]:
+                    print 'Invalid values, gene %s' % str(geneID)
+                    continue
+                logFCs[geneID] = ratios[row]
+        else:
+            # difference
+            if dataFormat == 'linear':  # linear data have to be transformed for log2 difference computation
+                invalid = (control <= 0).any(axis=1) | (data <= 0).any(axis=1)
+                for (geneID, row) in zip(geneIDs, rows):
+                    if invalid[row]:
+                        raise ValueError('Cannot transform linear data to log2: value is <= 0 for gene %s' % str(geneID))
+                control = numpy.log(control) / math.log(2)
+                data = numpy.log(data) / math.log(2)
+
+            differences = data.mean(axis=1) - control.mean(axis=1)
+            for (geneID, row) in zip(geneIDs, rows):
+                logFCs[geneID] = differences[row]
+    return logFCs
+#end
+
+
+def legacy_example_table(namesDict, data):
+    import orange
+    from constants import CLASS_ATRR_NAME, CONTROL_GROUP_KEY, DATA_GROUP_KEY
+
+    geneIDs = sorted(data.keys())
+    attrList = [orange.FloatVariable(name=str(geneID)) for geneID in geneIDs]
+    classAttr = orange.EnumVariable(name=CLASS_ATRR_NAME, values = [CONTROL_GROUP_KEY, DATA_GROUP_KEY])
+    domain = orange.Domain(attrList, classAttr)
+    table = orange.ExampleTable(domain)
+
+    # first half: group 1
+    for attrName in namesDict[CONTROL_GROUP_KEY].keys():
+        exampleValues = [data[geneID][CONTROL_GROUP_KEY][attrName] for geneID in geneIDs] + [CONTROL_GROUP_KEY]
+        example = orange.Example(domain, exampleValues)
+        table.append(example)
+
+    # second half: group 2
+    for attrName in namesDict[DATA_GROUP_KEY].keys():
+        exampleValues = [data[geneID][DATA_GROUP_KEY][attrName] for geneID in geneIDs] + [DATA_GROUP_KEY]
+        example = orange.Example(domain, exampleValues)
+        table.append(example)
+
+    return table
+#end
+
+
+def legacy_read_microarray_data(input_dict):
+    '''
+    The previous implementation of segmine_read_microarray_data, which
+    reads the whole file and keeps the values in nested dictionaries. It is
+    kept as the reference for the tests and the benchmark.
+    '''
+    from numpy import mean
+    import math
+    from constants import CLASS_ATRR_NAME, CONTROL_GROUP_KEY, DATA_GROUP_KEY, DEFAULT_CONTROL_GROUP_ID
+
+    data = open(input_dict['file']).read()
+    dataFormat = 'linear' if int(input_dict['idf']) == 1 else 'log2'
+    calcMethod = 'ratio' if int(input_dict['cm']) == 1 else 'difference'
+
+    lines = [x.replace(',', ' ').split() for x in data.splitlines()]
+    names = lines[0][1:] # skip name of gene column
+
+    # find the prefix of the data channel (the first group prefix is fixed in advance)
+    pfs = set()
+    for name in names:
+        pfs.add(name[0])
+    if len(pfs) != 2:
+        raise ValueError('Invalid data header: more than two prefixes found: %s' % str(list(pfs)))
+
+    # if the data do not obey the default rule, the first character of the first column
+    # is the identifier of the first group
+    if DEFAULT_CONTROL_GROUP_ID not in pfs:
+        CONTROL_GROUP_ID = names[0][0]
+    else:
+        CONTROL_GROUP_ID = DEFAULT_CONTROL_GROUP_ID
+
+    pfs.remove(CONTROL_GROUP_ID)
+    DATA_GROUP_ID = list(pfs)[0]
+
+    # collect positions of column names for both groups
+    firstGroupNames = []
+    secondGroupNames = []
+    for name in names:
+        if name.startswith(CONTROL_GROUP_ID):
+            firstGroupNames.append(name)
+        elif name.startswith(DATA_GROUP_ID):
+            secondGroupNames.append(name)
+    #end
+
+    controlGroupNames = firstGroupNames
+    dataGroupNames = secondGroupNames
+
+    # collect positions of column names for both groups
+    controlGroupNames = dict.fromkeys(controlGroupNames)
+    dataGroupNames = dict.fromkeys(dataGroupNames)
+    for name in controlGroupNames:
+        controlGroupNames[name] = names.index(name)
+    for name in dataGroupNames:
+        dataGroupNames[name] = names.index(name)
+
+
+    # parse and store the actual data
+
+    # read values
+    data = {}
+    ndup = 0
+    ln = 0
+    #refresh = (len(self.lines)-1) / 10
+    #self.progressBar = ProgressBar(self, iterations=25)
+    for elts in lines[1:]:
+        ln += 1
+        #if ln%refresh == 0:
+            #self.progressBar.advance()
+
+        if len(elts) != len(names)+1: # EntrezID is the first value
+            raise ValueError('Wrong number of values, line: %d' % ln)
+        try:
+            geneID = str(elts[0])
+            vals = [float(x) for x in elts[1:]]
+        except Exception, e:
+            raise ValueError('Error while reading values, line: %d' % ln)
+        else:
+            if data.has_key(geneID):
+                ndup += 1
+            else:
+                # init storage
+                data[geneID] = {}
+                data[geneID][CONTROL_GROUP_KEY] = {}
+                data[geneID][DATA_GROUP_KEY] = {}
+
+                for atrName in controlGroupNames.keys():
+                    data[geneID][CONTROL_GROUP_KEY][atrName] = []
+
+                for atrName in dataGroupNames.keys():
+                    data[geneID][DATA_GROUP_KEY][atrName] = []
+
+            # get values for first group of columns
+            for (name, index) in controlGroupNames.items():
+                data[geneID][CONTROL_GROUP_KEY][name].append(vals[index])
+
+            # get values for second group of columns
+            for (name, index) in dataGroupNames.items():
+                data[geneID][DATA_GROUP_KEY][name].append(vals[index])
+            #end else
+    #endfor
+
+
+    ## merge duplicates by averaging
+    for geneID in data.keys():
+        for atrName in data[geneID][CONTROL_GROUP_KEY].keys():
+            values = data[geneID][CONTROL_GROUP_KEY][atrName]
+            data[geneID][CONTROL_GROUP_KEY][atrName] = sum(values) / float(len(values))
+
+        for atrName in data[geneID][DATA_GROUP_KEY].keys():
+            values = data[geneID][DATA_GROUP_KEY][atrName]
+            data[geneID][DATA_GROUP_KEY][atrName] = sum(values) / float(len(values))
+
+
+
+    ## merge duplicates by averaging
+    #if self.ui.meanRadioButton.isChecked():
+        #for geneID in data.keys():
+            #for atrName in data[geneID][CONTROL_GROUP_KEY].keys():
+                #values = data[geneID][CONTROL_GROUP_KEY][atrName]
+                #data[geneID][CONTROL_GROUP_KEY][atrName] = sum(values) / float(len(values))
+
+            #for atrName in data[geneID][DATA_GROUP_KEY].keys():
+                #values = data[geneID][DATA_GROUP_KEY][atrName]
+                #data[geneID][DATA_GROUP_KEY][atrName] = sum(values) / float(len(values))
+
+    ## merge duplicates by median
+    #elif self.ui.medianRadioButton.isChecked():
+        #for geneID in data.keys():
+            #for atrName in data[geneID][CONTROL_GROUP_KEY].keys():
+                #values = data[geneID][CONTROL_GROUP_KEY][atrName]
+                #data[geneID][CONTROL_GROUP_KEY][atrName] = median(values)
+
+            #for atrName in data[geneID][DATA_GROUP_KEY].keys():
+                #values = data[geneID][DATA_GROUP_KEY][atrName]
+                #data[geneID][DATA_GROUP_KEY][atrName] = median(values)
+
+    ## take one duplicate at random
+    #elif self.ui.randomRadioButton.isChecked():
+        #for geneID in data.keys():
+            #for atrName in data[geneID][CONTROL_GROUP_KEY].keys():
+                #values = data[geneID][CONTROL_GROUP_KEY][atrName]
+                #data[geneID][CONTROL_GROUP_KEY][atrName] = choice(values)
+
+            #for atrName in data[geneID][DATA_GROUP_KEY].keys():
+                #values = data[geneID][DATA_GROUP_KEY][atrName]
+                #data[geneID][DATA_GROUP_KEY][atrName] = choice(values)
+    ##end
+
+    namesDict = {CONTROL_GROUP_KEY: controlGroupNames, DATA_GROUP_KEY: dataGroupNames}
+    table = legacy_example_table(namesDict, data)
+
+    logFCs = {}
+    if calcMethod == 'ratio':
+        if dataFormat == 'log2':  # log2 data have to be transformed for ratio computation
+            for geneID in data.keys():
+                for attrName in namesDict[CONTROL_GROUP_KEY]:
+                    data[geneID][CONTROL_GROUP_KEY][attrName] = math.pow(2, data[geneID][CONTROL_GROUP_KEY][attrName])
+                for attrName in namesDict[DATA_GROUP_KEY]:
+                    data[geneID][DATA_GROUP_KEY][attrName] = math.pow(2, data[geneID][DATA_GROUP_KEY][attrName])
+
+        for geneID in data.keys():
+            control_array = [data[geneID][CONTROL_GROUP_KEY][attrName] for attrName in namesDict[CONTROL_GROUP_KEY]]
+            data_array = [data[geneID][DATA_GROUP_KEY][attrName] for attrName in namesDict[DATA_GROUP_KEY]]
+
+            numerator = mean(data_array)
+            denumerator = mean(control_array)
+
+            if numerator < 0 or denumerator < 0:
+                print 'Invalid values, gene %s' % str(geneID)
+                continue
+
+            logFCs[geneID] = numerator / denumerator
+            # for those less than 1 invert and give negative sign
+            if logFCs[geneID] < 1:
+                logFCs[geneID] = -1.0 / logFCs[geneID]
+    else:
+        # difference
+        if dataFormat == 'linear':  # linear data have to be transformed for log2 difference computation
+            for geneID in data.keys():
+                for attrName in namesDict[CONTROL_GROUP_KEY]:
+                    if data[geneID][CONTROL_GROUP_KEY][attrName] <= 0:
+                        raise ValueError('Cannot transform linear data to log2: value is <= 0 for gene %s' % str(geneID))
+                    else:
+                        data[geneID][CONTROL_GROUP_KEY][attrName] = math.log(data[geneID][CONTROL_GROUP_KEY][attrName], 2)
+                for attrName in namesDict[DATA_GROUP_KEY]:
+                    if data[geneID][DATA_GROUP_KEY][attrName] <= 0:
+                        raise ValueError('Cannot transform linear data to log2: value is <= 0 for gene %s' % str(geneID))
+                    else:
+                        data[geneID][DATA_GROUP_KEY][attrName] = math.log(data[geneID][DATA_GROUP_KEY][attrName], 2)
+
+        for geneID in data.keys():
+            control_array = [data[geneID][CONTROL_GROUP_KEY][attrName] for attrName in namesDict[CONTROL_GROUP_KEY]]
+            data_array = [data[geneID][DATA_GROUP_KEY][attrName] for attrName in namesDict[DATA_GROUP_KEY]]
+            logFCs[geneID] = mean(data_array) - mean(control_array)
+    #end
+
+    # print dataGroupNames
+    # print controlGroupNames
+    sortedLogFCs = [(elt[1], elt[0]) for elt in sorted([(logFCs[geneID], geneID) for geneID in logFCs.keys()], reverse=True)] #data.keys()], reverse=True)]
+
+    return {'table': table, 'fold_change': sortedLogFCs}
+#end
@@ -0,0 +1,214 @@
+'''
+Reference data (gene, probe and miRNA mappings) of the segmine widgets.
+
+Every mapping is loaded once per process by get(name). With the 'memory'
+backend (SEGMINE_REFERENCE_DATA_BACKEND) its pickle is loaded into a dict.
+With the 'mmap' backend it is converted once into a hash table file in
+SEGMINE_REFERENCE_DATA_DIR, which every process maps into memory: the pages
+are shared by all workers and a lookup only decodes the value it finds.
+
+warm_up() loads all mappings; it is run when a worker process starts (see
+WORKER_WARM_UP).
+'''
+import os
+import mmap
+import zlib
+import struct
+import logging
+import tempfile
+import threading
+import cPickle
+from os.path import normpath, join, dirname, getmtime, exists
+
+from django.conf import settings
+
+from workflows.forking import after_fork
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = normpath(join(dirname(__file__), 'data'))
+
+
+class PickleSource(object):
+    ''' a mapping pickled in a file of the data directory '''
+    def __init__(self, fname):
+        self.path = join(DATA_DIR, fname)
+
+    def load(self):
+        with open(self.path, 'rb') as fp:
+            return cPickle.load(fp)
+
+
+class ModuleSource(object):
+    ''' a mapping that is an attribute of a module '''
+    def __init__(self, module, attribute):
+        self.module = module
+        self.attribute = attribute
+
+    @property
+    def path(self):
+        module = __import__(self.module, fromlist=[self.attribute])
+        return module.__file__
+
+    def load(self):
+        module = __import__(self.module, fromlist=[self.attribute])
+        return getattr(module, self.attribute)
+
+
+SOURCES = {
+    'genes_stu': PickleSource('genes_stu.pickle'),
+    'genes_ath': PickleSource('genes_ath.pickle'),
+    'probe2rep_stu': PickleSource('probe2rep_STU.pickle'),
+    'mirna2gene_tarbase': PickleSource('mirna2gene_tarbase'),
+    'mirna2gene_targetscan': PickleSource('mirna2gene_targetscan'),
+    'symbol2entrez': ModuleSource('workflows.segmine.data.mappings', 'symbol2entrez'),
+    'synonyms2entrez': ModuleSource('workflows.segmine.data.mappings', 'synonyms2entrez'),
+}
+
+
+MAGIC = 'CFMAP001'
+HEADER = struct.Struct('<8sQQ')
+SLOT = struct.Struct('<Q')
+RECORD = struct.Struct('<II')
+
+def _key_bytes(key):
+    ''' the bytes of a key; str and unicode keys that are equal have the
+    same bytes, like they have the same hash in a dict '''
+    if isinstance(key, unicode):
+        try:
+            key = key.encode('ascii')
+        except UnicodeEncodeError:
+            return 'u' + key.encode('utf-8')
+    if isinstance(key, str):
+        return 's' + key
+    return 'p' + cPickle.dumps(key, cPickle.HIGHEST_PROTOCOL)
+
+def _slot(key, nslots):
+    return (zlib.crc32(key) & 0xffffffff) & (nslots - 1)
+
+
+def write_mapped(mapping, path):
+    '''
+    Writes the mapping into a hash table file: a header, nslots offsets of
+    records (0 for empty slots, open addressing with linear probing) and
+    the records (lengths of the key and of the value, the key bytes and the
+    pickled value). The file is written under a temporary name and renamed,
+    so readers never see a partial file.
+    '''
+    nslots = 1
+    while nslots < 2*len(mapping):
+        nslots *= 2
+    slots = [0]*nslots
+    records = []
+    offset = HEADER.size + nslots*SLOT.size
+    for key, value in mapping.iteritems():
+        kb = _key_bytes(key)
+        vb = cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+        i = _slot(kb, nslots)
+        while slots[i]:
+            i = (i + 1) & (nslots - 1)
+        slots[i] = offset
+        records.append(RECORD.pack(len(kb), len(vb)) + kb + vb)
+        offset += RECORD.size + len(kb) + len(vb)
+
+    fd, tmp = tempfile.mkstemp(dir=dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(HEADER.pack(MAGIC, nslots, len(mapping)))
+            fp.write(struct.pack('<%dQ' % nslots, *slots))
+            for record in records:
+                fp.write(record)
+        os.rename(tmp, path)
+    except:
+        if exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class MappedDict(object):
+    ''' a read-only dictionary in a hash table file (see write_mapped) '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as fp:
+            self.map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.nslots, self.count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError('%s is not a mapped dictionary' % path)
+
+    def _find(self, key):
+        ''' returns the offset and the length of the pickled value of the
+        key, or None '''
+        kb = _key_bytes(key)
+        i = _slot(kb, self.nslots)
+        while True:
+            offset = SLOT.unpack_from(self.map, HEADER.size + i*SLOT.size)[0]
+            if not offset:
+                return None
+            klen, vlen = RECORD.unpack_from(self.map, offset)
+            start = offset + RECORD.size
+            if klen == len(kb) and self.map[start:start+klen] == kb:
+                return start + klen, vlen
+            i = (i + 1) & (self.nslots - 1)
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __getitem__(self, key):
+        found = self._find(key)
+        if found is None:
+            raise KeyError(key)
+        start, vlen = found
+        return cPickle.loads(self.map[start:start+vlen])
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __len__(self):
+        return self.count
+
+
+_loaded = {}
+_lock = threading.Lock()
+
+@after_fork
+def _reset_lock():
+    global _lock
+    _lock = threading.Lock()
+
+def _load_mapped(name, source):
+    directory = getattr(settings, 'SEGMINE_REFERENCE_DATA_DIR', None) or DATA_DIR
+    path = join(directory, name + '.map')
+    if not exists(path) or getmtime(path) < getmtime(source.path):
+        if not exists(directory):
+            os.makedirs(directory)
+        write_mapped(source.load(), path)
+    return MappedDict(path)
+
+def get(name):
+    ''' returns the mapping, which is loaded once per process '''
+    mapping = _loaded.get(name)
+    if mapping is None:
+        with _lock:
+            mapping = _loaded.get(name)
+            if mapping is None:
+                source = SOURCES[name]
+                if getattr(settings, 'SEGMINE_REFERENCE_DATA_BACKEND', 'memory') == 'mmap':
+                    mapping = _load_mapped(name, source)
+                else:
+                    mapping = source.load()
+                _loaded[name] = mapping
+    return mapping
+
+def warm_up(names=None):
+    ''' loads the mappings (all of them by default); the ones that are not
+    available (their file or module is missing) are skipped '''
+    for name in names or sorted(SOURCES):
+        try:
+            get(name)
+        except (IOError, ImportError), e:
+            logger.warning('The segmine reference data %s is not available: %s', name, e)
+        except Exception:
+            logger.warning('Could not load the segmine reference data %s', name, exc_info=True)
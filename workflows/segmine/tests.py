@@ -0,0 +1,91 @@
+import os
+import random
+import shutil
+import tempfile
+import numpy
+from StringIO import StringIO
+from django.test import SimpleTestCase
+
+from workflows.segmine.library import _t_scores
+from workflows.segmine import microarray
+from workflows.segmine.reference_data import MappedDict, write_mapped
+
+
+class TScoresTest(SimpleTestCase):
+
+    def test_same_as_gene_by_gene(self):
+        from math import sqrt
+        random = numpy.random.RandomState(0)
+        values = random.randn(40, 25)
+        values[:, 0] = 1.5 # no variance
+        control = numpy.ascontiguousarray(values[:15].T)
+        data = numpy.ascontiguousarray(values[15:].T)
+        scores = _t_scores(control, data)
+        for gene in range(1, 25):
+            controlValues = [float(v) for v in control[gene]]
+            dataValues = [float(v) for v in data[gene]]
+            average = numpy.mean(dataValues) - numpy.mean(controlValues)
+            variance = numpy.var(controlValues)/len(controlValues) + \
+                       numpy.var(dataValues)/len(dataValues)
+            self.assertEqual(scores[gene], average/sqrt(variance))
+        self.assertTrue(numpy.isnan(scores[0]))
+
+
+class MappedDictTest(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_lookups(self):
+        mapping = dict(('gene%d' % i, i) for i in range(1000))
+        mapping[u'gen\xe9'] = [1, 2]
+        mapping[42] = None
+        path = os.path.join(self.directory, 'genes.map')
+        write_mapped(mapping, path)
+        mapped = MappedDict(path)
+        self.assertEqual(len(mapped), len(mapping))
+        for key, value in mapping.items():
+            self.assertTrue(key in mapped)
+            self.assertEqual(mapped[key], value)
+        self.assertEqual(mapped[u'gene7'], 7)
+        self.assertFalse('gene1000' in mapped)
+        self.assertEqual(mapped.get('gene1000', -1), -1)
+        self.assertRaises(KeyError, mapped.__getitem__, 'gene1000')
+
+
+class MicroarrayReaderTest(SimpleTestCase):
+
+    def setUp(self):
+        rnd = random.Random(0)
+        lines = ['ID_REF,1a,1b,2a,2b,2c']
+        for i in range(500):
+            lines.append(','.join(['g%d' % rnd.randrange(300)] + ['%.3f' % rnd.uniform(0.1, 50) for j in range(5)]))
+        self.text = '\n'.join(lines) + '\n'
+        fd, self.fname = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(self.text)
+
+    def tearDown(self):
+        os.remove(self.fname)
+
+    def test_same_fold_changes(self):
+        for chunkLines in [1, 7, microarray.CHUNK_LINES]:
+            data = microarray.read_microarray(StringIO(self.text), chunkLines)
+            for (idf, dataFormat) in [(1, 'linear'), (2, 'log2')]:
+                for (cm, calcMethod) in [(1, 'ratio'), (2, 'difference')]:
+                    expected = microarray.legacy_read_microarray_data({'file': self.fname, 'idf': idf, 'cm': cm})
+                    logFCs = microarray.log_fold_changes(data, dataFormat, calcMethod)
+                    self.assertEqual(sorted([(fc, gene) for (gene, fc) in logFCs.items()], reverse=True),
+                                     [(fc, gene) for (gene, fc) in expected['fold_change']])
+
+    def test_errors(self):
+        lines = self.text.splitlines()
+        lines[10] += ',1.0'
+        self.assertRaisesRegexp(ValueError, 'Wrong number of values, line: 10',
+                                microarray.read_microarray, StringIO('\n'.join(lines)), 4)
+        lines[5] = lines[5].replace('.', 'x', 1)
+        self.assertRaisesRegexp(ValueError, 'Error while reading values, line: 5',
+                                microarray.read_microarray, StringIO('\n'.join(lines)), 4)
@@ -417,7 +417,7 @@ function runWidget(widgetId) {
         $(".widget"+widgetId+"progressbar").css('width','0px');
         setTimeout("updateProgressBar("+widgetId+")",1000);
     }
-    $.post(url['run-widget'], { 'widget_id':widgetId }, function(data) {
+    submitWidget(widgetId, function(data) {
 
        if (data.status=="ok") {
         unfinishDescendants(widgetId);
@@ -441,6 +441,28 @@ function runWidget(widgetId) {
        }
        executed[widgetId] = true;
 
+    });
+}
+
+/* runs the widget as a job: the server returns a job id right away and the status of the job is polled
+until the widget has run. The callback gets the same data as a response of run-widget. */
+function submitWidget(widgetId, callback) {
+    $.post(url['submit-widget'], { 'widget_id':widgetId }, function(data) {
+        if (data.status=="submitted") {
+            pollJob(data.job_id, callback);
+        } else {
+            callback(data);
+        }
+    },'json');
+}
+
+function pollJob(jobId, callback) {
+    $.post(url['job-status'], { 'job_id':jobId }, function(data) {
+        if (data.status=="queued" || data.status=="running") {
+            setTimeout(function(){pollJob(jobId, callback);},1000);
+        } else {
+            callback(data);
+        }
     },'json');
 }
 
@@ -548,7 +570,7 @@ function runWorkflowWidget(widgetId,workflowId) {
             setTimeout("updateProgressBar("+widgetId+")",1000);
         }
 
-        $.post(url['run-widget'], { 'widget_id':widgetId }, function(data) {
+        submitWidget(widgetId, function(data) {
 
                $(".statusimage"+widgetId).hide();
                $(".done"+widgetId).show();
@@ -572,7 +594,7 @@ function runWorkflowWidget(widgetId,workflowId) {
                    $(".done"+data.widget_id).show();
        }
 
-        },'json');
+        });
         executed[widgetId]=true;
     }
 }
@@ -174,21 +174,11 @@ def streaming_filter_tweets_by_language(input_dict):
     return output_dict
 
 def streaming_display_tweets(input_dict,widget,stream=None):
-    from streams.models import StreamWidgetData
+    from streams.state import StreamItems
     if stream is None:
         return {}
     else:
-        try:
-            swd = StreamWidgetData.objects.get(stream=stream,widget=widget)
-            swd.value = input_dict['ltw']
-            swd.save()
-        except:
-            swd = StreamWidgetData()
-            swd.stream = stream
-            swd.widget = widget
-            data = input_dict['ltw']
-            swd.value = data
-            swd.save()
+        StreamItems(stream,widget).replace(input_dict['ltw'])
         return {}
 
 def streaming_triplet_graph(input_dict,widget,stream=None):
@@ -210,14 +200,11 @@ def streaming_triplet_graph(input_dict,widget,stream=None):
         return {}
 
 def streaming_collect_and_display_tweets(input_dict,widget,stream=None):
-    from streams.models import StreamWidgetData
+    from streams.state import StreamItems
     if stream is None:
         return {}
     else:
-        new_tweets = []
-        for tweet in input_dict['ltw']:
-            new_tweets.append(StreamWidgetData(stream=stream,widget=widget,value=tweet))
-        StreamWidgetData.objects.bulk_create(new_tweets)
+        StreamItems(stream,widget).extend(input_dict['ltw'])
         return {}
 
 def streaming_sentiment_graph(input_dict,widget,stream=None):
@@ -232,12 +219,7 @@ def streaming_sentiment_graph(input_dict,widget,stream=None):
         return {}
 
 def streaming_tweet_sentiment_service(input_dict,widget,stream=None):
-    import pickle
-    from pysimplesoap.client import SoapClient, SoapFault
-    import pysimplesoap
-
-    client = SoapClient(location = "http://95.87.154.167:8088/",action = 'http://95.87.154.167:8088/',namespace = "http://example.com/tweetsentiment.wsdl",soap_ns='soap',trace = False,ns = False)
-    pysimplesoap.client.TIMEOUT = 60
+    from workflows.streaming.sentiment import get_service, TWEET_SENTIMENT_SERVICE
 
     list_of_tweets = input_dict['ltw']
 
@@ -246,18 +228,12 @@ def streaming_tweet_sentiment_service(input_dict,widget,stream=None):
     for tweet in list_of_tweets:
         new_list_of_tweets.append({'id':tweet['id'],'text':tweet['text'],'language':tweet['lang']})
 
-    pickled_list_of_tweets = pickle.dumps(new_list_of_tweets)
+    new_ltw = get_service(TWEET_SENTIMENT_SERVICE,60).tweet_sentiment(new_list_of_tweets)
 
-    response = client.TweetSentimentService(tweets=pickled_list_of_tweets)
-
-    new_ltw = pickle.loads(str(response.TweetSentimentResult))
-
-    i=0
-    for new_tweet in new_ltw:
-        list_of_tweets[i]['sentiment']=new_tweet['sentiment']
-        list_of_tweets[i]['lang']=new_tweet['language']
-        list_of_tweets[i]['reliability']=new_tweet['reliability']
-        i = i + 1
+    for tweet,new_tweet in zip(list_of_tweets,new_ltw):
+        tweet['sentiment']=new_tweet['sentiment']
+        tweet['lang']=new_tweet['language']
+        tweet['reliability']=new_tweet['reliability']
 
     output_dict = {}
 
@@ -358,12 +334,16 @@ def streaming_get_article_text(input_dict,widget,stream=None):
     output_dict['text']=text.cleaned_text
     return output_dict
 
+def _set_active_sentiment(list_of_tweets,new_ltw):
+    for tweet,new_tweet in zip(list_of_tweets,new_ltw):
+        if new_tweet[0]=="True":
+            tweet['sentiment']="Positive"
+        elif new_tweet[0]=="False":
+            tweet['sentiment']="Negative"
+        tweet['reliability']=new_tweet[1]
+
 def streaming_active_sentiment_analysis(input_dict,widget,stream=None):
-    import pickle
-    from pysimplesoap.client import SoapClient, SoapFault
-    import pysimplesoap
-    client = SoapClient(location = "http://95.87.154.167:8088/",action = 'http://95.87.154.167:8088/',namespace = "http://example.com/tweetsentiment.wsdl",soap_ns='soap',trace = False,ns = False)
-    pysimplesoap.client.TIMEOUT = 600
+    from workflows.streaming.sentiment import get_service, ACTIVE_SENTIMENT_SERVICE
 
     list_of_tweets = input_dict['ltw']
 
@@ -374,20 +354,9 @@ def streaming_active_sentiment_analysis(input_dict,widget,stream=None):
 
     workflow_id = widget.id
 
-    service_input = pickle.dumps((str(workflow_id),new_list_of_tweets))
-    #print service_input
-    response = client.ActiveClassifyMultiple(workflowtweets=service_input)
+    new_ltw = get_service(ACTIVE_SENTIMENT_SERVICE,600).active_classify((str(workflow_id),),new_list_of_tweets)
 
-    i=0
-    new_ltw = pickle.loads(str(response.ActiveClassifyMultipleResult))
-
-    for new_tweet in new_ltw:
-        if new_tweet[0]=="True":
-            list_of_tweets[i]['sentiment']="Positive"
-        elif new_tweet[0]=="False":
-            list_of_tweets[i]['sentiment']="Negative"
-        list_of_tweets[i]['reliability']=new_tweet[1]
-        i=i+1
+    _set_active_sentiment(list_of_tweets,new_ltw)
 
     output_dict = {}
 
@@ -396,11 +365,7 @@ def streaming_active_sentiment_analysis(input_dict,widget,stream=None):
     return output_dict
 
 def streaming_active_sentiment_analysis2(input_dict,widget,stream=None):
-    import pickle
-    from pysimplesoap.client import SoapClient, SoapFault
-    import pysimplesoap
-    client = SoapClient(location = "http://95.87.154.167:8098/",action = 'http://95.87.154.167:8098/',namespace = "http://example.com/tweetsentiment.wsdl",soap_ns='soap',trace = False,ns = False)
-    pysimplesoap.client.TIMEOUT = 600
+    from workflows.streaming.sentiment import get_service, ACTIVE_SENTIMENT_SERVICE2
 
     list_of_tweets = input_dict['ltw']
 
@@ -411,20 +376,10 @@ def streaming_active_sentiment_analysis2(input_dict,widget,stream=None):
 
     workflow_id = widget.id
 
-    service_input = pickle.dumps((str(workflow_id),input_dict['b_size'],input_dict['q_strategy_closest'],input_dict['q_strategy_random'],new_list_of_tweets))
-    #print service_input
-    response = client.ActiveClassifyMultiple(workflowtweets=service_input)
-
-    i=0
-    new_ltw = pickle.loads(str(response.ActiveClassifyMultipleResult))
+    arguments = (str(workflow_id),input_dict['b_size'],input_dict['q_strategy_closest'],input_dict['q_strategy_random'])
+    new_ltw = get_service(ACTIVE_SENTIMENT_SERVICE2,600).active_classify(arguments,new_list_of_tweets)
 
-    for new_tweet in new_ltw:
-        if new_tweet[0]=="True":
-            list_of_tweets[i]['sentiment']="Positive"
-        elif new_tweet[0]=="False":
-            list_of_tweets[i]['sentiment']="Negative"
-        list_of_tweets[i]['reliability']=new_tweet[1]
-        i=i+1
+    _set_active_sentiment(list_of_tweets,new_ltw)
 
     output_dict = {}
 
@@ -433,55 +388,29 @@ def streaming_active_sentiment_analysis2(input_dict,widget,stream=None):
     return output_dict
 
 def streaming_sentiment_analysis(input_dict,widget,stream=None):
-    import pickle
-    from pysimplesoap.client import SoapClient, SoapFault
-    import pysimplesoap
-
-    client = SoapClient(location = "http://95.87.154.167:8088/",action = 'http://95.87.154.167:8088/',namespace = "http://example.com/tweetsentiment.wsdl",soap_ns='soap',trace = False,ns = False)
-    pysimplesoap.client.TIMEOUT = 60
+    from workflows.streaming.sentiment import get_service, TWEET_SENTIMENT_SERVICE
 
     try:
         input_dict['lang']
     except:
         input_dict['lang']="en"
 
-    #list_of_tweets = input_dict['ltw']
-
-    new_list_of_tweets = []
-
-    new_list_of_tweets.append({'id':0,'text':input_dict['text'],'language':input_dict['lang']})
-
-    #for tweet in list_of_tweets:
-    #    new_list_of_tweets.append({'id':tweet['id'],'text':tweet['text'],'language':tweet['lang']})
-
-    pickled_list_of_tweets = pickle.dumps(new_list_of_tweets)
-
-    response = client.TweetSentimentService(tweets=pickled_list_of_tweets)
-
-    new_ltw = pickle.loads(str(response.TweetSentimentResult))
+    # the text is sent together with the texts of other widgets (and ticks)
+    new_ltw = get_service(TWEET_SENTIMENT_SERVICE,60).tweet_sentiment([{'id':0,'text':input_dict['text'],'language':input_dict['lang']}])
 
     output_dict = {}
 
-    #i=0
     for new_tweet in new_ltw:
         output_dict['sentiment']=new_tweet['sentiment']
         output_dict['language']=new_tweet['language']
         output_dict['reliability']=new_tweet['reliability']
-        #list_of_tweets[i]['sentiment']=new_tweet['sentiment']
-        #list_of_tweets[i]['lang']=new_tweet['language']
-        #list_of_tweets[i]['reliability']=new_tweet['reliability']
-        #i = i + 1
-
-    #output_dict = {}
-
-    #output_dict['ltw'] = list_of_tweets
 
     return output_dict
 
 def streaming_twitter(input_dict,widget,stream=None):
     import tweepy2
-    from streams.models import StreamWidgetData
     from streams.models import HaltStream
+    from streams.state import StreamMap
 
     if input_dict['cfauth']=="true":
         consumer_key="zmK41mqxU3ZNJTFQpYwTdg"
@@ -511,18 +440,9 @@ def streaming_twitter(input_dict,widget,stream=None):
             except Exception as e:
                 raise HaltStream("The Twitter API returned an error: "+str(e))
         else:
-            try:
-                swd = StreamWidgetData.objects.get(stream=stream,widget=widget)
-                data = swd.value
-            except Exception as e:
-                swd = StreamWidgetData()
-                swd.stream = stream
-                swd.widget = widget
-                data = {}
-                swd.value = data
-                swd.save()
-            if data.has_key(query):
-                since_id = data[query]
+            since_ids = StreamMap(stream,widget,'since_id')
+            since_id = since_ids.get(query)
+            if since_id is not None:
                 try:
                     ltw = api.new_search(q=input_dict['query'],geocode=input_dict['geocode'],count=100,since_id=since_id)
                 except Exception as e:
@@ -533,9 +453,7 @@ def streaming_twitter(input_dict,widget,stream=None):
                 except Exception as e:
                     raise HaltStream("The Twitter API returned an error: "+str(e))
             if len(ltw)>0:
-                data[query]=ltw[0].id
-                swd.value = data
-                swd.save()
+                since_ids[query]=ltw[0].id
     else:
         import datetime
         import time
@@ -570,31 +488,18 @@ def streaming_twitter(input_dict,widget,stream=None):
 
 def streaming_rss_reader(input_dict,widget,stream=None):
     import feedparser
-    from streams.models import StreamWidgetData
+    from streams.state import StreamSet
     feed = feedparser.parse(input_dict['url'])
     output_dict = {}
     if stream is None:
         output_dict['url'] = feed['items'][0]['link']
     else:
-        try:
-            swd = StreamWidgetData.objects.get(stream=stream,widget=widget)
-            data = swd.value
-        except:
-            swd = StreamWidgetData()
-            swd.stream = stream
-            swd.widget = widget
-            data = []
-            swd.value = data
-            swd.save()
-        feed_length = len(feed['items'])
+        seen = StreamSet(stream,widget,'links')
         feed['items'].reverse()
-        for item in feed['items']:
-            if item['link'] not in data:
-                data.append(item['link'])
-                swd.value = data
-                swd.save()
-                output_dict['url'] = item['link']
-                break
+        new_links = seen.new_members([item['link'] for item in feed['items']])
+        if new_links:
+            seen.add(new_links[0])
+            output_dict['url'] = new_links[0]
         else:
             from streams.models import HaltStream
             raise HaltStream("Halting stream.")
@@ -602,29 +507,11 @@ def streaming_rss_reader(input_dict,widget,stream=None):
 
 
 def streaming_sliding_window(input_dict,widget,stream=None):
-    from streams.models import StreamWidgetData
+    from streams.state import StreamRingBuffer
     output_dict = {}
     if stream is None:
         output_dict['list']=input_dict['list'][:int(input_dict['size'])]
     else:
-        try:
-            swd = StreamWidgetData.objects.get(stream=stream,widget=widget)
-            data = swd.value
-        except:
-            swd = StreamWidgetData()
-            swd.stream = stream
-            swd.widget = widget
-            data = []
-            swd.value = data
-            swd.save()
-        size = int(input_dict['size'])
-        if len(input_dict['list'])>=size:
-            output_dict['list']=input_dict['list'][:size]
-            swd.value=output_dict['list']
-            swd.save()
-        else:
-            current_window = input_dict['list'] + swd.value
-            swd.value = current_window[:size]
-            output_dict['list']=current_window[:size]
-            swd.save()
+        window = StreamRingBuffer(stream,widget,'window',int(input_dict['size']))
+        output_dict['list']=window.push(input_dict['list'])
     return output_dict
\ No newline at end of file
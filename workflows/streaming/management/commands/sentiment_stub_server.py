@@ -0,0 +1,33 @@
+from optparse import make_option
+from django.core.management.base import NoArgsCommand
+
+class Command(NoArgsCommand):
+    help = 'serve a local stub of the sentiment web services (set SENTIMENT_SERVICE_URL to use it)'
+    option_list = NoArgsCommand.option_list + (
+        make_option('-H', '--host',
+            dest='host',
+            default='localhost',
+            help='Host name the server listens on.'
+        ),
+        make_option('-p', '--port',
+            dest='port',
+            type='int',
+            default=8088,
+            help='Port the server listens on.'
+        ),
+        make_option('-d', '--delay',
+            dest='delay',
+            type='float',
+            default=0,
+            help='Seconds each request takes, to simulate a slow service.'
+        ),
+    )
+    def handle_noargs(self, **options):
+        from workflows.streaming.sentiment_stub import make_stub_server
+        server = make_stub_server(options['host'],options['port'],options['delay'])
+        self.stdout.write("Serving the sentiment stub at http://%s:%d/ ...\n" % (options['host'],options['port']))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write("%d requests, %d items\n" % (server.stub.requests,server.stub.items))
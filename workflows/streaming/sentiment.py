@@ -0,0 +1,216 @@
+""" Shared client of the tweet sentiment web services.
+
+The streaming widgets used to build a new SoapClient for every call and
+send all their tweets in one request. Here every service location has one
+client per thread (so the HTTP connection is kept between calls) and a
+micro-batcher: the tweets submitted to TweetSentimentService by all widgets
+(of all streams running in the process) are sent in batches of at most
+SENTIMENT_SERVICE_BATCH_SIZE tweets, waiting at most
+SENTIMENT_SERVICE_BATCH_DELAY seconds for a batch to fill up, with at most
+SENTIMENT_SERVICE_MAX_IN_FLIGHT requests at the same time. The active
+learner (ActiveClassifyMultiple) applies its batch size and query strategy
+per request and learns from it, so its texts are sent as one request per
+widget call. Requests of idempotent methods that could not reach the
+service are retried SENTIMENT_SERVICE_RETRIES times with an exponential
+backoff; other errors (faults, timeouts) are never retried, as the service
+may have handled the request. SENTIMENT_SERVICE_URL replaces the locations
+of all services, e.g. with the stub server (manage.py
+sentiment_stub_server). """
+
+import time
+import random
+import pickle
+import socket
+import urllib2
+import logging
+import threading
+from multiprocessing.pool import ThreadPool
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TWEET_SENTIMENT_SERVICE = "http://95.87.154.167:8088/"
+ACTIVE_SENTIMENT_SERVICE = "http://95.87.154.167:8088/"
+ACTIVE_SENTIMENT_SERVICE2 = "http://95.87.154.167:8098/"
+NAMESPACE = "http://example.com/tweetsentiment.wsdl"
+
+# the methods whose requests may be sent again
+IDEMPOTENT_METHODS = frozenset(['TweetSentimentService'])
+
+def connection_error(e):
+    """ true if the error is a failure to reach the service (refused or
+    reset connections, unknown hosts), not a timeout or a fault """
+    if isinstance(e,urllib2.URLError) and isinstance(getattr(e,'reason',None),socket.error):
+        e = e.reason
+    return isinstance(e,socket.error) and not isinstance(e,socket.timeout)
+
+
+class PendingResult(object):
+    """ the result of one submitted item, set when its batch returns """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+    def set(self,value,error=None):
+        self.value = value
+        self.error = error
+        self.event.set()
+
+    def get(self):
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class MicroBatcher(object):
+    """ collects the items submitted by any thread and sends them with
+    send(key,items), which returns a result for every item. Only items with
+    the same key are sent together. A batch is sent when it has max_batch
+    items or when its oldest item waited max_delay seconds. """
+
+    def __init__(self,send,max_batch,max_delay,max_in_flight):
+        self.send = send
+        self.max_batch = max(1,max_batch)
+        self.max_delay = max_delay
+        self.pool = ThreadPool(max(1,max_in_flight))
+        self.pending = {}
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.dispatch)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self,key,items):
+        results = [PendingResult() for item in items]
+        now = time.time()
+        with self.condition:
+            queue = self.pending.setdefault(key,[])
+            queue.extend((now,item,result) for item,result in zip(items,results))
+            self.condition.notify()
+        return results
+
+    def map(self,key,items):
+        """ sends the items and returns their results """
+        return [result.get() for result in self.submit(key,items)]
+
+    def ready_batches(self,now):
+        """ takes the batches that should be sent from the queues and
+        returns them with the time the next batch is due """
+        batches = []
+        next_due = None
+        for key,queue in self.pending.items():
+            while len(queue) >= self.max_batch:
+                batches.append((key,queue[:self.max_batch]))
+                del queue[:self.max_batch]
+            if queue:
+                due = queue[0][0]+self.max_delay
+                if due <= now:
+                    batches.append((key,queue[:]))
+                    del queue[:]
+                elif next_due is None or due < next_due:
+                    next_due = due
+            if not queue:
+                del self.pending[key]
+        return batches,next_due
+
+    def dispatch(self):
+        while True:
+            with self.condition:
+                batches,next_due = self.ready_batches(time.time())
+                if not batches:
+                    self.condition.wait(None if next_due is None else max(0,next_due-time.time()))
+                    continue
+            for key,batch in batches:
+                self.pool.apply_async(self.send_batch,[key,batch])
+
+    def send_batch(self,key,batch):
+        try:
+            values = self.send(key,[item for t,item,result in batch])
+            if len(values) != len(batch):
+                raise ValueError("The service returned %d results for %d items." % (len(values),len(batch)))
+        except Exception, e:
+            for t,item,result in batch:
+                result.set(None,e)
+        else:
+            for (t,item,result),value in zip(batch,values):
+                result.set(value)
+
+
+class SentimentService(object):
+    """ a sentiment web service with a SOAP client per thread and a
+    micro-batcher """
+
+    def __init__(self,location,timeout):
+        self.location = location
+        self.timeout = timeout
+        self.retries = getattr(settings,'SENTIMENT_SERVICE_RETRIES',3)
+        self.backoff = getattr(settings,'SENTIMENT_SERVICE_BACKOFF',0.5)
+        self.local = threading.local()
+        self.batcher = MicroBatcher(self.send,
+                                    getattr(settings,'SENTIMENT_SERVICE_BATCH_SIZE',100),
+                                    getattr(settings,'SENTIMENT_SERVICE_BATCH_DELAY',0.05),
+                                    getattr(settings,'SENTIMENT_SERVICE_MAX_IN_FLIGHT',4))
+
+    def client(self):
+        client = getattr(self.local,'client',None)
+        if client is None:
+            from pysimplesoap.client import SoapClient
+            import pysimplesoap
+            pysimplesoap.client.TIMEOUT = self.timeout
+            client = SoapClient(location=self.location,action=self.location,namespace=NAMESPACE,soap_ns='soap',trace=False,ns=False)
+            self.local.client = client
+        return client
+
+    def call(self,method,**kwargs):
+        """ calls the method, retrying with a new client if it is idempotent
+        and the service could not be reached """
+        attempt = 0
+        while True:
+            try:
+                return getattr(self.client(),method)(**kwargs)
+            except Exception, e:
+                self.local.client = None
+                if attempt >= self.retries or not method in IDEMPOTENT_METHODS or not connection_error(e):
+                    raise
+                delay = self.backoff*(2**attempt)*(0.5+random.random())
+                logger.warning('Calling %s on %s failed, retrying in %.2f s',method,self.location,delay,exc_info=True)
+                time.sleep(delay)
+                attempt += 1
+
+    def send(self,key,items):
+        method = key[0]
+        if method == 'TweetSentimentService':
+            response = self.call(method,tweets=pickle.dumps(items))
+            return pickle.loads(str(response.TweetSentimentResult))
+        elif method == 'ActiveClassifyMultiple':
+            response = self.call(method,workflowtweets=pickle.dumps(key[1]+(items,)))
+            return pickle.loads(str(response.ActiveClassifyMultipleResult))
+        raise ValueError("Unknown method "+method)
+
+    def tweet_sentiment(self,tweets):
+        """ tweets is a list of dictionaries with an id, text and language,
+        returns a list of dictionaries with the sentiment, language and
+        reliability of each tweet """
+        return self.batcher.map(('TweetSentimentService',),tweets)
+
+    def active_classify(self,arguments,texts):
+        """ classifies the texts with the active learner, in one request;
+        arguments are the arguments that come before the texts (the widget
+        id, ...). Returns a (label, reliability) pair for each text. """
+        return self.send(('ActiveClassifyMultiple',tuple(arguments)),texts)
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+def get_service(location,timeout=600):
+    """ returns the shared client of the service at the location """
+    location = getattr(settings,'SENTIMENT_SERVICE_URL',None) or location
+    with _services_lock:
+        service = _services.get((location,timeout))
+        if service is None:
+            service = _services[(location,timeout)] = SentimentService(location,timeout)
+    return service
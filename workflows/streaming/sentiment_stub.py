@@ -0,0 +1,77 @@
+""" A local stand-in for the sentiment web services, for testing the
+streaming widgets and the sentiment client without the real services. It
+serves TweetSentimentService and ActiveClassifyMultiple and labels a text by
+counting a few positive and negative words. """
+
+import pickle
+import threading
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer
+
+from workflows.streaming.sentiment import NAMESPACE
+
+POSITIVE_WORDS = set(['good','great','love','like','happy','nice','best','awesome','win'])
+NEGATIVE_WORDS = set(['bad','hate','sad','awful','worst','terrible','angry','lose','fail'])
+
+def stub_sentiment(text):
+    """ returns a (label, reliability) pair: True, False or None (neutral) """
+    words = [w.strip('.,!?#@:;"\'()').lower() for w in text.split()]
+    score = sum(1 for w in words if w in POSITIVE_WORDS)-sum(1 for w in words if w in NEGATIVE_WORDS)
+    if score == 0:
+        return None,0.5
+    return score > 0,min(1.0,0.5+0.1*abs(score))
+
+
+class StubServer(object):
+    """ counts the requests and the items it was sent, so tests can check
+    how the client batches them """
+
+    def __init__(self,delay=0):
+        self.delay = delay
+        self.requests = 0
+        self.items = 0
+        self.lock = threading.Lock()
+
+    def received(self,count):
+        with self.lock:
+            self.requests += 1
+            self.items += count
+        if self.delay:
+            threading.Event().wait(self.delay)
+
+    def tweet_sentiment_service(self,tweets):
+        tweets = pickle.loads(str(tweets))
+        self.received(len(tweets))
+        results = []
+        for tweet in tweets:
+            label,reliability = stub_sentiment(tweet['text'])
+            sentiment = {True:'Positive',False:'Negative',None:'Neutral'}[label]
+            results.append({'id':tweet['id'],'sentiment':sentiment,'language':tweet['language'],'reliability':reliability})
+        return {'TweetSentimentResult':pickle.dumps(results)}
+
+    def active_classify_multiple(self,workflowtweets):
+        arguments = pickle.loads(str(workflowtweets))
+        texts = arguments[-1]
+        self.received(len(texts))
+        return {'ActiveClassifyMultipleResult':pickle.dumps([(str(label),reliability) for label,reliability in map(stub_sentiment,texts)])}
+
+
+class ThreadingHTTPServer(ThreadingMixIn,HTTPServer):
+    daemon_threads = True
+
+
+def make_stub_server(host='localhost',port=8088,delay=0):
+    """ returns an HTTP server (not started yet) whose stub attribute is the
+    StubServer answering the requests """
+    from pysimplesoap.server import SoapDispatcher, SOAPHandler
+    location = "http://%s:%d/" % (host,port)
+    stub = StubServer(delay)
+    dispatcher = SoapDispatcher('TweetSentiment',location=location,action=location,namespace=NAMESPACE,trace=False,ns=False)
+    dispatcher.register_function('TweetSentimentService',stub.tweet_sentiment_service,
+                                 returns={'TweetSentimentResult':str},args={'tweets':str})
+    dispatcher.register_function('ActiveClassifyMultiple',stub.active_classify_multiple,
+                                 returns={'ActiveClassifyMultipleResult':str},args={'workflowtweets':str})
+    server = ThreadingHTTPServer((host,port),SOAPHandler)
+    server.dispatcher = dispatcher
+    server.stub = stub
+    return server
@@ -0,0 +1,110 @@
+import errno
+import pickle
+import socket
+import threading
+from django.test import SimpleTestCase
+
+from workflows.streaming.sentiment import MicroBatcher, SentimentService
+from workflows.streaming.sentiment_stub import stub_sentiment
+
+
+class MicroBatcherTest(SimpleTestCase):
+
+    def test_batches(self):
+        sent = []
+        def send(key,items):
+            sent.append((key,list(items)))
+            return [key[0]+str(i) for i in items]
+        batcher = MicroBatcher(send,max_batch=3,max_delay=0.05,max_in_flight=2)
+        self.assertEqual(batcher.map(('a',),range(7)),['a0','a1','a2','a3','a4','a5','a6'])
+        self.assertEqual(sorted(len(items) for key,items in sent),[1,3,3])
+
+        # concurrent callers with the same key share the batches
+        del sent[:]
+        results = {}
+        def call(n):
+            results[n] = batcher.map(('b',),[n])
+        threads = [threading.Thread(target=call,args=(n,)) for n in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results,dict((n,['b%d' % n]) for n in range(6)))
+        self.assertTrue(len(sent) < 6)
+        self.assertTrue(all(len(items) <= 3 for key,items in sent))
+
+    def test_errors(self):
+        def send(key,items):
+            if 'bad' in items:
+                raise ValueError('bad item')
+            return items[:1]
+        batcher = MicroBatcher(send,max_batch=10,max_delay=0,max_in_flight=1)
+        self.assertRaises(ValueError,batcher.map,('a',),['ok','bad'])
+        # a wrong number of results is an error too
+        self.assertRaises(ValueError,batcher.map,('a',),['ok','ok'])
+        self.assertEqual(batcher.map(('a',),['ok']),['ok'])
+
+    def test_stub_sentiment(self):
+        self.assertEqual(stub_sentiment("I love this, great day")[0],True)
+        self.assertEqual(stub_sentiment("what an awful, sad day")[0],False)
+        self.assertEqual(stub_sentiment("a day")[0],None)
+
+
+class FakeResponse(object):
+    def __init__(self,**kwargs):
+        self.__dict__.update(kwargs)
+
+class FakeClient(object):
+    """ fails with the errors, then labels the texts """
+    def __init__(self,calls,errors):
+        self.calls = calls
+        self.errors = errors
+
+    def fail(self):
+        if self.errors:
+            raise self.errors.pop(0)
+
+    def TweetSentimentService(self,tweets):
+        self.calls.append(('TweetSentimentService',pickle.loads(tweets)))
+        self.fail()
+        return FakeResponse(TweetSentimentResult=pickle.dumps([{'sentiment':'Neutral'} for t in pickle.loads(tweets)]))
+
+    def ActiveClassifyMultiple(self,workflowtweets):
+        arguments = pickle.loads(workflowtweets)
+        self.calls.append(('ActiveClassifyMultiple',arguments))
+        self.fail()
+        return FakeResponse(ActiveClassifyMultipleResult=pickle.dumps([('Neutral',0.5) for t in arguments[-1]]))
+
+class FakeService(SentimentService):
+    def __init__(self,errors=()):
+        SentimentService.__init__(self,'http://localhost:1/',1)
+        self.backoff = 0
+        self.calls = []
+        self.errors = list(errors)
+
+    def client(self):
+        return FakeClient(self.calls,self.errors)
+
+
+class SentimentServiceTest(SimpleTestCase):
+
+    def test_active_classify_unbatched(self):
+        with self.settings(SENTIMENT_SERVICE_BATCH_SIZE=2):
+            service = FakeService()
+        texts = ['a','b','c','d','e']
+        self.assertEqual(service.active_classify(('1','3'),texts),[('Neutral',0.5)]*5)
+        self.assertEqual(service.calls,[('ActiveClassifyMultiple',('1','3',texts))])
+
+    def test_retries(self):
+        refused = socket.error(errno.ECONNREFUSED,'Connection refused')
+        service = FakeService([refused,refused])
+        self.assertEqual(len(service.tweet_sentiment([{'id':1,'text':'a','language':'en'}])),1)
+        self.assertEqual(len(service.calls),3)
+        # timeouts may have been handled by the service, they are not retried
+        service = FakeService([socket.timeout('timed out')])
+        self.assertRaises(socket.timeout,service.tweet_sentiment,[{'id':1,'text':'a','language':'en'}])
+        self.assertEqual(len(service.calls),1)
+        # the active learner learns from every request, it is never retried
+        service = FakeService([refused])
+        self.assertRaises(socket.error,service.active_classify,('1',),['a'])
+        self.assertEqual(len(service.calls),1)
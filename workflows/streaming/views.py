@@ -22,22 +22,20 @@ from django.contrib.auth.decorators import login_required
 
 #settings
 from mothra.settings import DEBUG, FILES_FOLDER
+from django.conf import settings
 
 #ostalo
 import os
 
 from streams.models import *
+from streams.state import StreamItems
 
 import operator
 
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
 def streaming_tweet_cloud(request,widget,stream):
-    try:
-        tweet_data = StreamWidgetData.objects.get(widget=widget,stream=stream).value
-    except:
-        tweet_data = []
-    tweets = tweet_data
+    tweets = StreamItems(stream,widget).newest(getattr(settings,'STREAMING_TWEET_CLOUD_SIZE',None))
 
     if request.GET.get('raw_tweets')=='1':
         return render(request, 'streaming_vizualizations/streaming/raw_tweets.html', {'tweets':tweets,'widget':widget,
@@ -92,16 +90,7 @@ def streaming_active_annotation2(request,widget,stream):
 
 
 def streaming_display_tweets_visualization(request,widget,stream):
-    try:
-        tweet_data = StreamWidgetData.objects.get(widget=widget,stream=stream).value
-    except:
-        tweet_data = []
-    tweets_unsorted = tweet_data
-    tweets = sorted(tweets_unsorted, key=operator.itemgetter('created_at'))
-    if request.GET.get('reverse')=="true":
-        pass
-    else:
-        tweets.reverse()
+    tweets = StreamItems(stream,widget).ordered(newest_first=request.GET.get('reverse')!="true")
     rpp=20
     if request.GET.has_key('rpp'):
         rpp = int(request.GET.get('rpp'))
@@ -115,15 +104,13 @@ def streaming_display_tweets_visualization(request,widget,stream):
         tweets = paginator.page(1)
     except EmptyPage:
         tweets = paginator.page(paginator.num_pages)
+    tweets.object_list = [row.value for row in tweets.object_list]
 
     return render(request, 'streaming_vizualizations/streaming/display_tweets.html', {'tweets':tweets,'widget':widget,
         'stream':stream,'paged':tweets})
 
 def streaming_collect_and_display_visualization(request,widget,stream):
-    tweet_data = StreamWidgetData.objects.filter(widget=widget,stream=stream)
-    tweets_unsorted = [x.value for x in tweet_data]
-    tweets = sorted(tweets_unsorted, key=operator.itemgetter('created_at'))
-    tweets.reverse()
+    tweets = StreamItems(stream,widget).ordered(newest_first=True)
     paginator = Paginator(tweets,20)
     page=request.GET.get('page')
     try:
@@ -132,6 +119,7 @@ def streaming_collect_and_display_visualization(request,widget,stream):
         tweets = paginator.page(1)
     except EmptyPage:
         tweets = paginator.page(paginator.num_pages)
+    tweets.object_list = [row.value for row in tweets.object_list]
 
     return render(request, 'streaming_vizualizations/streaming/display_tweets.html', {'tweets':tweets,'widget':widget,
         'stream':stream,'paged':tweets})
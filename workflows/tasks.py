@@ -1,6 +1,37 @@
 from celery.task import task
+from celery.signals import worker_process_init
 import workflows.library
 
+def _installed(module):
+    """ true if the module is part of an installed app. The modules of the
+    packages of workflows (e.g. workflows.segmine) need their package to be
+    installed, not just workflows. """
+    from django.conf import settings
+    parts = module.split('.')
+    if parts[0]=='workflows' and len(parts)>2:
+        return '.'.join(parts[:2]) in settings.INSTALLED_APPS
+    return any(module==app or module.startswith(app+'.') for app in settings.INSTALLED_APPS)
+
+@worker_process_init.connect
+def warm_up_worker(**kwargs):
+    """ calls the WORKER_WARM_UP functions of the installed apps when a
+    worker process starts """
+    import logging
+    from django.conf import settings
+    from django.utils.importlib import import_module
+    for path in getattr(settings,'WORKER_WARM_UP',()):
+        module,name = path.rsplit('.',1)
+        if not _installed(module):
+            continue
+        try:
+            function = getattr(import_module(module),name)
+        except ImportError:
+            continue
+        try:
+            function()
+        except Exception:
+            logging.getLogger(__name__).warning('Warming up with %s failed',path,exc_info=True)
+
 @task()
 def add(a,b):
     import time
@@ -8,8 +39,9 @@ def add(a,b):
     return a+b
 
 @task()
-def runForLoopIteration(workflow,iteration):
-    pass
+def runForLoopIteration(workflow,iteration,inputs=None):
+    from workflows.engine import LoopIterationRunner
+    return LoopIterationRunner(workflow,inputs).run_values(iteration)
 
 @task()
 def executeWidgetFunction(widget,input_dict):
@@ -40,6 +72,11 @@ def executeWidgetPostInteract(widget,input_dict,output_dict,request):
 def runWidget(widget,offline):
     widget.proper_run(offline)
 
+@task()
+def runWidgetJob(job_id,widget_id):
+    from workflows.jobs import run_widget_job
+    return run_widget_job(job_id,widget_id)
+
 @task()
 def runWidgetAsync(widget):
     widget.run(True)
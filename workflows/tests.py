@@ -6,9 +6,18 @@ Replace this with more appropriate tests for your application.
 """
 
 from django.test import TestCase
+from django.test.utils import override_settings
 from workflows.engine import WorkflowRunner, WidgetRunner
-from workflows.models import Workflow, Widget
+from workflows.execution_cache import get_execution_cache
+from workflows.jobs import submit_widget, job_status, widget_status, widget_statuses, status_cache, widget_key, job_key
+from workflows.models import Workflow, Widget, AbstractWidget, Input, Output, Connection
+from workflows.library import _webservice_batch_arguments, call_webservice
+from workflows.tasks import warm_up_worker
+from services import webservice
+from services.webservice import ServiceDescription, WebService
 import time
+import shutil
+import tempfile
 
 class WorkflowExportTest(TestCase):
     fixtures = ['test_data',]
@@ -28,6 +37,109 @@ class WorkflowEngineTest(TestCase):
         o = wid.outputs.all()[0].value
         self.assertEqual(o,[20,40,60,80])
 
+    def test_parallel_workflow_runner(self):
+        w = Workflow.objects.get(name='For loop test')
+        wr = WorkflowRunner(w,max_workers=4)
+        wr.run()
+        wid = Widget.objects.get(id=6)
+        o = wid.outputs.all()[0].value
+        self.assertEqual(o,[20,40,60,80])
+
+    @override_settings(WORKFLOW_EXECUTION_CACHE_SIZE=100)
+    def test_execution_cache(self):
+        w = Workflow.objects.get(name='For loop test')
+        AbstractWidget.objects.filter(action='add_integers').update(pure=True)
+        cache = get_execution_cache()
+        cache.clear()
+        WorkflowRunner(w).run()
+        self.assertEqual(cache.stats()['hits'],0)
+        Widget.objects.update(input_fingerprint='')
+        WorkflowRunner(w).run()
+        self.assertEqual(cache.stats()['hits'],4)
+        wid = Widget.objects.get(id=6)
+        o = wid.outputs.all()[0].value
+        self.assertEqual(o,[20,40,60,80])
+
+    def test_incremental_rerun(self):
+        w = Workflow.objects.get(name='For loop test')
+        AbstractWidget.objects.filter(action__in=['create_integer','create_list']).update(pure=True)
+        WorkflowRunner(w).run()
+        widget = Widget.objects.get(id=1)
+        self.assertNotEqual(widget.input_fingerprint,'')
+        o = widget.outputs.all()[0]
+        o.value = 'not recomputed'
+        o.save()
+        # the inputs didn't change, so the widget keeps its outputs
+        widget.proper_run(True)
+        self.assertEqual(widget.outputs.all()[0].value,'not recomputed')
+        # a rerun that produces the same outputs doesn't unfinish the widgets after it
+        widget.reset(False)
+        widget.proper_run(True)
+        self.assertEqual(widget.outputs.all()[0].value,u'10')
+        self.assertTrue(Widget.objects.get(id=5).finished)
+        i = widget.inputs.all()[0]
+        i.value = u'11'
+        i.save()
+        widget.reset(False)
+        widget.proper_run(True)
+        self.assertFalse(Widget.objects.get(id=5).finished)
+
+    def test_impure_widgets_rerun(self):
+        w = Workflow.objects.get(name='For loop test')
+        WorkflowRunner(w).run()
+        widget = Widget.objects.get(id=1)
+        self.assertEqual(widget.input_fingerprint,'')
+        o = widget.outputs.all()[0]
+        o.value = 'recomputed'
+        o.save()
+        widget.proper_run(True)
+        self.assertEqual(widget.outputs.all()[0].value,u'10')
+
+    def test_parallel_for_loop(self):
+        w = Workflow.objects.get(name='For loop test')
+        Workflow.objects.filter(widgets__type='for_input').update(loop_workers=4)
+        wr = WorkflowRunner(w)
+        wr.run()
+        wid = Widget.objects.get(id=6)
+        o = wid.outputs.all()[0].value
+        self.assertEqual(o,[20,40,60,80])
+
+    def test_parallel_for_loop_rerun(self):
+        w = Workflow.objects.get(name='For loop test')
+        WorkflowRunner(w).run()
+        Workflow.objects.filter(widgets__type='for_input').update(loop_workers=4)
+        for backend in ['threads','processes','threads']:
+            with self.settings(WORKFLOW_LOOP_BACKEND=backend):
+                WorkflowRunner(w).run()
+            wid = Widget.objects.get(id=6)
+            o = wid.outputs.all()[0].value
+            self.assertEqual(o,[20,40,60,80])
+
+    def add_loop_offset(self,offset):
+        """ feeds the second integer of the body of the for loop from an
+            input widget, whose outer input is a parameter of the loop """
+        loop = Widget.objects.get(id=12)
+        outer_input = Input.objects.create(name='Offset',short_name='off',variable='offset',widget=loop,
+                                           required=False,parameter=True,value=offset,order=2)
+        body = Widget.objects.get(id=13).workflow
+        input_widget = Widget.objects.create(workflow=body,x=0,y=0,name='Input',type='input')
+        output = Output.objects.create(name='Input',short_name='inp',variable='Input',widget=input_widget,
+                                       outer_input=outer_input)
+        outer_input.inner_output = output
+        outer_input.save()
+        Connection.objects.filter(input_id=16).update(output=output)
+
+    def test_parallel_for_loop_inputs(self):
+        w = Workflow.objects.get(name='For loop test')
+        self.add_loop_offset(5)
+        WorkflowRunner(w).run()
+        self.assertEqual(Widget.objects.get(id=6).outputs.all()[0].value,[15,25,35,45])
+        Workflow.objects.filter(widgets__type='for_input').update(loop_workers=4)
+        for backend in ['threads','processes']:
+            with self.settings(WORKFLOW_LOOP_BACKEND=backend):
+                WorkflowRunner(w).run()
+            self.assertEqual(Widget.objects.get(id=6).outputs.all()[0].value,[15,25,35,45])
+
     def test_fast_workflow_runner_cv(self):
         w = Workflow.objects.get(name='Cross test')
         wr = WorkflowRunner(w)
@@ -38,6 +150,108 @@ class WorkflowEngineTest(TestCase):
                             [[[u'3'], [u'1']], [u'2'], 1],
                             [[[u'3'], [u'2']], [u'1'], 1]])
 
+    def test_parallel_cross_validation(self):
+        w = Workflow.objects.get(name='Cross test')
+        Workflow.objects.filter(widgets__type='cv_input').update(loop_workers=3)
+        wr = WorkflowRunner(w)
+        wr.run()
+        wid = Widget.objects.get(id=16)
+        o = wid.outputs.all()[0].value
+        self.assertEqual(o,[[[[u'2'], [u'1']], [u'3'], 1],
+                            [[[u'3'], [u'1']], [u'2'], 1],
+                            [[[u'3'], [u'2']], [u'1'], 1]])
+
+    def test_parallel_cross_validation_rerun(self):
+        w = Workflow.objects.get(name='Cross test')
+        WorkflowRunner(w).run()
+        Workflow.objects.filter(widgets__type='cv_input').update(loop_workers=3)
+        for backend in ['threads','processes','threads']:
+            with self.settings(WORKFLOW_LOOP_BACKEND=backend):
+                WorkflowRunner(w).run()
+            wid = Widget.objects.get(id=16)
+            o = wid.outputs.all()[0].value
+            self.assertEqual(o,[[[[u'2'], [u'1']], [u'3'], 1],
+                                [[[u'3'], [u'1']], [u'2'], 1],
+                                [[[u'3'], [u'2']], [u'1'], 1]])
+
+    def test_parallel_cross_validation_inputs(self):
+        """ the bodies of the cross validations get a string from outside
+            through an input widget """
+        w = Workflow.objects.get(name='Cross test (copy)')
+        WorkflowRunner(w).run()
+        expected = [Widget.objects.get(id=i).outputs.all()[0].value for i in (36,46)]
+        self.assertEqual(len(expected[0]),3)
+        Workflow.objects.filter(widgets__type='cv_input').update(loop_workers=3)
+        for backend in ['threads','processes']:
+            with self.settings(WORKFLOW_LOOP_BACKEND=backend):
+                WorkflowRunner(w).run()
+            self.assertEqual([Widget.objects.get(id=i).outputs.all()[0].value for i in (36,46)],expected)
+
+class WidgetJobTest(TestCase):
+    fixtures = ['test_data',]
+    def setUp(self):
+        status_cache().clear()
+
+    def tearDown(self):
+        status_cache().clear()
+
+    @override_settings(USE_CONCURRENCY=False)
+    def test_submit_widget(self):
+        w = Widget.objects.get(id=1)
+        job_id = submit_widget(w)
+        status = job_status(job_id)
+        self.assertEqual(status['status'],'ok')
+        self.assertEqual(status['widget_id'],1)
+        self.assertEqual(widget_status(1)['finished'],True)
+
+    def test_widget_statuses(self):
+        Widget.objects.filter(id=2).update(running=True,progress=50)
+        statuses = widget_statuses([2,3])
+        self.assertEqual(statuses[2]['progress'],50)
+        self.assertEqual(statuses[3]['running'],False)
+        w = Widget.objects.get(id=2)
+        w.running = False
+        w.save()
+        self.assertEqual(widget_status(2)['running'],False)
+
+    def test_reset_forgets_statuses(self):
+        w = Widget.objects.get(id=5)
+        w.finished = True
+        w.save()
+        self.assertEqual(widget_status(5)['finished'],True)
+        Widget.objects.get(id=1).reset_descendants()
+        self.assertEqual(widget_status(5)['finished'],False)
+
+    def test_local_cache_reads_rows(self):
+        # another process changed the widget, this process still has its old status
+        status_cache().set(widget_key(5),{'running':True,'finished':False,'error':False,'progress':10})
+        status_cache().set(job_key('5-abc'),{'status':'queued','widget_id':5,'job_id':'5-abc'})
+        Widget.objects.filter(id=5).update(running=False,finished=True,progress=100)
+        self.assertEqual(widget_status(5)['finished'],True)
+        self.assertEqual(widget_status(5)['progress'],100)
+        self.assertEqual(job_status('5-abc')['status'],'ok')
+        self.assertEqual(job_status('abc'),None)
+
+    def test_shared_cache(self):
+        directory = tempfile.mkdtemp()
+        caches = {'default':{'BACKEND':'django.core.cache.backends.locmem.LocMemCache'},
+                  'status':{'BACKEND':'django.core.cache.backends.filebased.FileBasedCache','LOCATION':directory}}
+        try:
+            with self.settings(CACHES=caches,WORKFLOW_STATUS_CACHE='status'):
+                w = Widget.objects.get(id=5)
+                w.running = True
+                w.save()
+                Widget.objects.filter(id=5).update(running=False,finished=True)
+                # statuses are read from the shared cache
+                self.assertEqual(widget_status(5)['running'],True)
+                self.assertEqual(job_status('5-abc')['status'],'ok')
+                status_cache().set(job_key('5-abc'),{'status':'running','widget_id':5,'job_id':'5-abc'})
+                self.assertEqual(job_status('5-abc')['status'],'running')
+                status_cache().clear()
+                self.assertEqual(widget_status(5)['running'],False)
+        finally:
+            shutil.rmtree(directory)
+
 class WidgetEngineTest(TestCase):
     fixtures = ['test_data2',]
     def test_fast_widget_runner(self):
@@ -58,3 +272,108 @@ class WidgetEngineTest(TestCase):
                             [[[u'3'], [u'1']], [u'2'], 1],
                             [[[u'3'], [u'2']], [u'1'], 1]])
 
+
+
+class StubClient(object):
+    def echo(self,value):
+        if value < 0:
+            raise ValueError('negative value %d' % value)
+        return {'result':value*2}
+
+class StubDescription(ServiceDescription):
+    def client(self,timeout):
+        return StubClient()
+
+STUB_WSDL = 'http://stub.example.com/echo?wsdl'
+STUB_SERVICES = {'EchoService':{'ports':{'EchoPort':{'location':'http://stub.example.com/echo',
+    'operations':{'echo':{'name':'echo','documentation':'Doubles the value.',
+                          'input':{'echo':{'value':int}},'output':{'echoResponse':{'result':int}}}}}}}}
+
+class WebServiceBatchTest(TestCase):
+    def setUp(self):
+        webservice.forget_descriptions()
+        webservice._descriptions[STUB_WSDL] = StubDescription(STUB_WSDL,STUB_SERVICES,'urn:echo',None)
+
+    def tearDown(self):
+        webservice.forget_descriptions()
+
+    def input_dict(self,value,batch="true",collecterrors="false"):
+        return {'wsdl':STUB_WSDL,'timeout':'60','wsdl_method':'echo','sendemptystrings':'false',
+                'batch':batch,'collecterrors':collecterrors,'value':value}
+
+    def test_batch_arguments(self):
+        method = {'inputs':[{'name':'value','type':int},{'name':'scale','type':int}]}
+        calls = _webservice_batch_arguments(method,{'value':[1,2,3],'scale':10,'sendemptystrings':'false'})
+        self.assertEqual(calls,[{'value':1,'scale':10},{'value':2,'scale':10},{'value':3,'scale':10}])
+        calls = _webservice_batch_arguments(method,{'value':1,'scale':10,'sendemptystrings':'false'})
+        self.assertEqual(calls,[{'value':1,'scale':10}])
+        calls = _webservice_batch_arguments(method,{'value':[1,2],'scale':(3,4),'sendemptystrings':'false'})
+        self.assertEqual(calls,[{'value':1,'scale':3},{'value':2,'scale':4}])
+
+    def test_batch_arguments_lengths(self):
+        method = {'inputs':[{'name':'value','type':int},{'name':'scale','type':int}]}
+        self.assertRaises(Exception,_webservice_batch_arguments,method,
+                          {'value':[1,2,3],'scale':[1,2],'sendemptystrings':'false'})
+
+    def test_call_many(self):
+        ws = WebService(STUB_WSDL)
+        calls = [{'value':v} for v in range(20)]
+        self.assertEqual(ws.call_many('echo',calls,workers=4),[{'result':v*2} for v in range(20)])
+        self.assertEqual(ws.call_many('echo',[]),[])
+
+    def test_call_many_fail_fast(self):
+        ws = WebService(STUB_WSDL)
+        calls = [{'value':v} for v in (1,-2,3)]
+        self.assertRaises(ValueError,ws.call_many,'echo',calls,workers=1)
+
+    def test_call_many_collect_errors(self):
+        ws = WebService(STUB_WSDL)
+        results = ws.call_many('echo',[{'value':v} for v in (1,-2,3,-4)],workers=2,fail_fast=False)
+        self.assertEqual(results[0],{'result':2})
+        self.assertTrue(isinstance(results[1],ValueError))
+        self.assertEqual(results[2],{'result':6})
+        self.assertTrue(isinstance(results[3],ValueError))
+
+    def test_call_webservice(self):
+        output_dict = call_webservice(self.input_dict(5,batch="false"))
+        self.assertEqual(output_dict,{'result':10})
+        output_dict = call_webservice(self.input_dict([1,2,3]))
+        self.assertEqual(output_dict,{'result':[2,4,6],'errors':[]})
+        self.assertRaises(ValueError,call_webservice,self.input_dict([1,-2,3]))
+
+    def test_call_webservice_collect_errors(self):
+        output_dict = call_webservice(self.input_dict([1,-2,3],collecterrors="true"))
+        self.assertEqual(output_dict['result'],[2,None,6])
+        self.assertEqual([n for n,e in output_dict['errors']],[1])
+        self.assertTrue('negative value -2' in output_dict['errors'][0][1])
+
+
+warmed_up = []
+
+def record_warm_up():
+    warmed_up.append(True)
+
+class WorkerWarmUpTest(TestCase):
+    def setUp(self):
+        del warmed_up[:]
+
+    def test_installed_packages(self):
+        with self.settings(WORKER_WARM_UP=('workflows.tests.record_warm_up','workflows.missing.warm_up')):
+            warm_up_worker()
+        self.assertEqual(warmed_up,[True])
+
+    def test_packages_not_installed(self):
+        from workflows.segmine import reference_data
+        warm_up = reference_data.warm_up
+        reference_data.warm_up = record_warm_up
+        try:
+            with self.settings(WORKER_WARM_UP=('workflows.segmine.reference_data.warm_up',),
+                               INSTALLED_APPS=('workflows','workflows.base')):
+                warm_up_worker()
+            self.assertEqual(warmed_up,[])
+            with self.settings(WORKER_WARM_UP=('workflows.segmine.reference_data.warm_up',),
+                               INSTALLED_APPS=('workflows','workflows.segmine')):
+                warm_up_worker()
+            self.assertEqual(warmed_up,[True])
+        finally:
+            reference_data.warm_up = warm_up
@@ -38,6 +38,8 @@ urlpatterns += patterns('',
     url(r'^rename-widget/', 'workflows.views.rename_widget', name='rename widget'),
     url(r'^rename-workflow/', 'workflows.views.rename_workflow', name='rename workflow'),
     url(r'^run-widget/', 'workflows.views.run_widget', name='run widget'),
+    url(r'^submit-widget/', 'workflows.views.submit_widget', name='submit widget'),
+    url(r'^job-status/', 'workflows.views.job_status', name='job status'),
     url(r'^widget-results/', 'workflows.views.widget_results', name='widget results'),
     url(r'^widget-visualization/', 'workflows.views.visualize_widget', name='widget visualization'),
     url(r'^widget-iframe/(?P<widget_id>[0-9]+)/$', 'workflows.views.widget_iframe', name='widget iframe'),
@@ -19,6 +19,7 @@ from workflows.models import *
 from django.contrib.auth.models import User
 
 from workflows.utils import *
+from workflows.jobs import execute_widget, submit_widget as submit_widget_job, job_status as get_job_status, widget_status, widget_statuses
 
 # auth fore
 from django.contrib.auth.decorators import login_required
@@ -81,11 +82,13 @@ def open_workflow(request,workflow_id):
 
 @login_required
 def widget_progress(request):
-    w = get_object_or_404(Widget, pk=request.POST['widget_id'])
-    if w.running:
-        return HttpResponse(w.progress)
+    status = widget_status(int(request.POST['widget_id']))
+    if status is None:
+        raise Http404
+    if status['running']:
+        return HttpResponse(status['progress'])
     else:
-        if w.progress==100:
+        if status['progress']==100:
             return HttpResponse("100")
         return HttpResponse("-1")
 
@@ -987,49 +990,8 @@ def run_widget(request):
     if request.is_ajax() or DEBUG:
         w = get_object_or_404(Widget, pk=request.POST['widget_id'])
         if (w.workflow.user==request.user):
-            try:
-                # find all required inputs
-                multi_satisfied = {}
-                for inp in w.inputs.filter(required=True,parameter=False):
-                    if inp.connections.count()==0:
-                        if inp.multi_id == 0:
-                            raise Exception("The input "+str(inp)+" must have something connected to it in order to run.")
-                        else:
-                            multi_satisfied[inp.multi_id] = (str(inp),multi_satisfied.get(inp.multi_id,False))
-                    elif inp.multi_id != 0:
-                        multi_satisfied[inp.multi_id] = (str(inp),True)
-                for mid in multi_satisfied.keys():
-                    if multi_satisfied[mid][1]==False:
-                        raise Exception("The input "+multi_satisfied[mid][0]+" must have something connected to it in order to run.")
-                if w.type == 'for_input' or w.type == 'for_output':
-                    raise Exception("You can't run for loops like this. Please run the containing widget.")
-                output_dict = w.run(False)
-                mimetype = 'application/javascript'
-                if not w.abstract_widget is None:
-                    if w.abstract_widget.interactive:
-                        w.interaction_waiting = True
-                        w.save()
-                        data = simplejson.dumps({'status':'interactive','message':'Widget '+w.name+' needs your attention.','widget_id':w.id})
-                    elif w.abstract_widget.visualization_view!='':
-                        data = simplejson.dumps({'status':'visualize','message':'Visualizing widget '+w.name+'.','widget_id':w.id})
-                    else:
-                        data = simplejson.dumps({'status':'ok','message':'Widget '+w.name+' executed successfully.'})
-                else:
-                    data = simplejson.dumps({'status':'ok','message':'Widget '+w.name+' executed successfully.'})
-            except Exception,e:
-                mimetype = 'application/javascript'
-                w.error = True
-                w.running = False
-                w.finished = False
-                w.save()
-
-                print traceback.format_exc(e)
-
-                #raise
-                for o in w.outputs.all():
-                    o.value=None
-                    o.save()
-                data = simplejson.dumps({'status':'error','message':'Error occurred when trying to execute widget '+w.name+': '+str(type(e))+' '+str(e)})
+            data = simplejson.dumps(execute_widget(w))
+            mimetype = 'application/javascript'
             return HttpResponse(data,mimetype)
         else:
             return HttpResponse(status=400)
@@ -1038,43 +1000,50 @@ def run_widget(request):
 
 @login_required
 def run_tree(request):
+    if request.is_ajax() or DEBUG:
+        w = get_object_or_404(Widget, pk=request.POST['widget_id'])
+        if (w.workflow.user==request.user):
+            data = simplejson.dumps(execute_widget(w,check_inputs=False))
+            mimetype = 'application/javascript'
+            return HttpResponse(data,mimetype)
+        else:
+            return HttpResponse(status=400)
+    else:
+        return HttpResponse(status=400)
+
+@login_required
+def submit_widget(request):
+    """ queues a run of the widget and returns the id of the job, which is
+    polled with job_status """
     if request.is_ajax() or DEBUG:
         w = get_object_or_404(Widget, pk=request.POST['widget_id'])
         if (w.workflow.user==request.user):
             try:
-                if w.type == 'for_input' or w.type == 'for_output':
-                    raise Exception("You can't run for loops like this. Please run the containing widget.")
-                output_dict = w.run(False)
-                mimetype = 'application/javascript'
-                if not w.abstract_widget is None:
-                    if w.abstract_widget.interactive:
-                        w.interaction_waiting = True
-                        w.save()
-                        data = simplejson.dumps({'status':'interactive','message':'Widget '+w.name+' needs your attention.','widget_id':w.id})
-                    elif w.abstract_widget.visualization_view!='':
-                        data = simplejson.dumps({'status':'visualize','message':'Visualizing widget '+w.name+'.','widget_id':w.id})
-                    else:
-                        data = simplejson.dumps({'status':'ok','message':'Widget '+w.name+' executed successfully.'})
-                else:
-                    data = simplejson.dumps({'status':'ok','message':'Widget '+w.name+' executed successfully.'})
+                job_id = submit_widget_job(w)
+                data = simplejson.dumps({'status':'submitted','job_id':job_id,'widget_id':w.id})
             except Exception, e:
-                mimetype = 'application/javascript'
-                w.error = True
-                w.running = False
-                w.finished = False
-                w.save()
-                print traceback.format_exc(e)
-                #raise
-                for o in w.outputs.all():
-                    o.value=None
-                    o.save()
-                data = simplejson.dumps({'status':'error','message':'Error occurred when trying to execute widget '+w.name+': '+str(type(e))+' '+str(e)})
+                data = simplejson.dumps({'status':'error','message':'Error occurred when trying to execute widget '+w.name+': '+str(type(e))+' '+str(e),'widget_id':w.id})
+            mimetype = 'application/javascript'
             return HttpResponse(data,mimetype)
         else:
             return HttpResponse(status=400)
     else:
         return HttpResponse(status=400)
 
+@login_required
+def job_status(request):
+    if request.is_ajax() or DEBUG:
+        status = get_job_status(request.POST['job_id'])
+        if status is None:
+            raise Http404
+        if status.get('user_id')!=request.user.id:
+            return HttpResponse(status=400)
+        data = simplejson.dumps(status)
+        mimetype = 'application/javascript'
+        return HttpResponse(data,mimetype)
+    else:
+        return HttpResponse(status=400)
+
 
 @login_required
 def reset_widget(request):
@@ -1124,11 +1093,11 @@ def get_executed_status(request):
     if request.is_ajax() or DEBUG:
         workflow = get_object_or_404(Workflow, pk=request.POST['workflow_id'])
         executedStatus = {}
-        for w in workflow.widgets.all():
-            if w.error or w.running or not w.finished:
-                executedStatus[w.pk] = False
+        for w_id,status in widget_statuses(list(workflow.widgets.values_list('pk',flat=True))).items():
+            if status['error'] or status['running'] or not status['finished']:
+                executedStatus[w_id] = False
             else:
-                executedStatus[w.pk] = True
+                executedStatus[w_id] = True
         mimetype = 'application/javascript'
         data = simplejson.dumps({'executedStatus':executedStatus})
         return HttpResponse(data,mimetype)
@@ -1344,7 +1313,7 @@ def finish_interaction(request):
 @login_required
 def import_webservice(request):
     from services.webservice import WebService
-    ws = WebService(request.POST['wsdl'])
+    ws = WebService(request.POST['wsdl'],refresh=True)
     new_c = Category()
     current_name = ws.name
     i=0
@@ -1383,6 +1352,24 @@ def import_webservice(request):
         new_i.default = ''
         new_i.parameter_type='checkbox'
         new_i.save()
+        new_i = AbstractInput()
+        new_i.parameter=True
+        new_i.widget = new_a
+        new_i.name = "Call the webservice for every item of list inputs"
+        new_i.short_name = "bat"
+        new_i.variable = "batch"
+        new_i.default = ''
+        new_i.parameter_type='checkbox'
+        new_i.save()
+        new_i = AbstractInput()
+        new_i.parameter=True
+        new_i.widget = new_a
+        new_i.name = "Collect errors of the calls instead of stopping"
+        new_i.short_name = "err"
+        new_i.variable = "collecterrors"
+        new_i.default = ''
+        new_i.parameter_type='checkbox'
+        new_i.save()
         for i in m['inputs']:
             new_i = AbstractInput()
             new_i.name = i['name']
@@ -1404,6 +1391,14 @@ def import_webservice(request):
             new_o.description = ''
             new_o.widget = new_a
             new_o.save()
+        if not 'errors' in [o['name'] for o in m['outputs']]:
+            new_o = AbstractOutput()
+            new_o.name = "Errors of the calls"
+            new_o.variable = "errors"
+            new_o.short_name = "err"
+            new_o.description = 'The (index, error) pairs of the failed calls if errors are collected.'
+            new_o.widget = new_a
+            new_o.save()
     mimetype = 'application/javascript'
     data = simplejson.dumps({'category_id':new_c.id})
     return HttpResponse(data,mimetype)
@@ -0,0 +1,358 @@
+""" The curves of the ViperCharts evaluation charts.
+
+The predictions of a curve are sorted once and the points of all its
+series (ROC, PR, lift, cost, rate driven and Kendall curves), AUC, AUPR,
+the ROC hull and Kendall's tau are computed from cumulative counts of the
+positive and negative examples at every distinct threshold, with the same
+operations (and so the same results) as the original implementation, which
+is kept as legacy_prepare_curve_data. Series can be decimated to at most
+max_points points for plotting, except the rate driven intervals, which
+must stay contiguous. The areas and tau are always computed from all
+points. """
+
+import math
+
+import numpy as np
+
+N_POINTS = 4
+
+
+def keep_indices(length, max_points=None):
+    """ the indices of at most max_points evenly spaced points of a series,
+    including the first and the last one """
+    if not max_points or length <= max_points:
+        return np.arange(length)
+    return np.unique(np.linspace(0, length-1, max(max_points, 2)).round().astype(int))
+
+
+def score_curve(actual, predicted, curve_number, max_points=None, nPoints=N_POINTS):
+    """ the series and measures of a curve of scored predictions, with its
+    largest loss and Kendall value (for RATEmax and KENmax) """
+    n = len(actual)
+    negs = actual.count(0)
+    poss = actual.count(1)
+    scores = np.fromiter((float(p) for p in predicted[:n]), float, n)
+    positive = np.fromiter((a == 1 for a in actual), bool, n)
+    negative = np.fromiter((a == 0 for a in actual), bool, n)
+
+    # a stable sort by descending score, like sorted(..., reverse=True)
+    order = np.argsort(-scores, kind='mergesort')
+    ranked = scores[order]
+    tp_counts = np.cumsum(positive[order])
+    fp_counts = np.cumsum(negative[order])
+
+    # the groups of equal scores: the examples with a score at least the
+    # threshold of a group are those up to its end
+    ends = np.append(np.flatnonzero(ranked[1:] != ranked[:-1])+1, n)
+    starts = np.append(0, ends[:-1])
+    thresholds = ranked[starts]
+    tp = tp_counts[ends-1]
+    fp = fp_counts[ends-1]
+    tp_old = np.append(0, tp[:-1])
+    fp_old = np.append(0, fp[:-1])
+    ties = ends-starts
+    n1 = int(np.sum(ties*(ties-1)//2))
+    concordant_pairs = int(np.sum(tp_old*(fp-fp_old)))
+    discordant_pairs = int(np.sum(fp_old*(tp-tp_old)))
+
+    x = fp*1.0/negs
+    y = tp*1.0/poss
+    x_old = np.append(0, x[:-1])
+    y_old = np.append(0, y[:-1])
+    AUC = np.cumsum((y+y_old)*(x-x_old)*0.5)[-1]
+    precision = tp*1.0/ends
+    precision_old = np.append(1, precision[:-1])
+    AUPR = np.cumsum((precision+precision_old)*(y-y_old)*0.5)[-1]
+    lift = ends*1.0/n
+
+    # rate driven curve: a parabola through nPoints points for every threshold
+    pi0 = poss*1.0/n
+    pi1 = 1-pi0
+    rate = pi1*x+pi0*y
+    loss = 2*(rate*(pi0-rate)+pi1*x)
+    rate_old = np.append(0, rate[:-1])
+    loss_old = np.append(0, loss[:-1])
+    if np.any(rate == rate_old):
+        raise ZeroDivisionError('float division by zero')
+    inner = []
+    for i in range(1, nPoints):
+        alpha = i*1.0/nPoints
+        inner_rate = rate_old+alpha*(rate-rate_old)
+        inner_loss = 2*(inner_rate*(pi0-inner_rate)+pi1*(x_old+alpha*(x-x_old)))
+        inner.append((inner_rate, inner_loss))
+    m = 0.5*(pi0+pi1*(x_old-x)/(rate-rate_old))
+    mvalue = 2*(m*(pi0-m)+pi1*((rate-m)*x_old+(m-rate_old)*x)/(rate-rate_old))
+    ratemax = np.max(loss)
+    mvalue = mvalue[(m < rate) & (m > rate_old)]
+    if len(mvalue):
+        ratemax = max(ratemax, np.max(mvalue))
+
+    # Kendall curve
+    ken_low = 2*pi1*x
+    ken_high = 2*pi0*(1-y)
+    ken = np.where(rate <= pi0, ken_low, ken_high)
+    kenmax = np.max(ken)
+
+    # the series are built only for the points that are kept
+    groups = len(thresholds)
+    kept = keep_indices(groups+1, max_points)[1:]-1
+    kept_thresholds = thresholds[kept].tolist()
+    ROCseries = [[0, 0, '-Inf']]+[list(p) for p in zip(x[kept].tolist(), y[kept].tolist(), kept_thresholds)]
+    PRseries = [[0, 1, '-Inf']]+[list(p) for p in zip(y[kept].tolist(), precision[kept].tolist(), kept_thresholds)]
+    LIFTseries = [[0, 0, '-Inf']]+[list(p) for p in zip(lift[kept].tolist(), y[kept].tolist(), kept_thresholds)]
+
+    # the rate driven intervals are all kept, as they must join each other
+    RATEseries = []
+    starts = [[r, l, t, curve_number] for r, l, t in zip(rate_old.tolist(), loss_old.tolist(), thresholds.tolist())]
+    starts[0][0] = starts[0][1] = 0
+    inner = [zip(r.tolist(), l.tolist()) for r, l in inner]
+    for j, (r, l) in enumerate(zip(rate.tolist(), loss.tolist())):
+        RATEseries.append([starts[j]]+[[points[j][0], points[j][1], 0] for points in inner]+[[r, l, 0]])
+
+    # the Kendall curve crosses pi0 once (the rates increase), where a
+    # point is added between two thresholds
+    ken_x = rate.tolist()
+    ken_y = ken.tolist()
+    ken_thresholds = thresholds.tolist()
+    crossing = np.flatnonzero((rate > pi0) & (rate_old < pi0))
+    if len(crossing):
+        c = crossing[0]
+        x_prev, y_prev = (ken_x[c-1], ken_y[c-1]) if c > 0 else (0, 0)
+        ken_x.insert(c, pi0)
+        ken_y.insert(c, (float(ken_low[c])-y_prev)*(pi0-x_prev)/(float(rate[c])-x_prev)+(y_prev))
+        ken_thresholds.insert(c, '')
+    KENseries = [[0, 0]]+[[ken_x[j], ken_y[j], ken_thresholds[j]] for j in keep_indices(len(ken_x)+1, max_points)[1:]-1]
+
+    # convex hull and lower envelope (cost curve). A point with fp > 0
+    # followed by a point with the same fp is always removed from the
+    # hull by that point, without leaving a trace, so it is skipped.
+    candidates = np.flatnonzero((x == 0) | np.append(x[1:] != x[:-1], True))
+    hull_x = [0]
+    hull_y = [0]
+    hull_thresholds = ['-Inf']
+    COSTseries = [[0, 0, '-Inf']]
+    for px, py, threshold in zip(x[candidates].tolist(), y[candidates].tolist(), thresholds[candidates].tolist()):
+        while len(hull_x)>=2 and (hull_x[-1]==px or (hull_x[-2]!=hull_x[-1] and (hull_y[-1]-hull_y[-2])/(hull_x[-1]-hull_x[-2]) <= (py-hull_y[-1])/(px-hull_x[-1]))):
+            hull_x.pop()
+            hull_y.pop()
+            hull_thresholds.pop()
+            COSTseries.pop()
+        hull_x.append(px)
+        hull_y.append(py)
+        hull_thresholds.append(threshold)
+        if px != hull_x[-2]:
+            slope = (py-hull_y[-2])/(px-hull_x[-2])
+            intercept = py-slope*px
+            COSTseries.append([1/(slope+1), (1-intercept)/(1+slope), threshold])
+        else:
+            if len(COSTseries) == 0:
+                COSTseries.append([0, 0, threshold])
+            else:
+                COSTseries[0][2] = threshold
+    ROChull = [list(p) for p in zip(hull_x, hull_y, hull_thresholds)]
+
+    if COSTseries[-1][0] < 1:
+        #append final point with max threshold
+        COSTseries.append([1, 1-float(y[-1]), float(ranked[-1])])
+
+    AUCH = 0
+    for i in range(1, len(ROChull)):
+        AUCH += (ROChull[i][1]+ROChull[i-1][1])*(ROChull[i][0]-ROChull[i-1][0])*0.5
+    n0 = n*(n-1)//2
+    curve = {'ROCpoints': ROCseries,
+             'PRpoints': PRseries,
+             'LIFTpoints': LIFTseries,
+             'ROChull': ROChull,
+             'COSTpoints': COSTseries,
+             'RATEintervals': RATEseries,
+             'KENpoints': KENseries,
+             'AUC': float(AUC),
+             'Gini': 2*float(AUC)-1,
+             'KENtau': (concordant_pairs-discordant_pairs)/math.sqrt((n0-n1)*(n0-(negs*(negs-1)+poss*(poss-1))//2)),
+             'AUPR': float(AUPR),
+             'AUCH': AUCH}
+    return curve, float(ratemax), float(kenmax)
+
+
+def prepare_curve_data(performance, subtype, max_points=None):
+    """ adds the series and measures to every curve (a dictionary with the
+    actual classes and the predicted scores) of the performance and the
+    largest rate driven and Kendall values to the first curve. Returns
+    None if a curve doesn't have positive and negative examples. """
+    if subtype != '-score':
+        output_dict = legacy_prepare_curve_data({'predictions': performance, 'subtype': subtype})
+        return output_dict['performance'] if output_dict else None
+    kenmax = 0.5
+    ratemax = 0.5
+    for curve in performance:
+        if curve['actual'].count(1) == 0 or curve['actual'].count(0) == 0:
+            print "Class Error, zero poss or zero negs, only one class or other type error."
+            return None
+        values, curve_ratemax, curve_kenmax = score_curve(curve['actual'], curve['predicted'], performance.index(curve)+1, max_points)
+        curve.update(values)
+        kenmax = max(kenmax, curve_kenmax)
+        ratemax = max(ratemax, curve_ratemax)
+        performance[0]['KENmax'] = kenmax
+        performance[0]['RATEmax'] = ratemax
+    return performance
+
+
+def legacy_prepare_curve_data(input_dict):
+    """ the curves as vipercharts_prepareCurveData computed them before
+    (a pass over all predictions for every threshold), used for ranks and
+    to check and time the new engine """
+    import math
+    nPoints=4
+    performance = input_dict['predictions']#chartdata
+    subtype = input_dict['subtype']
+    kenmax = 0.5
+    ratemax = 0.5
+    for curve in performance:
+        n = len(curve['actual'])
+        negs = curve['actual'].count(0)
+        poss = curve['actual'].count(1)
+        if poss == 0 or negs == 0:
+            print "Class Error, zero poss or zero negs, only one class or other type error."
+            return []
+        try:
+            ranks = curve['rank']
+        except:
+            ranks = range(n+1)[1:] # ranks from 1
+        paralel =[]
+        for i in range(n):
+            paralel.append([curve['actual'][i], float(curve['predicted'][i])])
+        if (subtype == '-score'):
+            ROCseries = [[0,0, '-Inf']]; PRseries = [[0,1, '-Inf']]; LIFTseries = [[0,0, '-Inf']]
+            ROChull = [[0,0,'-Inf']]; COSTseries = [[0,0,'-Inf']]; RATEseries = []; KENseries = [[0,0]]; KENup=[[0,1]]; KENdown=[[0,0]]
+            _oldrate = 0
+            _oldloss = 0
+            AUC = 0
+            AUPR = 0
+            ranked = sorted(paralel, key = lambda pair:pair[1], reverse=True)
+            k = 0
+            tp = 0; fp = 0; tp_old = 0; fp_old = 0; n1 = 0; concordant_pairs = 0; discordant_pairs = 0;
+            while k < len(ranked):
+                addedconc = 0; addeddisc = 0;
+                threshold = ranked[k][1];
+                group = [x[0] for x in ranked if x[1] >= threshold]
+                tp = group.count(1)
+                fp = group.count(0)
+                #next k is len(group).
+                ties = len(group) - k
+                n1 += ties * (ties-1)/2
+                concordant_pairs += tp_old * (fp - fp_old)
+                discordant_pairs += fp_old * (tp - tp_old)
+
+                ROCpoint = [fp*1.0/negs,tp*1.0/poss, threshold]
+                ROCseries.append(ROCpoint)
+                AUC += (ROCpoint[1] + ROCseries[-2][1]) * (ROCpoint[0] - ROCseries[-2][0]) * 0.5
+                PRseries.append([tp*1.0/poss, tp*1.0/(tp+fp), threshold])
+                AUPR += (PRseries[-1][1] + PRseries[-2][1]) * (PRseries[-1][0] - PRseries[-2][0]) * 0.5
+                LIFTseries.append([len(group)*1.0/n, tp*1.0/poss, threshold])
+
+                #Convex hull and lower envelope:
+                while len(ROChull)>=2 and (ROChull[-1][0]==ROCpoint[0]  or (ROChull[-2][0]!=ROChull[-1][0] and (ROChull[-1][1]-ROChull[-2][1])/(ROChull[-1][0]-ROChull[-2][0]) <= (ROCpoint[1]-ROChull[-1][1])/(ROCpoint[0]-ROChull[-1][0]))):
+                    ROChull.pop()
+                    COSTseries.pop()
+                ROChull.append(ROCpoint)
+                if(ROCpoint[0] != ROChull[-2][0]):
+                    slope = (ROCpoint[1] - ROChull[-2][1]) / (ROCpoint[0] - ROChull[-2][0])
+                    intercept = ROCpoint[1] - slope * ROCpoint[0]
+                    COSTseries.append([1 / (slope + 1), (1 - intercept) / (1 + slope), threshold])
+                else:
+                    if len(COSTseries) == 0:
+                        COSTseries.append([0,0,threshold])
+                    else:
+                        COSTseries[0][2] = threshold
+                COSTend = 1 - ROCpoint[1]
+
+                #Rate driven curve:
+                #The Rate driven curve is a list of intervals. Each interval is a set of points on the appropriate parabola. There are nPoints number of points
+                RATEinterval = []
+                pi0 = poss * 1.0 / n
+                pi1 = 1 - pi0
+                _newrate = pi1*ROCpoint[0]+pi0*ROCpoint[1]
+                _newloss = 2*(_newrate*(pi0-_newrate) + pi1*ROCpoint[0])
+                RATEinterval.append([_oldrate, _oldloss, threshold, performance.index(curve)+1])
+                for i in range(1, nPoints):
+                    alpha = i * 1.0/nPoints
+                    rate = _oldrate + alpha * (_newrate - _oldrate)
+                    loss = 2 * (rate * (pi0 - rate) + pi1 * (ROCseries[-2][0] + alpha * (ROCpoint[0] - ROCseries[-2][0])))
+                    RATEinterval.append([rate, loss, 0])
+                RATEinterval.append([_newrate, _newloss, 0])
+                RATEseries.append(RATEinterval)
+                if _newloss > ratemax:
+                    ratemax = _newloss
+                m = 0.5*(pi0+pi1*(ROCseries[-2][0]-ROCpoint[0])/(_newrate-_oldrate))
+                if m<_newrate and m>_oldrate:
+                    mvalue=2*(m*(pi0-m)+pi1*((_newrate-m)*ROCseries[-2][0] + (m-_oldrate)*ROCpoint[0])/(_newrate - _oldrate))
+                    if mvalue > ratemax:
+                        ratemax = mvalue
+
+                #Kendall curve:
+                if _newrate <= pi0:
+                    KENseries.append([_newrate, 2*pi1*ROCpoint[0], threshold])
+                else:
+                    if _oldrate < pi0:
+                        KENseries.append([pi0,(2*pi1*ROCpoint[0]-KENseries[-1][1])*(pi0-KENseries[-1][0])/(_newrate - KENseries[-1][0])+(KENseries[-1][1]), ''])
+                    KENseries.append([_newrate, 2*pi0*(1-ROCpoint[1]), threshold])
+                if KENseries[-1][1] > kenmax:
+                    kenmax = KENseries[-1][1]
+                _oldrate = _newrate
+                _oldloss = _newloss
+
+                k += len(group) - k
+                tp_old = tp
+                fp_old = fp
+        else:
+            ROCseries = [[0,0,0]]; PRseries = [[0,1,0]];  LIFTseries = [[0,0,0]]# x: y: rank:
+            ranked = sorted(paralel, key=lambda pair:pair[1])
+            k = 0
+            while k < len(ranked):
+                tp = 0; fp = 0;
+                threshold = ranked[k][1];
+                group = [x[0] for x in ranked if x[1] <= threshold]
+                tp = group.count('1')
+                fp = group.count('0')
+                ROCpoint = [fp*1.0/negs,tp*1.0/poss, threshold]
+                ROCseries.append([fp*1.0/negs, tp*1.0/poss, int(threshold)])
+                PRseries.append([tp*1.0/poss, tp*1.0/(tp+fp), int(threshold)])
+                LIFTseries.append([len(group)*1.0/n, tp*1.0/poss, int(threshold)])
+                while len(ROChull)>=2 and (ROChull[-1][0]==ROCpoint[0]  or (ROChull[-2][0]!=ROChull[-1][0] and (ROChull[-1][1]-ROChull[-2][1])/(ROChull[-1][0]-ROChull[-2][0]) <= (ROCpoint[1]-ROChull[-1][1])/(ROCpoint[0]-ROChull[-1][0]))):
+                    ROChull.pop()
+                    COSTseries.pop()
+                ROChull.append(ROCpoint)
+                if(ROCpoint[0]!=ROChull[-2][0]):
+                    slope=(ROCpoint[1]-ROChull[-2][1])/(ROCpoint[0]-ROChull[-2][0])
+                    intercept=ROCpoint[1]-slope*ROCpoint[0]
+                    COSTseries.append([1/(1+slope), (1-intercept)/(1+slope)])
+                else:
+                    COSTseries.append([0.0, ROCpoint[0]])
+                k += len(group) - k
+
+        if COSTseries[-1][0]<1:
+            #append final point with max threshold
+            COSTseries.append([1, COSTend, ranked[-1][1]])
+
+        curve['ROCpoints'] = ROCseries
+        curve['PRpoints'] = PRseries
+        curve['LIFTpoints'] = LIFTseries
+        curve['ROChull'] = ROChull
+        curve['COSTpoints'] = COSTseries
+        curve['RATEintervals'] = RATEseries
+        curve['KENpoints'] = KENseries
+        curve['AUC'] = AUC
+        curve['Gini'] = 2 * AUC - 1
+        n0=n*(n-1)/2
+        curve['KENtau'] = (concordant_pairs - discordant_pairs) / math.sqrt((n0 - n1) * (n0 - (negs*(negs-1) + poss*(poss-1))/2))
+        curve['AUPR'] = AUPR
+        AUCH = 0
+        for i in range(1, len(ROChull)):
+            AUCH += (ROChull[i][1] + ROChull[i-1][1]) * (ROChull[i][0] - ROChull[i-1][0]) * 0.5
+        curve['AUCH'] = AUCH
+        performance[0]['KENmax'] = kenmax
+        performance[0]['RATEmax'] = ratemax
+
+    output_dict = {}
+    output_dict['performance'] = performance
+    return output_dict
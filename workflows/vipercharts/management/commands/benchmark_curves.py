@@ -0,0 +1,86 @@
+import copy
+import random
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+
+def synthetic_performance(examples, curves, levels, seed):
+    """ curves of scored predictions, scores rounded to levels decimals (0
+    leaves them unrounded) so that some of them are tied """
+    rnd = random.Random(seed)
+    performance = []
+    for c in range(curves):
+        actual = [rnd.choice([0, 1]) for i in range(examples)]
+        predicted = [0.5*a + 0.5*rnd.random() for a in actual]
+        if levels:
+            predicted = [round(p, levels) for p in predicted]
+        performance.append({'actual': actual, 'predicted': predicted, 'name': 'curve %d' % (c+1)})
+    return performance
+
+
+class Command(BaseCommand):
+    help = 'Times vipercharts_prepareCurveData (the sorted engine) against the previous implementation on ' \
+           'synthetic predictions and checks that their results are the same.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('-n', '--examples',
+            dest='examples',
+            default='1000,10000,100000,1000000',
+            help='Comma separated list of the numbers of predictions of a curve.'
+        ),
+        make_option('-c', '--curves',
+            dest='curves',
+            type='int',
+            default=1,
+            help='Number of curves.'
+        ),
+        make_option('-l', '--levels',
+            dest='levels',
+            type='int',
+            default=0,
+            help='Round the scores to this many decimals (0 does not round them).'
+        ),
+        make_option('-m', '--max-points',
+            dest='max_points',
+            type='int',
+            default=None,
+            help='Decimate the series to at most this many points.'
+        ),
+        make_option('--legacy-limit',
+            dest='legacy_limit',
+            type='int',
+            default=20000,
+            help='Only time the previous implementation on at most this many predictions.'
+        ),
+        make_option('--seed',
+            dest='seed',
+            type='int',
+            default=0,
+            help='Random seed.'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        from workflows.vipercharts.curves import prepare_curve_data, legacy_prepare_curve_data
+
+        for examples in [int(n) for n in options['examples'].split(',')]:
+            performance = synthetic_performance(examples, options['curves'], options['levels'], options['seed'])
+            legacy = None
+            if examples <= options['legacy_limit']:
+                data = copy.deepcopy(performance)
+                start = time.time()
+                legacy = legacy_prepare_curve_data({'predictions': data, 'subtype': '-score'})['performance']
+                legacy_time = time.time() - start
+            data = copy.deepcopy(performance)
+            start = time.time()
+            result = prepare_curve_data(data, '-score', options['max_points'])
+            elapsed = time.time() - start
+            if legacy is None:
+                self.stdout.write('%8d predictions  before          -  now %8.3f s\n' % (examples, elapsed))
+            else:
+                status = 'ok' if options['max_points'] or result == legacy else 'DIFFERENT RESULTS'
+                self.stdout.write('%8d predictions  before %8.3f s  now %8.3f s %9.1fx  %s\n' % (
+                    examples, legacy_time, elapsed, legacy_time / elapsed, status))
+            self.stdout.flush()
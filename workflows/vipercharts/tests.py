@@ -0,0 +1,45 @@
+import copy
+import random
+from django.test import SimpleTestCase
+
+from workflows.vipercharts.curves import prepare_curve_data, legacy_prepare_curve_data
+
+
+class CurveEngineTest(SimpleTestCase):
+
+    def performance(self, rnd, examples, decimals):
+        performance = []
+        for c in range(2):
+            actual = [rnd.choice([0, 1]) for i in range(examples)]
+            actual[:2] = [0, 1]
+            predicted = [round(0.3*a + 0.7*rnd.random(), decimals) for a in actual]
+            performance.append({'actual': actual, 'predicted': predicted, 'name': 'curve %d' % c})
+        return performance
+
+    def test_same_as_legacy(self):
+        rnd = random.Random(0)
+        for examples in (5, 50, 500):
+            # one decimal gives many tied scores
+            for decimals in (1, 3, 12):
+                performance = self.performance(rnd, examples, decimals)
+                expected = legacy_prepare_curve_data({'predictions': copy.deepcopy(performance), 'subtype': '-score'})
+                self.assertEqual(prepare_curve_data(copy.deepcopy(performance), '-score'), expected['performance'])
+
+    def test_decimation(self):
+        performance = self.performance(random.Random(1), 2000, 12)
+        expected = prepare_curve_data(copy.deepcopy(performance), '-score')
+        curves = prepare_curve_data(performance, '-score', max_points=100)
+        for curve, full in zip(curves, expected):
+            for key in ('ROCpoints', 'PRpoints', 'LIFTpoints', 'KENpoints'):
+                self.assertTrue(len(curve[key]) <= 100)
+                self.assertEqual(curve[key][0], full[key][0])
+                self.assertEqual(curve[key][-1], full[key][-1])
+            for key in ('AUC', 'AUPR', 'AUCH', 'KENtau', 'ROChull', 'COSTpoints', 'RATEintervals'):
+                self.assertEqual(curve[key], full[key])
+            # every rate driven interval starts where the previous one ends
+            intervals = curve['RATEintervals']
+            for previous, interval in zip(intervals, intervals[1:]):
+                self.assertEqual(interval[0][:2], previous[-1][:2])
+
+    def test_one_class(self):
+        self.assertEqual(prepare_curve_data([{'actual': [1, 1], 'predicted': [0.2, 0.3]}], '-score'), None)
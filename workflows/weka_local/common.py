@@ -1,10 +1,16 @@
 __author__ = 'vid'
 
-from base64 import b64encode, b64decode
+import struct
+import threading
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+from uuid import uuid4
+from collections import OrderedDict
+from base64 import b64decode
 
 import jpype as jp
+from django.conf import settings
 
-from temputils import TemporaryFile
 from os.path import join, normpath, dirname
 
 BASE = normpath(dirname(__file__))
@@ -18,21 +24,199 @@ def parse_options(op_string):
     return op_string.replace(',', ' ').split() if op_string != None else []
 
 
-def serialize_weka_object(obj):
+def attach_thread():
     if not jp.isThreadAttachedToJVM():
         jp.attachThreadToJVM()
 
-    s = jp.JClass('weka.core.SerializationHelper')
-    tfile = TemporaryFile(flags='wb+')
-    s.write(tfile.name, obj)
-    return b64encode(tfile.fp.read())
 
+def write_weka_object(obj):
+    """ serializes the object into a string, in memory """
+    attach_thread()
+    stream = jp.JClass('java.io.ByteArrayOutputStream')()
+    jp.JClass('weka.core.SerializationHelper').write(stream, obj)
+    data = stream.toByteArray()[:]
+    if isinstance(data, str):
+        return data
+    return struct.pack('%db' % len(data), *data)
+
+
+def read_weka_object(data):
+    attach_thread()
+    stream = jp.JClass('java.io.ByteArrayInputStream')(jp.JArray(jp.JByte)(data))
+    return jp.JClass('weka.core.SerializationHelper').read(stream)
+
+
+def copy_weka_object(obj):
+    """ a deep copy of the object, made in the JVM """
+    attach_thread()
+    return jp.JClass('weka.core.SerializedObject')(obj).getObject()
+
+
+class WekaObjectStore(object):
+    """ the Weka objects of this process by the keys of their handles. When
+    there are more than size objects the least recently used one is
+    serialized into its handle (if the handle still exists) and dropped. """
+
+    def __init__(self, size):
+        self.size = size
+        self.objects = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.objects.pop(key, None)
+            if entry is None:
+                return None
+            self.objects[key] = entry
+            return entry[0]
+
+    def put(self, key, obj, handle):
+        with self.lock:
+            self.objects.pop(key, None)
+            self.objects[key] = (obj, handle)
+            evicted = []
+            while len(self.objects) > self.size:
+                evicted.append(self.objects.popitem(last=False)[1])
+        for obj, handle in evicted:
+            if handle.data is None:
+                handle.data = write_weka_object(obj)
+
+store = WekaObjectStore(getattr(settings, 'WEKA_LOCAL_STORE_SIZE', 100))
+
+# the locks of the objects of the handles, by the hash of their keys
+_object_locks = [threading.RLock() for i in range(64)]
+
+def object_lock(key):
+    return _object_locks[hash(key) % len(_object_locks)]
+
+
+class WekaObject(object):
+    """ the handle of a Weka object (instances, a learner or a classifier)
+    that widgets pass on instead of the serialized object. The object stays
+    in the store of the process; it is serialized only when the handle is
+    pickled (e.g. saved with the outputs of a widget) or when the object is
+    evicted from the store. Handled objects must not be changed, get a copy
+    with deserialize_weka_object(handle, copy=True) to change one.
+
+    Widgets of a workflow, iterations of a loop and streams may run on
+    several threads, which then share the objects of the handles, and Weka
+    classifiers are not thread-safe (classifying can change their state).
+    Widgets that use a shared object, not a copy, use it in a
+    use_weka_object block, which lets one thread at a time use it. """
+
+    def __init__(self, obj):
+        self.key = uuid4().hex
+        self.class_name = str(obj.getClass().getName())
+        self.data = None
+        store.put(self.key, obj, self)
+
+    def get(self):
+        obj = store.get(self.key)
+        if obj is None:
+            if self.data is None:
+                raise ValueError('The Weka object %s is not available anymore.' % self.class_name)
+            obj = read_weka_object(self.data)
+            store.put(self.key, obj, self)
+        return obj
+
+    def __getstate__(self):
+        if self.data is None:
+            self.data = write_weka_object(self.get())
+        return {'key': self.key, 'class_name': self.class_name, 'data': self.data}
+
+    def __str__(self):
+        return '<Weka object %s>' % self.class_name
+
+    def __repr__(self):
+        return str(self)
+
+
+def with_class_index(instances):
+    """ returns the instances, or a copy with the last attribute as the
+    class if the class isn't set """
+    if instances.classIndex() == -1:
+        instances = jp.JClass('weka.core.Instances')(instances)
+        instances.setClassIndex(instances.numAttributes() - 1)
+    return instances
+
+
+def class_distributions(classifier, instances):
+    """ the class distributions the classifier predicts for the instances,
+    in one call if the classifier can predict them in a batch """
+    if hasattr(classifier, 'distributionsForInstances'):
+        return [list(d[:]) for d in classifier.distributionsForInstances(instances)]
+    return [list(classifier.distributionForInstance(instance)[:]) for instance in instances]
+
+
+def cross_validate(classifier, instances, num_folds, seed=1, workers=None):
+    """ cross validates copies of the classifier like
+    Evaluation.crossValidateModel (with the same folds and results), but
+    builds the models of the folds on up to workers (WEKA_LOCAL_CV_WORKERS)
+    threads. Returns the Evaluation and, for the instances of all test folds,
+    the indices of their classes and the class distributions predicted by
+    the models of their folds. """
+    attach_thread()
+    if workers is None:
+        workers = getattr(settings, 'WEKA_LOCAL_CV_WORKERS', 4)
+    rand = jp.JClass('java.util.Random')(seed)
+    data = jp.JClass('weka.core.Instances')(instances)
+    data.randomize(rand)
+    if data.classAttribute().isNominal():
+        data.stratify(num_folds)
+    # the folds are made first, in order, as they use the same random generator
+    folds = [(data.trainCV(num_folds, i, rand), data.testCV(num_folds, i)) for i in range(num_folds)]
+    evaluation = jp.JClass('weka.classifiers.Evaluation')(data)
+    lock = threading.Lock()
+
+    def run_fold(fold):
+        attach_thread()
+        train, test = fold
+        model = copy_weka_object(classifier)
+        model.buildClassifier(train)
+        distributions = class_distributions(model, test)
+        actual = [int(c) for c in test.attributeToDoubleArray(test.classIndex())[:]]
+        with lock:
+            evaluation.setPriors(train)
+            evaluation.evaluateModel(model, test, [])
+        return actual, distributions
+
+    pool = ThreadPool(max(1, min(workers, num_folds)))
+    try:
+        results = pool.map(run_fold, folds)
+    finally:
+        pool.close()
+        pool.join()
+    actual = []
+    distributions = []
+    for fold_actual, fold_distributions in results:
+        actual.extend(fold_actual)
+        distributions.extend(fold_distributions)
+    return evaluation, actual, distributions
+
+
+def serialize_weka_object(obj):
+    """ returns a handle of the object """
+    return WekaObject(obj)
+
+
+def deserialize_weka_object(objString, copy=False):
+    """ returns the object of a handle or of a base64 encoded serialized
+    object (as saved by older versions) """
+    if isinstance(objString, WekaObject):
+        obj = objString.get()
+        if copy:
+            with object_lock(objString.key):
+                return copy_weka_object(obj)
+        return obj
+    return read_weka_object(b64decode(objString))
 
-def deserialize_weka_object(objString):
-    if not jp.isThreadAttachedToJVM():
-        jp.attachThreadToJVM()
 
-    d = jp.JClass('weka.core.SerializationHelper')
-    tfile = TemporaryFile(flags='wb+')
-    tfile.writeString(b64decode(objString))
-    return d.read(tfile.name)
+@contextmanager
+def use_weka_object(objString):
+    """ a block that uses the object of a handle (or of a base64 encoded
+    serialized object), while no other thread uses it """
+    if isinstance(objString, WekaObject):
+        with object_lock(objString.key):
+            yield objString.get()
+    else:
+        yield read_weka_object(b64decode(objString))
@@ -2,6 +2,7 @@ import arff
 import jpype as jp
 
 import common
+from temputils import TemporaryFile
 
 
 def weka_local_random_tree(input_dict):
@@ -220,16 +221,13 @@ def weka_local_arff_to_weka_instances(input_dict):
     if not jp.isThreadAttachedToJVM():
         jp.attachThreadToJVM()
 
-    tmp = common.TemporaryFile(suffix='.arff')
-    tmp.writeString(input_dict['arff'])
-
     try:
         class_index = int(input_dict['class_index'])
     except:
         class_index = None
 
-    source = jp.JClass('weka.core.converters.ConverterUtils$DataSource')(tmp.name)
-    instances = source.getDataSet()
+    reader = jp.JClass('java.io.BufferedReader')(jp.JClass('java.io.StringReader')(input_dict['arff']))
+    instances = jp.JClass('weka.core.Instances')(reader)
 
     if class_index is None:
         print 'Warning: class is set to the last attribute!'
@@ -281,12 +279,9 @@ def weka_local_build_classifier(input_dict):
     if not jp.isThreadAttachedToJVM():
         jp.attachThreadToJVM()
 
-    instances = common.deserialize_weka_object(input_dict['instances'])
-    classifier = common.deserialize_weka_object(input_dict['learner'])
-
-    if instances.classIndex() == -1:
-        instances.setClassIndex(instances.numAttributes() - 1)
-        # raise ValueError('Class not set!')
+    # the class is set to the last attribute if it isn't set
+    instances = common.with_class_index(common.deserialize_weka_object(input_dict['instances']))
+    classifier = common.deserialize_weka_object(input_dict['learner'], copy=True)
 
     classifier.buildClassifier(instances)
     sclassifier = common.serialize_weka_object(classifier)
@@ -299,19 +294,16 @@ def weka_local_apply_classifier(input_dict):
         jp.attachThreadToJVM()
 
     # print("Instances: %s" % type(input_dict['instances']))
-    instances = common.deserialize_weka_object(input_dict['instances'])
-
-    if instances.classIndex() == -1:
-        instances.setClassIndex(instances.numAttributes() - 1)  # last attribute is class
+    instances = common.with_class_index(common.deserialize_weka_object(input_dict['instances']))  # last attribute is class
 
     classifier_serialized = input_dict['classifier']
     predictions = []
     try:
-        classifier = common.deserialize_weka_object(classifier_serialized)
-        for instance in instances:
-            label_ind = int(classifier.classifyInstance(instance))
-            label = instances.attribute(instances.numAttributes() - 1).value(label_ind)
-            predictions.append(label)
+        with common.use_weka_object(classifier_serialized) as classifier:
+            for instance in instances:
+                label_ind = int(classifier.classifyInstance(instance))
+                label = instances.attribute(instances.numAttributes() - 1).value(label_ind)
+                predictions.append(label)
 
         return {'classes': predictions}
     except:
@@ -323,18 +315,19 @@ def weka_local_apply_classifier_and_get_instances(input_dict):
         jp.attachThreadToJVM()
 
     # print("Instances: %s" % type(input_dict['instances']))
-    instances = common.deserialize_weka_object(input_dict['instances'])
+    # a copy, the class values are replaced with the predictions
+    instances = common.deserialize_weka_object(input_dict['instances'], copy=True)
 
     if instances.classIndex() == -1:
         instances.setClassIndex(instances.numAttributes() - 1)  # last attribute is class
 
     classifier_serialized = input_dict['classifier']
     try:
-        classifier = common.deserialize_weka_object(classifier_serialized)
         classAttribute = instances.classAttribute()
-        for instance in instances:
-            label_ind = int(classifier.classifyInstance(instance))
-            instance.setClassValue(classAttribute.value(label_ind))
+        with common.use_weka_object(classifier_serialized) as classifier:
+            for instance in instances:
+                label_ind = int(classifier.classifyInstance(instance))
+                instance.setClassValue(classAttribute.value(label_ind))
 
         return {'instances': common.serialize_weka_object(instances)}
     except:
@@ -347,14 +340,14 @@ def weka_local_apply_mapped_classifier(input_dict):
 
     MAPPING_REPORT_START = 'Attribute mappings:'
 
-    classifier = common.deserialize_weka_object(input_dict['classifier'])
     original_training_instances = common.deserialize_weka_object(input_dict['original_training_instances'])
     instances = common.deserialize_weka_object(input_dict['instances'])
 
     # serialize classifier with original instances to a file once again for the Mapped classifier
-    tfile = common.TemporaryFile(flags='wb+')
+    tfile = TemporaryFile(flags='wb+')
     s = jp.JClass('weka.core.SerializationHelper')
-    s.writeAll(tfile.name, [classifier, original_training_instances])
+    with common.use_weka_object(input_dict['classifier']) as classifier:
+        s.writeAll(tfile.name, [classifier, original_training_instances])
 
     # construct a MappedClassifier
     mappedClassifier = jp.JClass('weka.classifiers.misc.InputMappedClassifier')()
@@ -387,14 +380,15 @@ def weka_local_apply_mapped_classifier_get_instances(input_dict):
 
     MAPPING_REPORT_START = 'Attribute mappings:'
 
-    classifier = common.deserialize_weka_object(input_dict['classifier'])
     original_training_instances = common.deserialize_weka_object(input_dict['original_training_instances'])
-    instances = common.deserialize_weka_object(input_dict['instances'])
+    # a copy, the class values are replaced with the predictions
+    instances = common.deserialize_weka_object(input_dict['instances'], copy=True)
 
     # serialize classifier with original instances to a file once again for the Mapped classifier
-    tfile = common.TemporaryFile(flags='wb+')
+    tfile = TemporaryFile(flags='wb+')
     s = jp.JClass('weka.core.SerializationHelper')
-    s.writeAll(tfile.name, [classifier, original_training_instances])
+    with common.use_weka_object(input_dict['classifier']) as classifier:
+        s.writeAll(tfile.name, [classifier, original_training_instances])
 
     # construct a MappedClassifier
     mappedClassifier = jp.JClass('weka.classifiers.misc.InputMappedClassifier')()
@@ -433,17 +427,14 @@ def weka_local_cross_validate(input_dict):
     except:
         class_index = -1
 
-    instances = common.deserialize_weka_object(input_dict['instances'])
-
-    if instances.classIndex() == -1:
-        instances.setClassIndex(instances.numAttributes() - 1)  # last attribute is class
+    instances = common.with_class_index(common.deserialize_weka_object(input_dict['instances']))  # last attribute is class
 
     classifier_serialized = input_dict['learner']
     try:
-        classifier = common.deserialize_weka_object(classifier_serialized)
-        eval = jp.JClass('weka.classifiers.Evaluation')(instances)
-        rand = jp.JClass('java.util.Random')(1)
-        eval.crossValidateModel(classifier, instances, num_folds, rand, [])
+        # a copy, other threads may use the learner (or classifier) of the handle
+        classifier = common.deserialize_weka_object(classifier_serialized, copy=True)
+        # the folds are built on several threads, the predictions of their models are used for Viper
+        eval, actual_indices, distributions = common.cross_validate(classifier, instances, num_folds)
 
         if class_index == -1:
             pre, rec, f, auc, tp_r, fp_r = (eval.weightedPrecision(),
@@ -460,37 +451,26 @@ def weka_local_cross_validate(input_dict):
                                             eval.truePositiveRate(class_index),
                                             eval.trueNegativeRate(class_index))
 
-        # collect predictions and their probabilities
         classAttribute = instances.classAttribute()
-        classifier.buildClassifier(instances)
-        actual_classes = []
-        predicted_classes = []
-        predicted_classes_probs = []
-        for instance in instances:
-            actual = classAttribute.value(int(instance.classValue()))
-            predicted = classAttribute.value(int(classifier.classifyInstance(instance)))
-            probs = classifier.distributionForInstance(instance)
-            actual_classes.append(actual)
-            predicted_classes.append(predicted)
-            predicted_classes_probs.append({classAttribute.value(i): p for i,p in enumerate(probs)})
-
         target = input_dict.get('target')
         if not target:
             target = classAttribute.value(0)
             print('Warning: observing the first class value {}'.format(target))
+        target_index = classAttribute.indexOfValue(target)
 
         # compute input for Viper
         mname = str(classifier.__getattribute__('class'))
         mname = mname[mname.find('weka'):-2]
         name = 'target class "{}": {}'.format(target, mname)
         apv = {'actual':[], 'predicted':[], 'name': name}
-        for i, (actual, predicted) in enumerate(zip(actual_classes, predicted_classes)):
-            if target == actual:
+        for actual, probs in zip(actual_indices, distributions):
+            if actual == target_index:
                 apv['actual'].append(1)
             else:
                 apv['actual'].append(0)
-            if predicted_classes[i] == target:
-                apv['predicted'].append(predicted_classes_probs[i][target])
+            # the predicted class is the most probable one
+            if max(probs) > 0 and probs.index(max(probs)) == target_index:
+                apv['predicted'].append(probs[target_index])
             else:
                 apv['predicted'].append(0)
 
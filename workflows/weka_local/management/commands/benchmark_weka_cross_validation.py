@@ -0,0 +1,111 @@
+import random
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+
+def synthetic_arff(examples, attributes, seed):
+    """ an ARFF with numeric attributes and a nominal class that depends on
+    their sum """
+    rnd = random.Random(seed)
+    lines = ['@relation benchmark', '']
+    for a in range(attributes):
+        lines.append('@attribute a%d numeric' % a)
+    lines.extend(['@attribute class {neg,pos}', '', '@data'])
+    for i in range(examples):
+        values = [rnd.gauss(0, 1) for a in range(attributes)]
+        label = 'pos' if sum(values) + rnd.gauss(0, 1) > 0 else 'neg'
+        lines.append(','.join(['%.4f' % v for v in values] + [label]))
+    return '\n'.join(lines) + '\n'
+
+
+def serial_cross_validate(classifier, instances, num_folds):
+    """ what weka_local_cross_validate did before: crossValidateModel, then
+    a model built on all instances classifies every instance one by one """
+    import jpype as jp
+    from workflows.weka_local import common
+    classifier = common.copy_weka_object(classifier)
+    evaluation = jp.JClass('weka.classifiers.Evaluation')(instances)
+    evaluation.crossValidateModel(classifier, instances, num_folds, jp.JClass('java.util.Random')(1), [])
+    classifier.buildClassifier(instances)
+    predictions = []
+    for instance in instances:
+        predictions.append((instance.classValue(), classifier.classifyInstance(instance),
+                            list(classifier.distributionForInstance(instance)[:])))
+    return evaluation
+
+
+class Command(BaseCommand):
+    help = 'Times weka_local cross validation on a synthetic ARFF (or the given one): the folds one after another ' \
+           'followed by predictions on all instances, as before, and the folds built on threads with the ' \
+           'predictions taken from the folds.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('-a', '--arff',
+            dest='arff',
+            default=None,
+            help='ARFF file to use instead of the synthetic data (the class is the last attribute).'
+        ),
+        make_option('-n', '--examples',
+            dest='examples',
+            type='int',
+            default=100000,
+            help='Number of instances of the synthetic data.'
+        ),
+        make_option('--attributes',
+            dest='attributes',
+            type='int',
+            default=10,
+            help='Number of attributes of the synthetic data.'
+        ),
+        make_option('-k', '--folds',
+            dest='folds',
+            type='int',
+            default=10,
+            help='Number of folds.'
+        ),
+        make_option('-l', '--learner',
+            dest='learner',
+            default='weka.classifiers.bayes.NaiveBayes',
+            help='Weka class of the learner.'
+        ),
+        make_option('-w', '--workers',
+            dest='workers',
+            default='1,2,4,8',
+            help='Comma separated list of the numbers of threads to build the folds on.'
+        ),
+        make_option('--seed',
+            dest='seed',
+            type='int',
+            default=0,
+            help='Random seed for the synthetic data.'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        import jpype as jp
+        from workflows.weka_local import common, library
+
+        if options['arff']:
+            arff = open(options['arff']).read()
+        else:
+            arff = synthetic_arff(options['examples'], options['attributes'], options['seed'])
+        instances = common.deserialize_weka_object(library.weka_local_arff_to_weka_instances({'arff': arff, 'class_index': -1})['instances'])
+        classifier = jp.JClass(options['learner'])()
+        self.stdout.write('%d instances, %d folds, %s\n' % (instances.numInstances(), options['folds'], options['learner']))
+
+        start = time.time()
+        expected = serial_cross_validate(classifier, instances, options['folds'])
+        serial = time.time() - start
+        self.stdout.write('%-10s %10.3f s\n' % ('before', serial))
+        self.stdout.flush()
+
+        for workers in [int(n) for n in options['workers'].split(',')]:
+            start = time.time()
+            evaluation, actual, distributions = common.cross_validate(classifier, instances, options['folds'], workers=workers)
+            elapsed = time.time() - start
+            same = evaluation.errorRate() == expected.errorRate() and evaluation.toMatrixString() == expected.toMatrixString()
+            self.stdout.write('%3d workers %10.3f s %7.2fx  %s\n' % (
+                workers, elapsed, serial / elapsed, 'ok' if same else 'DIFFERENT RESULTS'))
+            self.stdout.flush()
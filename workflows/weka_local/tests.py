@@ -1,7 +1,119 @@
 from os.path import normpath, join, dirname
-
-import common
-import library
+from base64 import b64encode
+import pickle
+import threading
+
+from django.test import TestCase
+from django.utils.unittest import skipIf
+
+try:
+    import jpype
+except ImportError:
+    jpype = None
+
+if jpype is not None:
+    import common
+    import library
+
+IRIS = normpath(join(dirname(__file__), 'weka', 'data', 'iris.arff'))
+
+
+@skipIf(jpype is None, 'JPype is not installed')
+class WekaObjectTest(TestCase):
+    def setUp(self):
+        self.store = common.store
+        common.store = common.WekaObjectStore(2)
+        self.instances = library.weka_local_arff_to_weka_instances({'arff': open(IRIS).read(), 'class_index': -1})['instances']
+
+    def tearDown(self):
+        common.store = self.store
+
+    def test_pickle_round_trip(self):
+        self.assertEqual(self.instances.data, None)
+        handle = pickle.loads(pickle.dumps(self.instances))
+        self.assertEqual(handle.key, self.instances.key)
+        self.assertEqual(handle.class_name, 'weka.core.Instances')
+        # the object of the handle is read from its data when it isn't in the store
+        common.store.objects.pop(handle.key)
+        self.assertEqual(handle.get().numInstances(), 150)
+        self.assertEqual(handle.get().classIndex(), 4)
+
+    def test_eviction(self):
+        learner = library.weka_local_j48({'params': None})['J48_learner']
+        self.assertEqual(self.instances.data, None)
+        model = library.weka_local_build_classifier({'learner': learner, 'instances': self.instances})['classifier']
+        # the instances are the least recently used object, they were evicted into their handle
+        self.assertEqual(common.store.get(self.instances.key), None)
+        self.assertNotEqual(self.instances.data, None)
+        self.assertEqual(model.data, None)
+        self.assertEqual(common.deserialize_weka_object(self.instances).numInstances(), 150)
+        self.assertNotEqual(common.store.get(self.instances.key), None)
+
+    def test_missing_object(self):
+        common.store.objects.pop(self.instances.key)
+        self.assertRaises(ValueError, self.instances.get)
+
+    def test_copy(self):
+        instances = common.deserialize_weka_object(self.instances)
+        self.assertTrue(common.deserialize_weka_object(self.instances) is instances)
+        copy = common.deserialize_weka_object(self.instances, copy=True)
+        self.assertFalse(copy is instances)
+        self.assertEqual(copy.numInstances(), instances.numInstances())
+
+    def test_use_object(self):
+        learner = library.weka_local_j48({'params': None})['J48_learner']
+        model = library.weka_local_build_classifier({'learner': learner, 'instances': self.instances})['classifier']
+        acquired = []
+        def other_thread():
+            lock = common.object_lock(model.key)
+            acquired.append(lock.acquire(False))
+            if acquired[-1]:
+                lock.release()
+        with common.use_weka_object(model) as classifier:
+            self.assertTrue(classifier is common.deserialize_weka_object(model))
+            # other threads wait until the block ends
+            thread = threading.Thread(target=other_thread)
+            thread.start()
+            thread.join()
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+        self.assertEqual(acquired, [False, True])
+        classes = library.weka_local_apply_classifier({'instances': self.instances, 'classifier': model})['classes']
+        self.assertEqual(len(classes), 150)
+
+    def test_base64_inputs(self):
+        instances = common.deserialize_weka_object(self.instances)
+        learner = common.deserialize_weka_object(library.weka_local_j48({'params': None})['J48_learner'])
+        # the serialized objects saved by older versions
+        old_instances = b64encode(common.write_weka_object(instances))
+        old_learner = b64encode(common.write_weka_object(learner))
+        self.assertEqual(common.deserialize_weka_object(old_instances).numInstances(), 150)
+        model = library.weka_local_build_classifier({'learner': old_learner, 'instances': old_instances})['classifier']
+        self.assertTrue(isinstance(model, common.WekaObject))
+        self.assertTrue('J48' in library.weka_local_print_model({'model': model})['model_as_string'])
+
+
+@skipIf(jpype is None, 'JPype is not installed')
+class CrossValidationTest(TestCase):
+    def test_same_as_weka(self):
+        instances = library.weka_local_arff_to_weka_instances({'arff': open(IRIS).read(), 'class_index': -1})['instances']
+        instances = common.deserialize_weka_object(instances)
+        for learner in (library.weka_local_j48({'params': None})['J48_learner'],
+                        library.weka_local_naive_bayes({'params': None})['Naive_Bayes_learner']):
+            classifier = common.deserialize_weka_object(learner)
+            evaluation, actual, distributions = common.cross_validate(classifier, instances, 10, seed=1, workers=4)
+            weka_evaluation = jpype.JClass('weka.classifiers.Evaluation')(instances)
+            weka_evaluation.crossValidateModel(common.copy_weka_object(classifier), instances, 10,
+                                               jpype.JClass('java.util.Random')(1), [])
+            self.assertEqual(evaluation.numInstances(), weka_evaluation.numInstances())
+            self.assertEqual(evaluation.correct(), weka_evaluation.correct())
+            self.assertEqual(evaluation.toMatrixString(), weka_evaluation.toMatrixString())
+            self.assertAlmostEqual(evaluation.weightedAreaUnderROC(), weka_evaluation.weightedAreaUnderROC())
+            self.assertEqual(len(actual), 150)
+            self.assertEqual(len(distributions), 150)
+            correct = sum(1 for a, d in zip(actual, distributions) if d.index(max(d)) == a)
+            self.assertEqual(correct, weka_evaluation.correct())
 
 
 def test1():